@@ -1,31 +1,105 @@
-import re, json
+import time
 from app.db.dal import record_step
+from app.agents.rules import RuleEngine
+from app.rag.retriever import fingerprint, build_query, retrieve, RCA_CACHE, cache_metrics
+from app.rag.rca import draft_rca
+from app.rag.similar import INDEX as SIMILAR, SIMILAR_REUSE, features, prior_report
+from app.middleware.log_templates import TemplateMiner
+from app.telemetry import span
 
-# Tiny rule-based analyst for demo. Replace with RAG+LLM in real use.
-RULES = [
-    {'pattern': r'connection refused|ECONNREFUSED', 'issue':'Database connection errors', 'root':'DB pod not ready/crashed', 'fix':['Restart DB pod','Increase memory','Check readiness probes']},
-    {'pattern': r'OOMKilled|OutOfMemoryError', 'issue':'Service OOM', 'root':'Memory pressure or leak', 'fix':['Increase container memory limit','Investigate leak','Scale horizontally']},
-    {'pattern': r'HTTP 500|NullPointerException', 'issue':'HTTP 500 / Null deref', 'root':'Bug introduced in recent deploy', 'fix':['Rollback to last working version','Add null checks','Improve input validation']},
-]
+# Rules (app/agents/rules.json, RULES_FILE, hot-reloaded) find the log signatures;
+# playbook retrieval + the LLM (app/rag/) turn them into a grounded RCA. Both the
+# retrieval and the RCA are cached per (error fingerprint, service), and an
+# incident close enough to an analysed one (app/rag/similar.py) starts from
+# that incident's RCA.
+ENGINE = RuleEngine()
 
 def analyze_logs(incident, collected):
-    record_step(incident['id'], 'analyst', 'start', 'Analyzing logs with heuristic rules')
-    corpus = "\n".join(collected.get('logs', []))[:20000]
-    evidence = []
-    for rule in RULES:
-        if re.search(rule['pattern'], corpus, flags=re.I):
-            evidence.append(f"Matched pattern: {rule['pattern']}")
-            record_step(incident['id'], 'analyst', 'analyze', f"Pattern match: {rule['pattern']}")
-            return {
-                'issue': rule['issue'],
-                'root_cause': rule['root'],
-                'mitigations': rule['fix'],
-                'evidence': evidence
-            }
-    record_step(incident['id'], 'analyst', 'analyze', 'No strong match; recommend human review')
-    return {
-        'issue': 'Unknown',
-        'root_cause': 'Inconclusive',
-        'mitigations': ['Escalate to on-call', 'Gather more logs', 'Increase verbosity'],
-        'evidence': ['No rule matched']
-    }
+    record_step(incident['id'], 'analyst', 'start', 'Analyzing logs with rules + playbook retrieval')
+    t0 = time.perf_counter()
+    miner = collected.get('templates')
+    logs = collected.get('logs', [])
+    if miner is None:
+        miner = TemplateMiner()
+        logs = miner.tap(logs)
+    # rules see every raw line (exact counts); everything downstream reads the templates
+    with span('analyst.scan'):            # includes reading (logs.read) and mining the stream
+        matches = ENGINE.scan(logs)
+    record_step(incident['id'], 'analyst', 'analyze',
+                f"{miner.lines} log lines -> {len(miner.clusters)} templates",
+                {'templates': miner.summary(20), 'stats': miner.stats(),
+                 'sources': collected['sources'].status() if collected.get('sources') else None})
+    summary = [
+        {
+            'rule': m['rule']['id'],
+            'pattern': m['rule']['pattern'],
+            'issue': m['rule']['issue'],
+            'count': m['count'],
+            'first_offset': m['first_offset'],
+            'last_offset': m['last_offset'],
+            'score': m['score'],
+        }
+        for m in matches
+    ]
+    if matches:
+        record_step(incident['id'], 'analyst', 'analyze',
+                    f"{len(matches)} rule(s) matched; top: {matches[0]['rule']['pattern']}",
+                    {'matches': summary})
+    else:
+        record_step(incident['id'], 'analyst', 'analyze', 'No rule matched; using error templates for retrieval',
+                    {'error_templates': miner.top_errors()})
+
+    error_lines = miner.top_errors()
+    key = (fingerprint(summary, error_lines), incident.get('service') or 'unknown')
+    feats = features(key[1], [s['rule'] for s in summary], miner.top_errors(10))
+    similar = SIMILAR.query(feats, exclude=incident['id'])
+    sim = {'service': key[1], 'features': feats, 'similar': similar}
+    if similar:
+        record_step(incident['id'], 'analyst', 'retrieve',
+                    f"{len(similar)} similar past incident(s); best #{similar[0]['incident_id']} "
+                    f"({similar[0]['similarity']:.2f})", {'similar': similar})
+
+    rca = RCA_CACHE.get(key)
+    if rca is not None:
+        record_step(incident['id'], 'analyst', 'summarize', f"Reused cached RCA for fingerprint {key[0]}",
+                    {'fingerprint': key[0], 'cache': cache_metrics(),
+                     'ms': round((time.perf_counter() - t0) * 1000, 2)})
+        return _result(rca, summary, miner, sim, cached=True)
+
+    prior = similar[0] if similar and similar[0]['similarity'] >= SIMILAR_REUSE else None
+    report = prior_report(prior['incident_id']) if prior else None
+    if report and report.get('root_cause'):
+        rca = {'issue': report.get('issue') or 'Unknown', 'root_cause': report['root_cause'],
+               'mitigations': report.get('mitigations') or [], 'confidence': report.get('confidence'),
+               'grounded_in': report.get('grounded_in') or [], 'references': report.get('references') or [],
+               'drafted_by': f"similar incident #{prior['incident_id']}", 'fingerprint': key[0],
+               'reused_from': prior['incident_id']}
+        record_step(incident['id'], 'analyst', 'summarize',
+                    f"Reused RCA of incident #{prior['incident_id']} (similarity {prior['similarity']:.2f})",
+                    {'issue': rca['issue'], 'reused_from': prior,
+                     'ms': round((time.perf_counter() - t0) * 1000, 2)})
+        return _result(rca, summary, miner, sim, cached=True)
+
+    chunks, hit = retrieve(key, build_query(incident, summary, error_lines))
+    record_step(incident['id'], 'analyst', 'retrieve',
+                f"{len(chunks)} playbook chunk(s){' (cached)' if hit else ''}",
+                {'fingerprint': key[0], 'chunks': [{'id': c['id'], 'score': c['score'], 'source': c['source']}
+                                                   for c in chunks]})
+    with span('analyst.draft_rca'):
+        rca = draft_rca(incident, summary, [m['rule'] for m in matches], miner.render(), chunks)
+    rca['references'] = [f"Playbook: {c['text'][:200]}" for c in chunks[:2]]
+    rca['fingerprint'] = key[0]
+    if matches or chunks:        # don't pin "inconclusive" for the whole TTL
+        RCA_CACHE.put(key, rca)
+    record_step(incident['id'], 'analyst', 'summarize', f"Drafted RCA ({rca['drafted_by']})",
+                {'issue': rca['issue'], 'confidence': rca['confidence'], 'cache': cache_metrics(),
+                 'ms': round((time.perf_counter() - t0) * 1000, 2)})
+    return _result(rca, summary, miner, sim, cached=False)
+
+def _result(rca, summary, miner, sim, cached):
+    evidence = ([f"Matched pattern: {s['pattern']} ({s['count']}x)" for s in summary]
+                + [f"Log template ({t['count']}x): {t['template']}" for t in miner.summary(3) if t['error']]
+                + [f"Similar past incident #{s['incident_id']} ({s['similarity']:.2f})" for s in sim['similar'][:3]]
+                + rca['references'])
+    return {**rca, 'evidence': evidence or ['No rule matched'], 'matches': summary, 'cached': cached,
+            'similarity': sim}
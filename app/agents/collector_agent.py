@@ -1,28 +1,367 @@
-import os, glob, json
-from app.config import LOGS_MODE, LOGS_LOCAL_ROOT
+import os, glob, json, time, queue, datetime, threading, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import LOGS_MODE, LOGS_LOCAL_ROOT, USE_REAL_CLOUDWATCH
 from app.db.dal import record_step
+from app.telemetry import traced_iter
+
+MAX_LOG_FILES = int(os.getenv('LOG_MAX_FILES', '5'))
+TAIL_BYTES = int(os.getenv('LOG_TAIL_BYTES', str(1024 * 1024)))    # per file, read from the end
+READ_BLOCK = 64 * 1024
+CHUNK_BYTES = int(os.getenv('LOG_CHUNK_BYTES', str(64 * 1024)))    # size of chunks handed to the analyst
+WINDOW_BEFORE = datetime.timedelta(minutes=int(os.getenv('LOG_WINDOW_BEFORE_MIN', '60')))
+WINDOW_AFTER = datetime.timedelta(minutes=int(os.getenv('LOG_WINDOW_AFTER_MIN', '15')))
+USE_LOG_INDEX = os.getenv('LOG_INDEX', 'auto')   # auto: use app/middleware/log_indexer.py output if present | off
+COLLECT_SOURCES = os.getenv('COLLECT_SOURCES', 'all')     # all: every folder, hinted first | hinted: best match only
+COLLECT_DEADLINE = float(os.getenv('COLLECT_DEADLINE_SECONDS', '30'))   # per source, from when it starts; later chunks are dropped
+COLLECT_QUEUE_CHUNKS = int(os.getenv('COLLECT_QUEUE_CHUNKS', '32'))     # bounded hand-off to the analyst
+COLLECT_WORKERS = int(os.getenv('COLLECT_WORKERS', '8'))                # source readers shared by all incidents
+
+# words in the alert (payload source/alert_type/alert/alarm_name/details, service) -> log folder
+SOURCE_HINTS = {
+    'db': ('db', 'sql', 'postgres', 'mysql', 'database', 'conn', 'query', 'deadlock'),
+    'infra': ('cpu', 'oom', 'memory', 'infra', 'node', 'disk', 'kube', 'pod', 'container'),
+    'web': ('http', '5xx', '500', '502', '503', 'latency', 'web', 'api', 'checkout', 'jwt', 'ssl', 'request'),
+}
+
+Window = Optional[Tuple[datetime.datetime, datetime.datetime]]
+
+def alert_text(incident) -> str:
+    try:
+        payload = json.loads(incident.get('payload_json') or '{}')
+    except (TypeError, ValueError):
+        payload = {}
+    fields = [incident.get('alert_type'), incident.get('service')] + \
+        [payload.get(k) for k in ('source', 'alert_type', 'alert', 'alarm_name', 'details')]
+    return ' '.join(str(f) for f in fields if f).lower()
+
+_remote = None
+_remote_lock = threading.Lock()
+
+def remote_logs():
+    """The remote log source for LOGS_MODE (None = local files under LOGS_LOCAL_ROOT)."""
+    global _remote
+    mode = 'cloudwatch' if USE_REAL_CLOUDWATCH else LOGS_MODE
+    if mode == 'local':
+        return None
+    with _remote_lock:
+        if _remote is None:
+            if mode == 's3':
+                from app.middleware.s3_logs import S3Logs
+                _remote = S3Logs()
+            elif mode == 'cloudwatch':
+                from app.middleware.cloudwatch_boto import CloudWatchLogs
+                _remote = CloudWatchLogs()
+            else:
+                raise ValueError(f"unknown LOGS_MODE {mode!r} (local | s3 | cloudwatch)")
+        return _remote
+
+def log_folders() -> List[str]:
+    remote = remote_logs()
+    if remote is not None:
+        return remote.folders()
+    if not os.path.isdir(LOGS_LOCAL_ROOT):
+        return []
+    return sorted(d for d in os.listdir(LOGS_LOCAL_ROOT)
+                  if os.path.isdir(os.path.join(LOGS_LOCAL_ROOT, d)) and not d.startswith('.'))
+
+def relevant_sources(incident) -> List[str]:
+    """Log folders to collect for an incident, best hint match first. Incidents
+    span layers (a web 500 caused by a DB refusal), so with COLLECT_SOURCES=all
+    every folder is read and the hints only order them."""
+    text = alert_text(incident)
+    folders = log_folders()
+    hits = {f: sum(word in text for word in SOURCE_HINTS.get(f, (f,))) for f in folders}
+    ranked = sorted(folders, key=lambda f: (-hits[f], f != 'web', f))
+    if COLLECT_SOURCES == 'hinted':
+        return ranked[:1]
+    return ranked
 
 def choose_log_folder(incident):
-    alert_type = (incident.get('alert_type') or '').lower()
-    if 'db' in alert_type:
-        return 'db'
-    if 'cpu' in alert_type or 'oom' in alert_type or 'infra' in alert_type:
-        return 'infra'
-    return 'web'
-
-def fetch_logs(folder):
-    root = LOGS_LOCAL_ROOT
-    path = os.path.join(root, folder)
-    logs = []
-    for fp in sorted(glob.glob(os.path.join(path, '*.log')))[:5]:
-        with open(fp,'r',encoding='utf-8',errors='ignore') as f:
-            logs.append(f.read()[:5000])
-    return logs
+    """Best single folder (kept for callers that read one source)."""
+    ranked = relevant_sources(incident)
+    return ranked[0] if ranked else 'web'
+
+def parse_ts(line: str) -> Optional[datetime.datetime]:
+    """Leading ISO8601 timestamp of a log line (2025-09-27T11:02:01Z ...), if any."""
+    if len(line) < 19 or line[4] != '-' or line[10] not in 'T ':
+        return None
+    try:
+        return datetime.datetime.strptime(line[:19].replace(' ', 'T'), '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+def incident_window(incident) -> Window:
+    ts = parse_ts(incident.get('created_at') or '')
+    if ts is None or not WINDOW_BEFORE:
+        return None
+    return ts - WINDOW_BEFORE, ts + WINDOW_AFTER
+
+def pick_log_files(path: str, limit: int = MAX_LOG_FILES) -> List[str]:
+    """Most recently modified *.log files first."""
+    files = glob.glob(os.path.join(path, '*.log'))
+    files.sort(key=lambda fp: os.stat(fp).st_mtime, reverse=True)
+    return files[:limit]
+
+def tail_lines(fp: str, max_bytes: int = TAIL_BYTES, not_before: Optional[datetime.datetime] = None) -> List[str]:
+    """Last lines of fp (at most max_bytes), oldest first, reading backward in fixed
+    blocks. Stops early once a block starts before not_before (logs are append-ordered)."""
+    blocks: List[bytes] = []
+    with open(fp, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        read = 0
+        while pos > 0 and read < max_bytes:
+            size = min(READ_BLOCK, pos, max_bytes - read)
+            pos -= size
+            f.seek(pos)
+            blocks.append(f.read(size))
+            read += size
+            if not_before is not None:
+                first = blocks[-1].split(b'\n', 2)
+                ts = parse_ts(first[1].decode('utf-8', 'ignore')) if len(first) > 1 else None
+                if ts is not None and ts < not_before:
+                    break
+    data = b''.join(reversed(blocks))
+    lines = data.decode('utf-8', errors='ignore').splitlines()
+    if pos > 0 and lines:
+        lines = lines[1:]   # first line was cut by the read boundary
+    return lines
+
+def _in_window(lines: List[str], window: Window) -> Iterator[str]:
+    if window is None:
+        yield from lines
+        return
+    lo, hi = window
+    keep = False
+    for line in lines:
+        ts = parse_ts(line)
+        if ts is not None:                 # continuation lines follow their parent
+            keep = lo <= ts <= hi
+        if keep:
+            yield line
+
+def _chunked(lines) -> Iterator[str]:
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_BYTES:
+            yield '\n'.join(buf) + '\n'
+            buf, size = [], 0
+    if buf:
+        yield '\n'.join(buf) + '\n'
+
+_index_local = threading.local()
+
+def log_index_for(folder):
+    """The on-disk log index, if it exists and is caught up with the folder's files."""
+    if USE_LOG_INDEX == 'off':
+        return None
+    from app.middleware.log_indexer import LogIndex, LOG_INDEX_FILE   # imports this module
+    if not os.path.exists(LOG_INDEX_FILE):
+        return None
+    index = getattr(_index_local, 'index', None)
+    if index is None:
+        index = _index_local.index = LogIndex()
+    return index if index.covers(folder) else None
+
+def fetch_logs(folder, window: Window = None) -> Iterator[str]:
+    """Yield chunks (<= CHUNK_BYTES) of the folder's log lines in the incident window.
+    With a caught-up log index only the matching blocks are read; otherwise the newest
+    files are tailed, memory bounded by TAIL_BYTES per file whatever their size.
+    If nothing falls inside the window, the plain tails are yielded instead.
+    Remote sources: CloudWatch filters by window and rules server-side; S3 objects
+    are tailed with ranged GETs and windowed like local files."""
+    remote = remote_logs()
+    if hasattr(remote, 'lines'):                  # CloudWatch: windowed and filtered server-side
+        yield from _chunked(remote.lines(folder, window))
+        return
+    if window and remote is None:
+        index = log_index_for(folder)
+        if index is not None:
+            yielded = False
+            for chunk in _chunked(index.search(folder, *window)):
+                yielded = True
+                yield chunk
+            if yielded:
+                return
+    if remote is not None:
+        tails = lambda not_before: remote.tails(folder, MAX_LOG_FILES, TAIL_BYTES, not_before)
+    else:
+        files = pick_log_files(os.path.join(LOGS_LOCAL_ROOT, folder))
+        tails = lambda not_before: (tail_lines(fp, not_before=not_before) for fp in files)
+    for win in ((window, None) if window else (None,)):
+        yielded = False
+        for tail in tails(win[0] if win else None):
+            lines = _in_window(tail, win)
+            for chunk in _chunked(lines):
+                yielded = True
+                yield chunk
+        if yielded:
+            return
+
+# ---------- fan-out ----------
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _readers() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=COLLECT_WORKERS, thread_name_prefix='collect')
+        return _pool
+
+class Collection:
+    """Reads several sources concurrently into one bounded queue; iterating it
+    yields chunks in arrival order, so the analyst starts on the first chunk of
+    any source. Each source gets `deadline` seconds from when its reader starts
+    (the pool is shared, so it may wait for a worker first); one still queued
+    `deadline` seconds after the collection began is cancelled ('skipped').
+    Unfinished sources are cut and reported as 'timeout' in status(). All steps
+    are recorded by the consuming thread, the last one ('done') when the stream
+    ends, so nothing is written for the incident after it moved on."""
+
+    def __init__(self, incident_id, sources: List[str], window: Window,
+                 deadline: float = COLLECT_DEADLINE, maxsize: int = COLLECT_QUEUE_CHUNKS):
+        self.incident_id = incident_id
+        self.queue: 'queue.Queue[Tuple[str, Optional[str]]]' = queue.Queue(maxsize=max(1, maxsize))
+        self.cancel = threading.Event()
+        self.budget = deadline
+        self.started = time.monotonic()
+        self.start_by = self.started + deadline
+        self.sources: Dict[str, Dict[str, Any]] = {
+            src: {'state': 'pending', 'chunks': 0, 'bytes': 0, 'ms': None, 'queued_ms': None} for src in sources}
+        self._deadlines: Dict[str, float] = {}      # source -> monotonic deadline, set when its reader starts
+        self._reported: set = set()
+        self._final: Optional[Dict[str, Dict[str, Any]]] = None
+        # each reader runs in a copy of our context, so its spans join the incident trace
+        self._futures = {src: _readers().submit(contextvars.copy_context().run, self._read, src, window)
+                         for src in sources}
+
+    def _put(self, source: str, item) -> bool:
+        deadline = self._deadlines[source]
+        while not self.cancel.is_set():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            try:
+                self.queue.put(item, timeout=min(left, 0.5))
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, source: str, window: Window) -> None:
+        if self.cancel.is_set():
+            return
+        st = self.sources[source]
+        t0 = time.monotonic()
+        self._deadlines[source] = t0 + self.budget
+        st['queued_ms'] = round((t0 - self.started) * 1000, 1)
+        st['state'] = 'running'
+        try:
+            for chunk in traced_iter('logs.read', fetch_logs(source, window)):
+                if not self._put(source, (source, chunk)):
+                    st['state'] = 'timeout' if time.monotonic() >= self._deadlines[source] else 'cancelled'
+                    return
+                st['chunks'] += 1
+                st['bytes'] += len(chunk)
+            st['state'] = 'done'
+        except Exception as e:
+            st['state'], st['error'] = 'error', str(e)
+        finally:
+            st['ms'] = round((time.monotonic() - t0) * 1000, 1)
+            self._put(source, (source, None))
+
+    def _expire(self, remaining: set) -> float:
+        """Drop the sources that ran out of time from `remaining`; seconds to wait
+        for the next chunk before checking again."""
+        now, wait = time.monotonic(), 0.5
+        for src in list(remaining):
+            st = self.sources[src]
+            if st['state'] == 'pending':
+                if now < self.start_by:
+                    wait = min(wait, self.start_by - now)
+                    continue
+                if self._futures[src].cancel():          # never got a reader
+                    st['state'] = 'skipped'
+                    remaining.discard(src)
+                    self._report(src)
+                    continue
+            deadline = self._deadlines.get(src)
+            if deadline is None:
+                continue                                 # reader starting right now
+            if now >= deadline:
+                if st['state'] == 'running':
+                    st['state'] = 'timeout'
+                remaining.discard(src)
+                self._report(src)
+            else:
+                wait = min(wait, deadline - now)
+        return max(wait, 0.01)
+
+    def _report(self, source: str) -> None:
+        if source in self._reported:
+            return
+        self._reported.add(source)
+        st = self.sources[source]
+        if st['ms'] is None and source in self._deadlines:        # cut while still reading
+            st['ms'] = round((time.monotonic() - self._deadlines[source] + self.budget) * 1000, 1)
+        st = dict(st)
+        took = f"{st['ms']:.0f} ms" if st['ms'] is not None else 'not started'
+        record_step(self.incident_id, 'collector', 'retrieve',
+                    f"{source}: {st['state']}, {st['bytes'] / 1e6:.1f} MB in {took}",
+                    {'source': source, **st})
+
+    def __iter__(self) -> Iterator[str]:
+        remaining = set(self.sources)
+        try:
+            while remaining:
+                wait = self._expire(remaining)
+                if not remaining:
+                    break
+                try:
+                    source, chunk = self.queue.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if chunk is None:
+                    remaining.discard(source)
+                    self._report(source)
+                elif source in remaining:
+                    yield chunk
+        finally:
+            self.cancel.set()      # done, or the consumer stopped: release blocked readers
+            for src in remaining:
+                if self._futures[src].cancel():
+                    self.sources[src]['state'] = 'skipped'
+                elif self.sources[src]['state'] in ('pending', 'running'):
+                    self.sources[src]['state'] = 'timeout'
+            for src in self.sources:
+                self._report(src)
+            self._final = self.status()
+            read = [st for st in self._final.values() if st['chunks']]
+            record_step(self.incident_id, 'collector', 'done',
+                        f"Collected {sum(st['chunks'] for st in read)} chunk(s), "
+                        f"{sum(st['bytes'] for st in read) / 1e6:.1f} MB from {len(read)}/{len(self.sources)} source(s)",
+                        {'sources': self._final, 'queue_chunks': COLLECT_QUEUE_CHUNKS, 'chunk_bytes': CHUNK_BYTES})
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-source state; frozen once the stream has ended."""
+        if self._final is not None:
+            return {src: dict(st) for src, st in self._final.items()}
+        return {src: dict(st) for src, st in self.sources.items()}
 
 def collector_run(incident):
     record_step(incident['id'], 'collector', 'start', 'Collector started')
-    folder = choose_log_folder(incident)
-    record_step(incident['id'], 'collector', 'retrieve', f'Selected logs folder: {folder}', {'folder':folder})
-    logs = fetch_logs(folder)
-    record_step(incident['id'], 'collector', 'done', f'Fetched {len(logs)} log files')
-    return {'folder':folder, 'logs':logs}
+    sources = relevant_sources(incident)
+    window = incident_window(incident)
+    record_step(incident['id'], 'collector', 'retrieve', f"Fan-out to {len(sources)} log source(s): {', '.join(sources)}",
+                {'sources': sources, 'deadline_s': COLLECT_DEADLINE,
+                 'window': [w.isoformat() + 'Z' for w in window] if window else None})
+    collection = Collection(incident['id'], sources, window)     # records 'done' when the analyst has read it all
+    from app.middleware.log_templates import TemplateMiner   # imports this module
+    miner = TemplateMiner()
+    # 'templates' fills in as 'logs' is consumed (the stream is read once)
+    return {'folder': sources[0] if sources else None, 'sources': collection,
+            'logs': miner.tap(collection), 'templates': miner}
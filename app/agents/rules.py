@@ -0,0 +1,193 @@
+# app/agents/rules.py
+# Compiled rule engine for the analyst. Keywords of all rules - the alternatives
+# of pure literal rules ("connection refused|ECONNREFUSED") plus the literal
+# prefix of regex rules - are folded into one case-insensitive trie regex,
+# scanned once over the corpus as a lookahead so it reports the longest keyword
+# starting at *every* position; the shorter keywords that are prefixes of it
+# come from a table (Aho-Corasick-style output sets), so keywords inside other
+# keywords' matches are not lost. Each candidate rule is then confirmed with
+# rule.match() at that position, skipping positions inside its previous match,
+# which gives exactly the per-rule re.finditer results while thousands of rules
+# cost ~one pass. The few regexes with no usable prefix are scanned on their own.
+# Rules load from RULES_FILE (JSON, or YAML if PyYAML is installed) and are
+# recompiled when the file's mtime changes.
+import os, re, json, math, time, threading
+from typing import Any, Dict, Iterable, List
+
+RULES_FILE = os.getenv("RULES_FILE", os.path.join(os.path.dirname(__file__), "rules.json"))
+RELOAD_CHECK_SECONDS = float(os.getenv("RULES_RELOAD_CHECK_SECONDS", "1"))
+
+_META = set(".^$*+?{}[]\\|()")
+
+def _literals(pattern: str) -> List[str] | None:
+    """The alternatives of a pattern made only of plain text, else None."""
+    parts = pattern.split("|")
+    if any(not p or _META & set(p) for p in parts):
+        return None
+    return parts
+
+def _literal_prefix(pattern: str) -> str:
+    """Leading run of plain text a match must start with ("" if none / top-level |)."""
+    if "|" in pattern.replace("\\|", ""):
+        return ""
+    out, i = [], 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            out.append(pattern[i + 1])
+            i += 2
+        elif ch in _META:
+            if ch in "?*{" and out:      # quantifier makes the previous char optional
+                out.pop()
+            break
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            return "(?:" + body + ")?" if len(alts) > 1 or len(body) > 1 else body + "?"
+        return body
+
+    return build(trie)
+
+class RuleSet:
+    MIN_PREFIX = 3   # shorter prefixes would confirm on too many positions
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self.compiled = [re.compile(rule["pattern"], re.I) for rule in rules]
+        # keyword -> indexes of the rules whose matches start with it
+        self.keywords: Dict[str, List[int]] = {}
+        # the same keywords as written, for pre-filtering at a log source
+        # (None when some rule has no keyword, i.e. any line could match)
+        self.anchors: List[str] | None = []
+        self.fallback: List[int] = []
+        for i, rule in enumerate(rules):
+            pattern = rule["pattern"]
+            lits = _literals(pattern)
+            if lits is not None:
+                for lit in lits:
+                    self.keywords.setdefault(lit.lower(), []).append(i)
+                    self.anchors.append(lit)
+                continue
+            prefix = _literal_prefix(pattern)
+            if len(prefix) >= self.MIN_PREFIX:
+                self.keywords.setdefault(prefix.lower(), []).append(i)
+                self.anchors.append(prefix)
+            else:
+                self.fallback.append(i)
+        if self.fallback:
+            self.anchors = None
+
+        # longest keyword at a position -> rules of it and of every keyword that is a prefix of it
+        self.outputs: Dict[str, List[int]] = {}
+        for kw in self.keywords:
+            rules_at = []
+            for n in range(1, len(kw) + 1):
+                for i in self.keywords.get(kw[:n], ()):
+                    if i not in rules_at:
+                        rules_at.append(i)
+            self.outputs[kw] = sorted(rules_at)
+        self.keyword_re = re.compile(f"(?=({_trie_regex(self.keywords)}))", re.I) if self.keywords else None
+
+    def scan(self, chunks: Iterable[str]) -> List[Dict[str, Any]]:
+        """Scan the chunks as one corpus (offsets are global) and return every
+        rule that matched, best score first."""
+        hits: Dict[int, List[int]] = {}   # rule -> [count, first, last]
+
+        def hit(i: int, pos: int) -> None:
+            h = hits.get(i)
+            if h is None:
+                hits[i] = [1, pos, pos]
+            else:
+                h[0] += 1
+                h[2] = pos
+
+        base = 0
+        for chunk in chunks:
+            if self.keyword_re is not None:
+                resume: Dict[int, int] = {}   # rule -> end of its last match (re.finditer never overlaps)
+                for m in self.keyword_re.finditer(chunk):
+                    pos = m.start()
+                    for i in self.outputs.get(m.group(1).lower(), ()):
+                        if pos < resume.get(i, 0):
+                            continue
+                        found = self.compiled[i].match(chunk, pos)
+                        if found:
+                            hit(i, base + pos)
+                            resume[i] = max(found.end(), pos + 1)
+            for i in self.fallback:
+                for m in self.compiled[i].finditer(chunk):
+                    hit(i, base + m.start())
+            base += len(chunk)
+
+        out = []
+        for i, (count, first, last) in hits.items():
+            rule = self.rules[i]
+            out.append({
+                "rule": rule,
+                "count": count,
+                "first_offset": first,
+                "last_offset": last,
+                "score": round(float(rule.get("weight", 1.0)) * (1 + math.log(count)), 4),
+            })
+        out.sort(key=lambda m: (-m["score"], m["first_offset"]))
+        return out
+
+def load_rules(path: str = RULES_FILE) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yml", ".yaml")):
+            import yaml
+            rules = yaml.safe_load(f) or []
+        else:
+            rules = json.load(f)
+    for i, rule in enumerate(rules):
+        rule.setdefault("id", f"rule-{i}")
+    return rules
+
+class RuleEngine:
+    """A RuleSet that recompiles itself when the rules file changes."""
+
+    def __init__(self, path: str = RULES_FILE):
+        self.path = path
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._ruleset = RuleSet([])
+        self.reload()
+
+    def reload(self) -> RuleSet:
+        mtime = os.stat(self.path).st_mtime_ns
+        ruleset = RuleSet(load_rules(self.path))
+        with self._lock:
+            self._ruleset, self._mtime = ruleset, mtime
+        return ruleset
+
+    def current(self) -> RuleSet:
+        now = time.monotonic()
+        if now - self._checked >= RELOAD_CHECK_SECONDS:
+            self._checked = now
+            try:
+                if os.stat(self.path).st_mtime_ns != self._mtime:
+                    self.reload()
+            except (OSError, ValueError, re.error) as e:
+                print(f"[rules] keeping previous rule set, reload failed: {e}")
+        return self._ruleset
+
+    def scan(self, chunks: Iterable[str]) -> List[Dict[str, Any]]:
+        return self.current().scan(chunks)
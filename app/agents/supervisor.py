@@ -1,27 +1,44 @@
 from app.db.dal import record_step, save_report, mark_done
 from markdown2 import markdown
 
-def compile_report(incident, analysis):
-    # analysis is expected from analyst: {'issue':..., 'root_cause':..., 'mitigations':[...],'evidence':[...]}
-    report_md = f"""
-# Incident {incident['id']} — {incident.get('service','unknown')}
+REPORT_TEMPLATE = """
+# Incident {id} — {service}
 
-**Issue**: {analysis.get('issue','TBD')}
+**Issue**: {issue}
 
-**Root Cause**: {analysis.get('root_cause','TBD')}
+**Root Cause**: {root_cause}
+
+**Confidence**: {confidence}
 
 **Suggested Mitigations**
-{chr(10).join([f'- {m}' for m in analysis.get('mitigations',[])]) or '- TBD'}
+{mitigations}
 
 **Evidence**
-{chr(10).join([f'- {e}' for e in analysis.get('evidence',[])]) or '- TBD'}
+{evidence}
 """
+
+def render_report_md(incident, analysis):
+    # also used by dal.get_latest_report: reports are stored as JSON only and rendered when read
+    return REPORT_TEMPLATE.format(
+        id=incident['id'],
+        service=incident.get('service', 'unknown'),
+        issue=analysis.get('issue', 'TBD'),
+        root_cause=analysis.get('root_cause', 'TBD'),
+        confidence=analysis.get('confidence', 'n/a'),
+        mitigations=chr(10).join([f'- {m}' for m in analysis.get('mitigations', [])]) or '- TBD',
+        evidence=chr(10).join([f'- {e}' for e in analysis.get('evidence', [])]) or '- TBD',
+    )
+
+def compile_report(incident, analysis):
+    # analysis is expected from analyst: {'issue':..., 'root_cause':..., 'mitigations':[...],'evidence':[...]}
+    report_md = render_report_md(incident, analysis)
     report_json = analysis
     return report_json, report_md
 
 def supervisor_orchestrate(incident, analysis):
     record_step(incident['id'], 'supervisor', 'summarize', 'Compiling final report')
     report_json, report_md = compile_report(incident, analysis)
-    save_report(incident['id'], report_json, report_md)
-    mark_done(incident['id'])
+    # claimed_by is set on incidents claimed by a runner worker: only the lease holder may finish it
+    save_report(incident['id'], report_json, report_md, incident.get('claimed_by'))
+    mark_done(incident['id'], incident.get('claimed_by'))
     record_step(incident['id'], 'supervisor', 'done', 'Incident processing complete')
@@ -10,8 +10,14 @@ VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
-LOGS_MODE = os.getenv("LOGS_MODE", "local")
+LOGS_MODE = os.getenv("LOGS_MODE", "local")          # local | s3 | cloudwatch
 LOGS_LOCAL_ROOT = os.getenv("LOGS_LOCAL_ROOT", "app/logs")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")                # objects live under <prefix><folder>/
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
 
 USE_REAL_CLOUDWATCH = os.getenv("USE_REAL_CLOUDWATCH", "false").lower() == "true"
 CLOUDWATCH_LOG_GROUP = os.getenv("CLOUDWATCH_LOG_GROUP", "/aws/lambda/demo")
+# log folder -> log group, e.g. "web=/ecs/web,db=/aws/rds/orders"; default: web=CLOUDWATCH_LOG_GROUP
+CLOUDWATCH_LOG_GROUPS = os.getenv("CLOUDWATCH_LOG_GROUPS", "")
+CLOUDWATCH_REGION = os.getenv("CLOUDWATCH_REGION", S3_REGION)
@@ -1,4 +1,4 @@
-from dal import init_db
+from .dal import init_db
 
 # Initialize the database schema when this package is imported
 init_db()
@@ -0,0 +1,198 @@
+# app/db/blobs.py
+# Content-addressed storage for large payloads: step data_json and report_json
+# at least BLOB_MIN_BYTES long are stored once in the blobs table, compressed
+# (zstd, optionally with a trained dictionary; zlib without zstandard), and the
+# row keeps a "blob:<sha256>" reference instead (JSON text never starts with
+# "b"). Identical payloads - the same traceback, the same report - share one
+# row; refs counts the rows pointing at it so retention can drop the last one.
+# The DAL resolves references on read, so callers still see plain JSON text.
+#   python -m app.db.blobs train [--out blobs.dict] [--size 112640]   train a dictionary from stored steps
+#   python -m app.db.blobs stats
+import os, sys, zlib, hashlib, threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+BLOB_MIN_BYTES = int(os.getenv("BLOB_MIN_BYTES", "1024"))     # smaller payloads stay inline
+BLOB_CODEC = os.getenv("BLOB_CODEC", "zstd")                  # zstd | zlib
+BLOB_LEVEL = int(os.getenv("BLOB_LEVEL", "6"))
+BLOB_DICT = os.getenv("BLOB_DICT", "")      # zstd dictionaries from `... train`, comma-separated: first compresses,
+                                            # all decompress (keep retired ones listed while their blobs exist)
+BLOB_CACHE = int(os.getenv("BLOB_CACHE", "1024"))             # decoded payloads kept in memory (by hash)
+PREFIX = "blob:"
+
+Blob = Tuple[str, str, int, bytes]      # (hash, codec, uncompressed size, data)
+
+_lock = threading.Lock()
+_codec = None
+_cache: LRUCache = LRUCache(maxsize=BLOB_CACHE)
+
+class _Codec:
+    """zstd compressor/decompressors for this process (and the dictionary, if any)."""
+
+    def __init__(self):
+        import zstandard
+        self.zstd = zstandard
+        self.dicts: Dict[str, Any] = {}
+        for path in filter(None, (p.strip() for p in BLOB_DICT.split(","))):
+            with open(path, "rb") as f:
+                d = zstandard.ZstdCompressionDict(f.read())
+            self.dicts[f"zstd+dict:{d.dict_id()}"] = d
+        self.name = next(iter(self.dicts), "zstd")
+        self.dict = self.dicts.get(self.name)
+        self._local = threading.local()           # zstd contexts are not thread-safe
+
+    def compress(self, data: bytes) -> bytes:
+        c = getattr(self._local, "c", None)
+        if c is None:
+            c = self._local.c = self.zstd.ZstdCompressor(level=BLOB_LEVEL, dict_data=self.dict)
+        return c.compress(data)
+
+    def decompress(self, codec: str, data: bytes) -> bytes:
+        if codec != "zstd" and codec not in self.dicts:
+            raise RuntimeError(f"blob was written with {codec}; add that dictionary to BLOB_DICT")
+        ds = getattr(self._local, "d", None)
+        if ds is None:
+            ds = self._local.d = {}
+        d = ds.get(codec)
+        if d is None:
+            d = ds[codec] = self.zstd.ZstdDecompressor(dict_data=self.dicts.get(codec))
+        return d.decompress(data)
+
+def _zstd() -> Optional[_Codec]:
+    global _codec
+    with _lock:
+        if _codec is None:
+            try:
+                _codec = _Codec()
+            except ImportError:
+                _codec = False
+                print("[blobs] zstandard not installed; compressing with zlib")
+        return _codec or None
+
+# ---------- encode / decode ----------
+
+def encode(payload: bytes) -> Blob:
+    digest = hashlib.sha256(payload).hexdigest()
+    z = _zstd() if BLOB_CODEC == "zstd" else None
+    if z is not None:
+        return digest, z.name, len(payload), z.compress(payload)
+    return digest, "zlib", len(payload), zlib.compress(payload, BLOB_LEVEL)
+
+def decode(codec: str, data: bytes) -> bytes:
+    data = bytes(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "raw":
+        return data
+    z = _zstd()
+    if z is None:
+        raise RuntimeError(f"blob was written with {codec}; install zstandard to read it")
+    return z.decompress(codec, data)
+
+def pack(text: str) -> Tuple[str, Optional[Blob]]:
+    """(value to store in the row, blob to write with it or None when kept inline)."""
+    if len(text) < BLOB_MIN_BYTES:
+        return text, None
+    blob = encode(text.encode("utf-8"))
+    with _lock:
+        _cache[blob[0]] = text                    # the writer is usually the next reader
+    return PREFIX + blob[0], blob
+
+# ---------- storage ----------
+
+def put_many(con, blobs: Iterable[Blob], created_at: str) -> None:
+    """Store blobs in the caller's transaction; a known hash just gains a ref."""
+    con.executemany(
+        """INSERT INTO blobs(hash, codec, size, data, refs, created_at) VALUES (?,?,?,?,1,?)
+           ON CONFLICT(hash) DO UPDATE SET refs = blobs.refs + 1""",
+        [(h, codec, size, data, created_at) for h, codec, size, data in blobs],
+    )
+
+def release(con, values: Iterable[Optional[str]]) -> int:
+    """Drop one ref per blob reference in values (rows about to be deleted) and
+    delete blobs nobody points at any more; returns the number deleted."""
+    counts: Dict[str, int] = {}
+    for v in values:
+        if v and v.startswith(PREFIX):
+            counts[v[len(PREFIX):]] = counts.get(v[len(PREFIX):], 0) + 1
+    if not counts:
+        return 0
+    con.executemany("UPDATE blobs SET refs = refs - ? WHERE hash = ?", [(n, h) for h, n in counts.items()])
+    hashes = list(counts)
+    gone = 0
+    for i in range(0, len(hashes), 500):
+        part = hashes[i:i + 500]
+        cur = con.execute(f"DELETE FROM blobs WHERE refs <= 0 AND hash IN ({','.join('?' * len(part))})", part)
+        gone += max(cur.rowcount, 0)
+    with _lock:
+        for h in hashes:
+            _cache.pop(h, None)
+    return gone
+
+def resolve(con, values: List[Optional[str]]) -> List[Optional[str]]:
+    """values with every blob reference replaced by its JSON text (one query per call)."""
+    wanted = {v[len(PREFIX):] for v in values if v and v.startswith(PREFIX)}
+    if not wanted:
+        return values
+    found: Dict[str, str] = {}
+    with _lock:
+        for h in wanted:
+            text = _cache.get(h)
+            if text is not None:
+                found[h] = text
+    missing = [h for h in wanted if h not in found]
+    for i in range(0, len(missing), 500):
+        part = missing[i:i + 500]
+        rows = con.execute(f"SELECT hash, codec, data FROM blobs WHERE hash IN ({','.join('?' * len(part))})",
+                           part).fetchall()
+        for r in rows:
+            text = decode(r["codec"], r["data"]).decode("utf-8")
+            found[r["hash"]] = text
+            with _lock:
+                _cache[r["hash"]] = text
+    return [found.get(v[len(PREFIX):], "{}") if v and v.startswith(PREFIX) else v for v in values]
+
+def resolve_rows(con, rows: List[Dict[str, Any]], column: str) -> List[Dict[str, Any]]:
+    for row, value in zip(rows, resolve(con, [r.get(column) for r in rows])):
+        row[column] = value
+    return rows
+
+# ---------- maintenance ----------
+
+def train(out: str, size: int = 112640, samples: int = 5000) -> str:
+    """Train a zstd dictionary on recent step payloads (inline and blob)."""
+    import zstandard
+    from app.db.engine import transaction
+    with transaction() as con:
+        rows = [dict(r) for r in con.execute(
+            "SELECT data_json FROM agent_steps ORDER BY id DESC LIMIT ?", (samples,)).fetchall()]
+        texts = [v for v in resolve(con, [r["data_json"] for r in rows]) if v and len(v) > 2]
+    if len(texts) < 10:
+        raise SystemExit(f"[blobs] only {len(texts)} payloads to train on; run some incidents first")
+    d = zstandard.train_dictionary(size, [t.encode("utf-8") for t in texts])
+    with open(out + ".tmp", "wb") as f:
+        f.write(d.as_bytes())
+    os.replace(out + ".tmp", out)
+    print(f"[blobs] dictionary {d.dict_id()} ({len(d.as_bytes())} bytes) from {len(texts)} payloads -> {out}; "
+          f"put it first in BLOB_DICT")
+    return out
+
+def stats() -> Dict[str, Any]:
+    from app.db.engine import transaction
+    with transaction() as con:
+        r = con.execute("""SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS raw,
+                                  COALESCE(SUM(LENGTH(data)), 0) AS stored, COALESCE(SUM(refs), 0) AS refs
+                             FROM blobs""").fetchone()
+    return dict(r)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    from app.db.dal import init_db
+    init_db()
+    if args[:1] == ["train"]:
+        train(args[args.index("--out") + 1] if "--out" in args else "blobs.dict",
+              int(args[args.index("--size") + 1]) if "--size" in args else 112640)
+    else:
+        s = stats()
+        print(f"[blobs] {s['n']} blobs, {s['refs']} refs, {s['raw'] / 1e6:.1f} MB -> {s['stored'] / 1e6:.1f} MB stored")
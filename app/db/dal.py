@@ -1,26 +1,34 @@
 # app/db/dal.py
-import os, sqlite3, json, datetime, pathlib
+import json, datetime
 from typing import Any, Dict, Optional, List
+from cachetools import LRUCache
+from app.db import blobs
+from app.db.engine import DB_FILE, transaction
+from app.db.journal import journal
+from app.db.notify import PG_CHANNEL, notify_new_incident, publish_step
+from app.telemetry import step_timings, traced
 
-DB_FILE = os.environ.get("DB_FILE", "dev.db")
+_report_md: LRUCache = LRUCache(maxsize=256)     # (report id, created_at) -> Markdown rendered from report_json
 
-def _now_iso() -> str:
-    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+class LeaseLost(RuntimeError):
+    """The incident's lease passed to another worker; stop working on it."""
 
-def _conn(rowdict: bool = False) -> sqlite3.Connection:
-    con = sqlite3.connect(DB_FILE)
-    con.execute("PRAGMA foreign_keys = ON")
-    if rowdict:
-        con.row_factory = sqlite3.Row
-    return con
+def _now_iso(offset_seconds: float = 0) -> str:
+    ts = datetime.datetime.utcnow() + datetime.timedelta(seconds=offset_seconds)
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _conn(rowdict: bool = False):
+    # Rows always support dict(r); rowdict is kept for call-site readability.
+    return transaction()
 
 def init_db() -> None:
-    sql = pathlib.Path("schema.sql").read_text(encoding="utf-8")
-    with _conn() as con:
-        con.executescript(sql)
+    """Bring the schema up to date (versioned migrations in app/db/migrations/)."""
+    from app.db.migrate import migrate
+    migrate()
 
 # ---------- writes ----------
 
+@traced("dal.record_incident")
 def record_incident(
     status: str,                 # "OPEN" | "IN_PROGRESS" | "DONE" | "FAILED"
     service: str,
@@ -31,63 +39,116 @@ def record_incident(
     incident_id: str | None = None
 ) -> int:
     """Insert a new incident and return its id."""
+    values = (status, service, environment, severity, json.dumps(payload or {}), created_at or _now_iso())
     with _conn() as con:
-        cur = con.execute(
-            """INSERT INTO incidents(id, status, service, environment, severity, payload_json, created_at)
-               VALUES (?,?,?,?,?,?,?)""",
-            (
-                incident_id,                       # None → auto id
-                status,
-                service,
-                environment,
-                severity,
-                json.dumps(payload or {}),
-                created_at or _now_iso(),
-            ),
-        )
-        return incident_id if incident_id is not None else cur.lastrowid
+        if incident_id is None:                # auto id (Postgres won't take an explicit NULL)
+            new_id = con.insert(
+                """INSERT INTO incidents(status, service, environment, severity, payload_json, created_at)
+                   VALUES (?,?,?,?,?,?)""",
+                values,
+            )
+        else:
+            con.execute(
+                """INSERT INTO incidents(id, status, service, environment, severity, payload_json, created_at)
+                   VALUES (?,?,?,?,?,?,?)""",
+                (incident_id, *values),
+            )
+            new_id = incident_id
+        if con.postgres:
+            con.execute("SELECT pg_notify(?, ?)", (PG_CHANNEL, str(new_id)))   # delivered on commit
+    notify_new_incident(new_id)
+    return new_id
 
 def record_step(
     incident_id: int, agent: str, phase: str, message: str,
     data: Dict[str, Any] | None = None, status: str | None = None
 ) -> None:
-    with _conn() as con:
-        con.execute(
-            """INSERT INTO agent_steps(incident_id, agent, phase, message, data_json, ts, status)
-               VALUES(?,?,?,?,?,?,?)""",
-            (incident_id, agent, phase, message, json.dumps(data or {}), _now_iso(), status)
-        )
+    """Buffer a step; it reaches the table within STEP_FLUSH_MS (see app/db/journal.py)
+    and live subscribers right away (see app/middleware/step_stream.py). Large
+    payloads are stored as compressed, shared blobs (app/db/blobs.py)."""
+    timings = step_timings(incident_id)    # spans finished since this incident's previous step
+    if timings:
+        data = {**(data or {}), "timings": timings}
+    text = json.dumps(data or {})
+    value, blob = blobs.pack(text)
+    row = (incident_id, agent, phase, message, value, _now_iso(), status)
+    journal.append(row, phase=phase, blob=blob)
+    publish_step(dict(zip(("incident_id", "agent", "phase", "message", "data_json", "ts", "status"),
+                          (*row[:4], text, *row[5:]))))
+
+def flush_steps() -> int:
+    """Write any buffered steps now."""
+    return journal.flush()
 
-def save_report(incident_id: int, report_json: Dict[str, Any], report_md: str) -> None:
+@traced("dal.save_report")
+def save_report(incident_id: int, report_json: Dict[str, Any], report_md: str,
+                worker_id: str | None = None) -> None:
+    """Store the report and, when the analysis carries similarity features, the
+    incident's MinHash signature (app/rag/similar.py) in the same transaction.
+    Only report_json is kept (as a blob when large); get_latest_report renders
+    the Markdown from it, so report_md is not stored. With worker_id, raises
+    LeaseLost (storing nothing) unless that worker still holds the incident."""
+    sim = report_json.get("similarity") or {}
+    signature = None
+    if sim.get("features"):
+        from app.rag.similar import INDEX, minhash      # imports this module
+        signature = minhash(sim["features"])
+    value, blob = blobs.pack(json.dumps(report_json))
+    now = _now_iso()
     with _conn() as con:
-        con.execute(
-            """INSERT INTO reports(incident_id, report_json, report_md, created_at)
-               VALUES(?,?,?,?)""",
-            (incident_id, json.dumps(report_json), report_md, _now_iso())
-        )
+        if blob:
+            blobs.put_many(con, [blob], now)
+        if worker_id is None:
+            con.execute(
+                """INSERT INTO reports(incident_id, report_json, report_md, created_at)
+                   VALUES(?,?,?,?)""",
+                (incident_id, value, "", now)
+            )
+        else:
+            cur = con.execute(
+                f"""INSERT INTO reports(incident_id, report_json, report_md, created_at)
+                    SELECT ?,?,?,? WHERE EXISTS (SELECT 1 FROM incidents WHERE id=? AND {_HOLDER})""",
+                (incident_id, value, "", now, incident_id, worker_id)
+            )
+            if cur.rowcount != 1:
+                raise LeaseLost(f"incident {incident_id} is no longer held by {worker_id}")
+        if signature is not None:
+            con.execute(
+                """INSERT INTO incident_signatures(incident_id, service, signature, created_at)
+                   VALUES(?,?,?,?)
+                   ON CONFLICT(incident_id) DO UPDATE SET
+                     service=excluded.service, signature=excluded.signature, created_at=excluded.created_at""",
+                (incident_id, sim.get("service") or "unknown", signature, now)
+            )
+    if signature is not None:
+        INDEX.add(incident_id, sim.get("service") or "unknown", signature)
 
 # ---------- reads (for UI) ----------
 
+@traced("dal.list_incidents")
 def list_incidents(limit: int = 200) -> List[Dict[str, Any]]:
-    sql = """SELECT id, status, service, environment, severity, created_at
+    sql = """SELECT id, status, service, environment, severity, created_at, parent_id
              FROM incidents ORDER BY id DESC LIMIT ?"""
     with _conn(rowdict=True) as con:
         rows = con.execute(sql, (limit,)).fetchall()
     return [dict(r) for r in rows]
 
+@traced("dal.get_incident")
 def get_incident(incident_id: int) -> Optional[Dict[str, Any]]:
     with _conn(rowdict=True) as con:
         r = con.execute("SELECT * FROM incidents WHERE id=?", (incident_id,)).fetchone()
     return dict(r) if r else None
 
+@traced("dal.list_steps")
 def list_steps(incident_id: int) -> List[Dict[str, Any]]:
+    journal.flush()   # read-your-writes inside the runner process
     sql = """SELECT id, agent, phase, status, message, ts, data_json
              FROM agent_steps WHERE incident_id=? ORDER BY id ASC"""
     with _conn(rowdict=True) as con:
         rows = con.execute(sql, (incident_id,)).fetchall()
+        rows = blobs.resolve_rows(con, [dict(r) for r in rows], "data_json")
     out: List[Dict[str, Any]] = []
-    for r in rows:
-        d = dict(r)
+    for d in rows:
         try:
             d["data"] = json.loads(d.pop("data_json") or "{}")
         except Exception:
@@ -95,35 +156,257 @@ def list_steps(incident_id: int) -> List[Dict[str, Any]]:
         out.append(d)
     return out
 
+@traced("dal.get_latest_report")
 def get_latest_report(incident_id: int) -> Optional[Dict[str, Any]]:
-    sql = """SELECT id, report_json, report_md, created_at
-             FROM reports WHERE incident_id=? ORDER BY id DESC LIMIT 1"""
+    """Latest report of the incident; GROUPED incidents get their parent's.
+    report_md is rendered from the report when it was not stored."""
+    sql = """SELECT r.id, r.incident_id, r.report_json, r.report_md, r.created_at, i.service
+             FROM reports r LEFT JOIN incidents i ON i.id = r.incident_id
+             WHERE r.incident_id = COALESCE((SELECT parent_id FROM incidents WHERE id=?), ?)
+             ORDER BY r.id DESC LIMIT 1"""
     with _conn(rowdict=True) as con:
-        r = con.execute(sql, (incident_id,)).fetchone()
-    if not r:
-        return None
-    d = dict(r)
+        r = con.execute(sql, (incident_id, incident_id)).fetchone()
+        if not r:
+            return None
+        d = blobs.resolve_rows(con, [dict(r)], "report_json")[0]
+    service = d.pop("service")
     try:
         d["report"] = json.loads(d.pop("report_json") or "{}")
     except Exception:
         d["report"] = {}
+    if not d["report_md"]:
+        key = (d["id"], d["created_at"])
+        md = _report_md.get(key)
+        if md is None:
+            from app.agents.supervisor import render_report_md     # imports this module
+            md = _report_md[key] = render_report_md({"id": d["incident_id"], "service": service}, d["report"])
+        d["report_md"] = md
     return d
 
+@traced("dal.load_signatures")
+def load_signatures(after_id: int = 0, limit: int = 10000) -> List[Dict[str, Any]]:
+    """incident_signatures rows past after_id, in id order (similarity index loads)."""
+    sql = """SELECT id, incident_id, service, signature FROM incident_signatures
+             WHERE id > ? ORDER BY id LIMIT ?"""
+    with _conn(rowdict=True) as con:
+        rows = con.execute(sql, (after_id, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+# ---------- paged / incremental reads (dashboard) ----------
+
+def _match(col: str, value, where: List[str], params: List[Any]) -> None:
+    # a str filters on equality, a list/tuple on membership; empty means "any"
+    if not value:
+        return
+    if isinstance(value, str):
+        where.append(f"{col} = ?")
+        params.append(value)
+    else:
+        where.append(f"{col} IN ({','.join('?' * len(value))})")
+        params.extend(value)
+
+@traced("dal.page_incidents")
+def page_incidents(
+    before_id: int | None = None, limit: int = 50,
+    status=None, service=None, severity=None,
+    since: str | None = None, until: str | None = None,
+) -> List[Dict[str, Any]]:
+    """One page of incidents, newest first. Keyset pagination: pass the last id
+    of the previous page as before_id, so page N costs the same as page 1.
+    since/until bound created_at (ISO8601 UTC, until exclusive)."""
+    where: List[str] = []
+    params: List[Any] = []
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    _match("status", status, where, params)
+    _match("service", service, where, params)
+    _match("severity", severity, where, params)
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+    sql = f"""SELECT id, status, service, environment, severity, created_at, parent_id
+              FROM incidents {'WHERE ' + ' AND '.join(where) if where else ''}
+              ORDER BY id DESC LIMIT ?"""
+    with _conn(rowdict=True) as con:
+        rows = con.execute(sql, (*params, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+@traced("dal.incident_facets")
+def incident_facets() -> Dict[str, List[str]]:
+    """{"status": [...], "service": [...], "severity": [...]} distinct values for the filter widgets."""
+    out: Dict[str, List[str]] = {}
+    with _conn(rowdict=True) as con:
+        for col in ("status", "service", "severity"):
+            rows = con.execute(f"SELECT DISTINCT {col} FROM incidents ORDER BY {col}").fetchall()
+            out[col] = [r[col] for r in rows]
+    return out
+
+@traced("dal.change_token")
+def change_token(incident_id: int | None = None) -> str:
+    """Cheap version stamp for UI caches (index seeks only). Without an id it
+    moves when any incident, step or report is added or a live incident
+    finishes; with one, when that incident's status, steps or report change."""
+    with _conn(rowdict=True) as con:
+        if incident_id is None:
+            r = con.execute(
+                """SELECT (SELECT MAX(id) FROM incidents) AS inc, (SELECT MAX(id) FROM agent_steps) AS step,
+                          (SELECT MAX(id) FROM reports) AS rep,
+                          (SELECT COUNT(*) FROM incidents WHERE status IN ('OPEN', 'IN_PROGRESS')) AS live"""
+            ).fetchone()
+        else:
+            r = con.execute(
+                """SELECT i.status,
+                          (SELECT MAX(id) FROM agent_steps WHERE incident_id = i.id) AS step,
+                          (SELECT MAX(id) FROM reports WHERE incident_id = COALESCE(i.parent_id, i.id)) AS rep
+                     FROM incidents i WHERE i.id = ?""",
+                (incident_id,),
+            ).fetchone()
+    return ":".join(str(v) for v in dict(r).values()) if r else ""
+
+@traced("dal.steps_after")
+def steps_after(incident_id: int, after_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+    """Steps of an incident with id > after_id, oldest first, for tailing the
+    timeline. data_json is returned undecoded; json.loads it when displayed."""
+    journal.flush()
+    sql = """SELECT id, agent, phase, status, message, ts, data_json
+             FROM agent_steps WHERE incident_id=? AND id > ? ORDER BY id ASC LIMIT ?"""
+    with _conn(rowdict=True) as con:
+        rows = con.execute(sql, (incident_id, after_id, limit)).fetchall()
+        return blobs.resolve_rows(con, [dict(r) for r in rows], "data_json")
+
 # ---------- helpers for the agent loop ----------
 
+@traced("dal.get_open_incidents")
 def get_open_incidents() -> List[Dict[str, Any]]:
     with _conn(rowdict=True) as con:
         rows = con.execute("SELECT * FROM incidents WHERE status='OPEN' ORDER BY id ASC").fetchall()
     return [dict(r) for r in rows]
 
+@traced("dal.get_incidents_after")
+def get_incidents_after(last_id: int, limit: int = 500) -> List[Dict[str, Any]]:
+    """Incidents with id > last_id, oldest first (intake high-water-mark reads)."""
+    with _conn(rowdict=True) as con:
+        rows = con.execute(
+            "SELECT * FROM incidents WHERE id > ? ORDER BY id ASC LIMIT ?", (last_id, limit)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+@traced("dal.mark_in_progress")
 def mark_in_progress(incident_id: int) -> None:
     with _conn() as con:
         con.execute("UPDATE incidents SET status='IN_PROGRESS' WHERE id=?", (incident_id,))
 
-def mark_done(incident_id: int) -> None:
+_HOLDER = "claimed_by=? AND status='IN_PROGRESS'"     # the worker still holds the lease
+
+def _finish(incident_id: int, status: str, worker_id: str | None) -> None:
+    journal.flush()
     with _conn() as con:
-        con.execute("UPDATE incidents SET status='DONE' WHERE id=?", (incident_id,))
+        if worker_id is None:
+            con.execute(f"UPDATE incidents SET status='{status}', lease_expires_at=NULL WHERE id=?", (incident_id,))
+            return
+        cur = con.execute(
+            f"UPDATE incidents SET status='{status}', lease_expires_at=NULL WHERE id=? AND {_HOLDER}",
+            (incident_id, worker_id),
+        )
+        if cur.rowcount != 1:
+            raise LeaseLost(f"incident {incident_id} is no longer held by {worker_id}")
+
+@traced("dal.mark_done")
+def mark_done(incident_id: int, worker_id: str | None = None) -> None:
+    """DONE; with worker_id only if that worker still holds it, else LeaseLost."""
+    _finish(incident_id, "DONE", worker_id)
+
+@traced("dal.mark_failed")
+def mark_failed(incident_id: int, worker_id: str | None = None) -> None:
+    """FAILED; with worker_id only if that worker still holds it, else LeaseLost."""
+    _finish(incident_id, "FAILED", worker_id)
+
+# ---------- correlation ----------
+
+@traced("dal.set_fingerprint")
+def set_fingerprint(incident_id: int, fingerprint: str) -> None:
+    with _conn() as con:
+        con.execute("UPDATE incidents SET fingerprint=? WHERE id=?", (fingerprint, incident_id))
+
+@traced("dal.group_incident")
+def group_incident(incident_id: int, parent_id: int, fingerprint: str) -> bool:
+    """Park a duplicate under parent_id instead of analysing it; False (and
+    nothing changed) when the parent has failed meanwhile."""
+    journal.flush()
+    with _conn() as con:
+        cur = con.execute(
+            """UPDATE incidents SET status='GROUPED', parent_id=?, fingerprint=?, lease_expires_at=NULL
+                WHERE id=? AND EXISTS (SELECT 1 FROM incidents p WHERE p.id=? AND p.status != 'FAILED')""",
+            (parent_id, fingerprint, incident_id, parent_id),
+        )
+        return cur.rowcount == 1
 
-def mark_failed(incident_id: int) -> None:
+@traced("dal.reopen_children")
+def reopen_children(parent_id: int) -> List[int]:
+    """Send the GROUPED duplicates of a failed parent back to the queue (OPEN,
+    ungrouped); returns their ids. The first one claimed becomes the new parent."""
     with _conn() as con:
-        con.execute("UPDATE incidents SET status='FAILED' WHERE id=?", (incident_id,))
+        rows = con.execute(
+            """UPDATE incidents SET status='OPEN', parent_id=NULL, claimed_by=NULL, lease_expires_at=NULL
+                WHERE parent_id=? AND status='GROUPED'
+            RETURNING id""",
+            (parent_id,),
+        ).fetchall()
+    return sorted(r["id"] for r in rows)
+
+@traced("dal.recent_groups")
+def recent_groups(since: str) -> List[Dict[str, Any]]:
+    """One row per (parent, fingerprint) seen at or after `since`:
+    {parent_id, fingerprint, last_seen, parent_created}."""
+    with _conn(rowdict=True) as con:
+        rows = con.execute(
+            """SELECT COALESCE(i.parent_id, i.id) AS parent_id, i.fingerprint, MAX(i.created_at) AS last_seen,
+                      MIN(COALESCE(p.created_at, i.created_at)) AS parent_created
+                 FROM incidents i LEFT JOIN incidents p ON p.id = i.parent_id
+                WHERE i.fingerprint IS NOT NULL AND i.created_at >= ?
+                  AND COALESCE(p.status, i.status) != 'FAILED'
+                GROUP BY COALESCE(i.parent_id, i.id), i.fingerprint
+                ORDER BY last_seen ASC""",
+            (since,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+# ---------- claim / lease (concurrent runners) ----------
+
+# the IN term matches the partial index idx_incidents_live (migration 0003): on a
+# large table both Postgres and SQLite walk it in id order and stop at the first
+# claimable row, rather than collecting every live row from idx_incidents_status_id
+_CLAIMABLE = "status IN ('OPEN', 'IN_PROGRESS') AND (status='OPEN' OR lease_expires_at < ?)"
+
+@traced("dal.claim_incident")
+def claim_incident(worker_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+    """Atomically move the oldest OPEN (or lease-expired) incident to IN_PROGRESS
+    for worker_id and return it, or None when there is nothing to claim."""
+    now = _now_iso()
+    pick = f"SELECT id FROM incidents WHERE {_CLAIMABLE} ORDER BY id ASC LIMIT 1"
+    with _conn(rowdict=True) as con:
+        if con.postgres:
+            pick += " FOR UPDATE SKIP LOCKED"
+        r = con.execute(
+            f"""UPDATE incidents
+                   SET status='IN_PROGRESS', claimed_by=?, lease_expires_at=?, attempts=attempts+1
+                 WHERE id = ({pick}) AND {_CLAIMABLE}
+             RETURNING *""",
+            (worker_id, _now_iso(lease_seconds), now, now),
+        ).fetchone()
+    return dict(r) if r else None
+
+@traced("dal.renew_lease")
+def renew_lease(incident_id: int, worker_id: str, lease_seconds: int) -> bool:
+    """Extend our lease; False means another worker has reclaimed the incident."""
+    with _conn() as con:
+        cur = con.execute(
+            """UPDATE incidents SET lease_expires_at=?
+                WHERE id=? AND claimed_by=? AND status='IN_PROGRESS'""",
+            (_now_iso(lease_seconds), incident_id, worker_id),
+        )
+        return cur.rowcount == 1
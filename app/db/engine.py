@@ -0,0 +1,162 @@
+# app/db/engine.py
+# Connection layer behind the DAL: one long-lived connection per thread
+# (re-opened after fork, closed when the thread ends), SQLite in WAL mode or
+# Postgres when DB_URL says so.
+import os, re, sqlite3, threading, atexit, functools, weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+from app.config import DB_URL
+
+def _sqlite_path(url: str) -> str:
+    # sqlite:///dev.db -> dev.db, sqlite:////tmp/x.db -> /tmp/x.db
+    return url[len("sqlite:///"):] if url.startswith("sqlite:///") else "dev.db"
+
+DB_FILE = os.environ.get("DB_FILE") or _sqlite_path(DB_URL)     # DB_FILE overrides the path in DB_URL
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")   # OFF | NORMAL | FULL
+SQLITE_CACHE_KB = int(os.environ.get("SQLITE_CACHE_KB", "16384"))
+STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE", "256"))
+
+def is_postgres(url: str | None = None) -> bool:
+    return (url if url is not None else DB_URL).startswith(("postgres://", "postgresql"))
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _pg_sql(sql: str) -> str:
+    # DAL statements use qmark params; psycopg wants %s
+    return sql.replace("%", "%%").replace("?", "%s")
+
+def _pg_dsn(url: str) -> str:
+    # accept SQLAlchemy-style URLs (postgresql+psycopg://...) as well as plain DSNs
+    return re.sub(r"^postgresql\+\w+://", "postgresql://", url)
+
+class Connection:
+    """Thin adapter so the DAL can run the same qmark SQL on SQLite and Postgres."""
+
+    def __init__(self, raw: Any, postgres: bool):
+        self.raw = raw
+        self.postgres = postgres
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        if self.postgres:
+            cur = self.raw.cursor()
+            cur.execute(_pg_sql(sql), params)
+            return cur
+        return self.raw.execute(sql, params)
+
+    def executemany(self, sql: str, seq: Sequence[Sequence[Any]]):
+        if self.postgres:
+            cur = self.raw.cursor()
+            cur.executemany(_pg_sql(sql), seq)
+            return cur
+        return self.raw.executemany(sql, seq)
+
+    def executescript(self, sql: str) -> None:
+        if self.postgres:
+            self.raw.execute(sql, prepare=False)     # multi-statement scripts can't be prepared
+        else:
+            self.raw.executescript(sql)
+
+    def insert(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run an INSERT and return the new row id."""
+        if self.postgres:
+            return self.execute(sql + " RETURNING id", params).fetchone()["id"]
+        return self.raw.execute(sql, params).lastrowid
+
+    def commit(self) -> None:
+        self.raw.commit()
+
+    def rollback(self) -> None:
+        self.raw.rollback()
+
+    def close(self) -> None:
+        self.raw.close()
+
+def _open_sqlite(path: str) -> Connection:
+    raw = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,        # used by one thread only, but may be closed from another
+    )
+    raw.row_factory = sqlite3.Row
+    raw.execute("PRAGMA journal_mode = WAL")
+    raw.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    raw.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    raw.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    raw.execute("PRAGMA temp_store = MEMORY")
+    raw.execute("PRAGMA foreign_keys = ON")
+    return Connection(raw, postgres=False)
+
+def _open_postgres(url: str) -> Connection:
+    import psycopg                      # optional dependency, only needed for Postgres
+    from psycopg.rows import dict_row
+    raw = psycopg.connect(_pg_dsn(url), row_factory=dict_row, prepare_threshold=0)
+    return Connection(raw, postgres=True)
+
+class _Handle:
+    """Holds a thread's connection in _local. When the thread ends its locals
+    are dropped, and the finalizer on this handle closes the connection."""
+    __slots__ = ("con", "pid", "gen", "__weakref__")
+
+    def __init__(self, con: Connection):
+        self.con, self.pid, self.gen = con, os.getpid(), _generation
+
+_local = threading.local()
+_open: Dict[int, Tuple[Connection, int]] = {}     # id -> (connection, pid that opened it), for close_all()
+_all_lock = threading.Lock()
+_generation = 0     # bumped by close_all() so other threads drop stale handles
+
+def _close(con: Connection, pid: int) -> None:
+    if pid != os.getpid():
+        return                          # inherited over fork: closing would end the parent's session
+    try:
+        con.close()
+    except Exception:
+        pass
+
+def _release(con: Connection) -> None:
+    with _all_lock:
+        entry = _open.pop(id(con), None)
+    if entry is not None:               # else already closed by close_all()
+        _close(*entry)
+
+def get_connection() -> Connection:
+    """Return this thread's connection, opening it on first use (or after fork)."""
+    h = getattr(_local, "handle", None)
+    if h is not None and h.pid == os.getpid() and h.gen == _generation:
+        return h.con
+    con = _open_postgres(DB_URL) if is_postgres() else _open_sqlite(DB_FILE)
+    h = _local.handle = _Handle(con)
+    weakref.finalize(h, _release, con).atexit = False
+    with _all_lock:
+        _open[id(con)] = (con, h.pid)
+    return con
+
+@contextmanager
+def transaction() -> Iterator[Connection]:
+    """Yield the thread's connection; commit on success, roll back on error."""
+    con = get_connection()
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    else:
+        con.commit()
+
+def open_connections() -> int:
+    with _all_lock:
+        return len(_open)
+
+def close_all() -> None:
+    global _generation
+    with _all_lock:
+        _generation += 1
+        cons = list(_open.values())
+        _open.clear()
+    for con, pid in cons:
+        _close(con, pid)
+
+atexit.register(close_all)
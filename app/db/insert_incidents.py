@@ -1,5 +1,5 @@
 import time
-from dal import record_incident   # import your DAL function
+from app.db.dal import record_incident   # import your DAL function
 
 # Incidents to insert
 incidents = [
@@ -0,0 +1,111 @@
+# app/db/journal.py
+# Buffered agent-step journal: record_step appends here and rows are written with
+# one executemany per flush instead of one transaction per step. Large payloads
+# travel alongside their row as blobs (app/db/blobs.py), stored in the same
+# transaction.
+import os, threading, atexit, time
+from typing import Any, List, Optional, Tuple
+
+from app.db import blobs as blob_store
+from app.db.engine import transaction
+from app.telemetry import span
+
+STEP_FLUSH_MS = int(os.environ.get("STEP_FLUSH_MS", "250"))     # max staleness seen by the UI; 0 = write-through
+STEP_FLUSH_ROWS = int(os.environ.get("STEP_FLUSH_ROWS", "64"))  # flush early once this many rows are buffered
+FLUSH_PHASES = {"done", "error"}                                # phase boundaries that force a flush
+
+INSERT_STEP = """INSERT INTO agent_steps(incident_id, agent, phase, message, data_json, ts, status)
+                 VALUES(?,?,?,?,?,?,?)"""
+
+Row = Tuple[Any, ...]
+
+class StepJournal:
+    def __init__(self, max_delay_ms: int = STEP_FLUSH_MS, max_rows: int = STEP_FLUSH_ROWS):
+        self.max_delay = max_delay_ms / 1000
+        self.max_rows = max(1, max_rows)
+        self._buf: List[Row] = []
+        self._blobs: List[blob_store.Blob] = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()          # guards _buf
+        self._flush_lock = threading.Lock()    # serialises writers so batches land in order
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid = os.getpid()
+
+    def append(self, row: Row, phase: str | None = None, blob: Optional[blob_store.Blob] = None) -> None:
+        if self.max_delay <= 0:
+            self._write([row], [blob] if blob else [])
+            return
+        with self._lock:
+            if os.getpid() != self._pid:       # forked child: parent's buffer is not ours
+                self._buf, self._blobs, self._thread, self._pid = [], [], None, os.getpid()
+            if not self._buf:
+                self._oldest = time.monotonic()
+            self._buf.append(row)
+            if blob:
+                self._blobs.append(blob)
+            full = len(self._buf) >= self.max_rows
+            self._ensure_thread()
+        if full or phase in FLUSH_PHASES:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buf = self._buf, []
+                stored, self._blobs = self._blobs, []
+            if not rows:
+                return 0
+            try:
+                self._write(rows, stored)
+            except Exception:
+                with self._lock:               # keep them for the next attempt, in order
+                    self._buf[:0] = rows
+                    self._blobs[:0] = stored
+                raise
+            return len(rows)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def _write(self, rows: List[Row], stored: List[blob_store.Blob]) -> None:
+        with span("dal.flush_steps", rows=len(rows), blobs=len(stored)), transaction() as con:
+            if stored:
+                blob_store.put_many(con, stored, rows[0][5])
+            con.executemany(INSERT_STEP, rows)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="step-journal", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                due = self._oldest + self.max_delay - time.monotonic() if self._buf else None
+            if due is None:
+                continue
+            if due > 0:
+                time.sleep(due)
+            try:
+                self.flush()
+            except Exception as e:
+                print("[journal] flush failed, will retry:", e)
+                self._wake.set()
+                time.sleep(self.max_delay)
+
+journal = StepJournal()
+
+def _flush_at_exit() -> None:
+    try:
+        journal.flush()
+    except Exception as e:
+        print("[journal] could not flush steps at exit:", e)
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,86 @@
+# app/db/migrate.py
+# Versioned schema migrations. Files in app/db/migrations/ named NNNN_name.sql
+# (a script) or NNNN_name.py (with upgrade(con)) are applied in order, each in
+# its own transaction, and recorded in schema_migrations. SQL is written for
+# SQLite and translated for Postgres.
+#   python -m app.db.migrate            apply pending migrations
+#   python -m app.db.migrate --status   list applied / pending
+import re, sys, datetime, pathlib, importlib.util
+from typing import List, Tuple
+
+from app.db.engine import transaction
+
+MIGRATIONS_DIR = pathlib.Path(__file__).with_name("migrations")
+_NAME = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+def _pg_schema(sql: str) -> str:
+    sql = re.sub(r"(?im)^\s*PRAGMA[^;]*;", "", sql)
+    sql = re.sub(r"\bBLOB\b", "BYTEA", sql)
+    return re.sub(r"INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT", "BIGSERIAL PRIMARY KEY", sql, flags=re.I)
+
+def discover() -> List[Tuple[int, str, pathlib.Path]]:
+    found = []
+    for path in MIGRATIONS_DIR.iterdir():
+        m = _NAME.match(path.name)
+        if m:
+            found.append((int(m.group(1)), m.group(2), path))
+    found.sort()
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration numbers in {MIGRATIONS_DIR}")
+    return found
+
+def _applied(con) -> set:
+    con.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                     version    INTEGER PRIMARY KEY,
+                     name       TEXT NOT NULL,
+                     applied_at TEXT NOT NULL)""")
+    return {r["version"] for r in con.execute("SELECT version FROM schema_migrations").fetchall()}
+
+def _apply(con, version: int, name: str, path: pathlib.Path) -> None:
+    if path.suffix == ".py":
+        spec = importlib.util.spec_from_file_location(f"_migration_{version:04d}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(con)
+    else:
+        sql = path.read_text(encoding="utf-8")
+        if con.postgres:
+            con.executescript(_pg_schema(sql))
+        else:
+            # executescript() commits first; BEGIN makes the script one transaction
+            # that the commit below (with the bookkeeping row) closes
+            con.executescript("BEGIN;\n" + sql)
+    con.execute(
+        "INSERT INTO schema_migrations(version, name, applied_at) VALUES (?,?,?) ON CONFLICT DO NOTHING",
+        (version, name, datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")),
+    )
+
+def migrate(verbose: bool = False) -> List[int]:
+    """Apply pending migrations; returns the versions applied. Migrations are
+    idempotent, so concurrent starters racing here is harmless."""
+    with transaction() as con:
+        done = _applied(con)
+    applied = []
+    for version, name, path in discover():
+        if version in done:
+            continue
+        with transaction() as con:
+            _apply(con, version, name, path)
+        applied.append(version)
+        if verbose:
+            print(f"[migrate] applied {path.name}")
+    return applied
+
+def status() -> List[Tuple[int, str, bool]]:
+    with transaction() as con:
+        done = _applied(con)
+    return [(v, n, v in done) for v, n, _ in discover()]
+
+if __name__ == "__main__":
+    if "--status" in sys.argv[1:]:
+        for version, name, ok in status():
+            print(f"{version:04d} {name:<28} {'applied' if ok else 'pending'}")
+    else:
+        applied = migrate(verbose=True)
+        print(f"[migrate] {len(applied)} migration(s) applied" if applied else "[migrate] up to date")
@@ -1,5 +1,23 @@
+-- 0001: base tables. Applied by app/db/migrate.py; never edit a released
+-- migration, add a new numbered file instead.
 PRAGMA foreign_keys = ON;
 
+-- minimal incidents table (if you don’t have one yet); first, reports references it
+CREATE TABLE IF NOT EXISTS incidents(
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  status      TEXT NOT NULL,        -- OPEN | IN_PROGRESS | DONE | FAILED | GROUPED
+  service     TEXT NOT NULL,
+  environment TEXT NOT NULL,
+  severity    TEXT NOT NULL,
+  payload_json TEXT,
+  created_at  TEXT NOT NULL,
+  claimed_by  TEXT,                 -- runner worker holding the lease
+  lease_expires_at TEXT,            -- ISO8601 UTC; expired IN_PROGRESS rows are reclaimed
+  attempts    INTEGER NOT NULL DEFAULT 0,
+  fingerprint TEXT,                 -- correlation key (app/middleware/correlator.py)
+  parent_id   INTEGER               -- GROUPED duplicates point at the incident that was analysed
+);
+
 -- every agent step (timeline row)
 CREATE TABLE IF NOT EXISTS agent_steps (
   id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,17 +40,6 @@ CREATE TABLE IF NOT EXISTS reports (
   FOREIGN KEY (incident_id) REFERENCES incidents(id) ON DELETE CASCADE
 );
 
--- minimal incidents table (if you don’t have one yet)
-CREATE TABLE IF NOT EXISTS incidents(
-  id          TEXT PRIMARY KEY,
-  status      TEXT NOT NULL,        -- OPEN | IN_PROGRESS | DONE | FAILED
-  service     TEXT NOT NULL,
-  environment TEXT NOT NULL,
-  severity    TEXT NOT NULL,
-  payload_json TEXT,
-  created_at  TEXT NOT NULL
-);
-
 -- indexes for fast UI reads
 CREATE INDEX IF NOT EXISTS idx_steps_inc_ts   ON agent_steps(incident_id, ts);
 CREATE INDEX IF NOT EXISTS idx_reports_inc_dt ON reports(incident_id, created_at);
@@ -0,0 +1,23 @@
+# 0002: columns added to incidents after databases were already in use
+# (lease/claim, correlation). CREATE TABLE IF NOT EXISTS in 0001 won't add
+# them to an existing table, so add whichever are missing.
+COLUMNS = {
+    "incidents": {
+        "claimed_by": "TEXT",
+        "lease_expires_at": "TEXT",
+        "attempts": "INTEGER NOT NULL DEFAULT 0",
+        "fingerprint": "TEXT",
+        "parent_id": "INTEGER",
+    },
+}
+
+def upgrade(con) -> None:
+    for table, cols in COLUMNS.items():
+        if con.postgres:
+            for name, decl in cols.items():
+                con.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {decl}")
+            continue
+        have = {r["name"] for r in con.execute(f"PRAGMA table_info({table})").fetchall()}
+        for name, decl in cols.items():
+            if name not in have:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
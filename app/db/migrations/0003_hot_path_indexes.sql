@@ -0,0 +1,21 @@
+-- 0003: indexes shaped like the DAL's hot queries.
+
+-- get_open_incidents / claim_incident: only the (few) live rows are indexed,
+-- however many finished rows pile up. The WHERE clauses must match dal.py literally.
+CREATE INDEX IF NOT EXISTS idx_incidents_open ON incidents(id) WHERE status = 'OPEN';
+CREATE INDEX IF NOT EXISTS idx_incidents_live ON incidents(id) WHERE status IN ('OPEN', 'IN_PROGRESS');
+
+-- correlator: recent_groups / fingerprint lookups
+CREATE INDEX IF NOT EXISTS idx_incidents_fp ON incidents(fingerprint, created_at);
+
+-- retention: finished rows by age (the WHERE must match app/db/retention.py literally)
+CREATE INDEX IF NOT EXISTS idx_incidents_finished ON incidents(created_at) WHERE status IN ('DONE', 'GROUPED');
+
+-- list_steps (WHERE incident_id=? ORDER BY id) and
+-- get_latest_report (WHERE incident_id=? ORDER BY id DESC LIMIT 1): seek + ordered range
+CREATE INDEX IF NOT EXISTS idx_steps_inc_id ON agent_steps(incident_id, id);
+CREATE INDEX IF NOT EXISTS idx_reports_inc_id ON reports(incident_id, id);
+
+-- superseded by the two above (nothing orders by ts / created_at per incident)
+DROP INDEX IF EXISTS idx_steps_inc_ts;
+DROP INDEX IF EXISTS idx_reports_inc_dt;
@@ -0,0 +1,14 @@
+-- 0004: cold storage for app/db/retention.py. One row per archived incident:
+-- the incident, its steps and reports as zlib-compressed JSON.
+CREATE TABLE IF NOT EXISTS incident_archive (
+  incident_id INTEGER PRIMARY KEY,
+  service     TEXT NOT NULL,
+  status      TEXT NOT NULL,
+  created_at  TEXT NOT NULL,
+  archived_at TEXT NOT NULL,
+  n_steps     INTEGER NOT NULL,
+  codec       TEXT NOT NULL,        -- zlib
+  blob        BLOB NOT NULL         -- {"incident": {...}, "steps": [...], "reports": [...]}
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_service_created ON incident_archive(service, created_at);
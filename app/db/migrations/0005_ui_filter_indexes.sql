@@ -0,0 +1,6 @@
+-- 0005: indexes for the dashboard's filtered, keyset-paginated incident list
+-- (dal.page_incidents: WHERE <filter> = ? AND id < ? ORDER BY id DESC LIMIT ?).
+-- Each one also serves the DISTINCT facet lists in dal.incident_facets.
+CREATE INDEX IF NOT EXISTS idx_incidents_status_id   ON incidents(status, id);
+CREATE INDEX IF NOT EXISTS idx_incidents_service_id  ON incidents(service, id);
+CREATE INDEX IF NOT EXISTS idx_incidents_severity_id ON incidents(severity, id);
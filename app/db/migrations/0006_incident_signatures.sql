@@ -0,0 +1,10 @@
+-- 0006: MinHash signatures of analysed incidents (app/rag/similar.py), written
+-- by dal.save_report and read incrementally by id into the in-memory LSH index.
+-- Kept when retention archives the incident, so old RCAs stay reusable.
+CREATE TABLE IF NOT EXISTS incident_signatures (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  incident_id INTEGER NOT NULL UNIQUE,
+  service     TEXT NOT NULL,
+  signature   BLOB NOT NULL,      -- 64 little-endian uint32 MinHash values
+  created_at  TEXT NOT NULL
+);
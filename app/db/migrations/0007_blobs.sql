@@ -0,0 +1,12 @@
+-- 0007: content-addressed, compressed payload storage (app/db/blobs.py).
+-- agent_steps.data_json / reports.report_json hold "blob:<hash>" for payloads
+-- of BLOB_MIN_BYTES or more; refs counts those rows. New reports store an
+-- empty report_md: it is rendered from report_json when read.
+CREATE TABLE IF NOT EXISTS blobs (
+  hash       TEXT PRIMARY KEY,      -- sha256 of the uncompressed JSON
+  codec      TEXT NOT NULL,         -- zstd | zstd+dict:<dict id> | zlib
+  size       INTEGER NOT NULL,      -- uncompressed bytes
+  data       BLOB NOT NULL,
+  refs       INTEGER NOT NULL,
+  created_at TEXT NOT NULL
+);
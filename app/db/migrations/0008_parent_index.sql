@@ -0,0 +1,3 @@
+-- 0008: incidents by parent, for retention (a parent is archived with its
+-- GROUPED duplicates) and dal.reopen_children.
+CREATE INDEX IF NOT EXISTS idx_incidents_parent ON incidents(parent_id);
@@ -0,0 +1,65 @@
+# app/db/notify.py
+# Best-effort datagrams: the "new incident" wake-up sent by record_incident and
+# received by app/middleware/intake.py, and the per-step events record_step sends
+# to the live step stream. Losing one only costs latency: intake still falls back
+# to a slow safety poll and the UI to reading the DB.
+import os, json, socket
+from typing import Any, Dict, Tuple
+
+# "host:port" (UDP) or "unix:/path/to.sock" (datagram socket); empty disables
+INTAKE_NOTIFY_ADDR = os.environ.get("INTAKE_NOTIFY_ADDR", "127.0.0.1:8765")
+PG_CHANNEL = "incidents_new"   # LISTEN/NOTIFY channel when DB_URL is Postgres
+
+def parse_addr(addr: str) -> Tuple[int, Any]:
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, addr[len("unix:"):]
+    host, port = addr.rsplit(":", 1)
+    return socket.AF_INET, (host, int(port))
+
+_sock: socket.socket | None = None
+
+def notify_new_incident(incident_id: Any) -> None:
+    global _sock
+    if not INTAKE_NOTIFY_ADDR:
+        return
+    family, target = parse_addr(INTAKE_NOTIFY_ADDR)
+    try:
+        if _sock is None or _sock.family != family:
+            _sock = socket.socket(family, socket.SOCK_DGRAM)
+            _sock.setblocking(False)
+        _sock.sendto(str(incident_id).encode(), target)
+    except OSError:
+        pass   # nobody listening
+
+# ---------- agent steps (live timeline, see app/middleware/step_stream.py) ----------
+
+# where record_step sends each step as a JSON datagram; empty disables
+STEP_STREAM_ADDR = os.environ.get("STEP_STREAM_ADDR", "127.0.0.1:8766")
+STEP_STREAM_MAX_BYTES = 60000   # bigger payloads go out without data_json (the UI reads it from the DB)
+
+_step_sock: socket.socket | None = None
+_step_sink: Tuple[int, Any] | None = None   # (pid, publish) when this process hosts the stream hub
+
+def set_step_sink(publish) -> None:
+    """Deliver this process's steps straight to an in-process hub instead of via UDP."""
+    global _step_sink
+    _step_sink = (os.getpid(), publish) if publish else None
+
+def publish_step(event: Dict[str, Any]) -> None:
+    global _step_sock
+    if _step_sink is not None and _step_sink[0] == os.getpid():   # a forked worker has no hub threads
+        _step_sink[1](event)
+        return
+    if not STEP_STREAM_ADDR:
+        return
+    msg = json.dumps(event).encode()
+    if len(msg) > STEP_STREAM_MAX_BYTES:
+        msg = json.dumps({**event, "data_json": None, "truncated": True}).encode()
+    family, target = parse_addr(STEP_STREAM_ADDR)
+    try:
+        if _step_sock is None or _step_sock.family != family:
+            _step_sock = socket.socket(family, socket.SOCK_DGRAM)
+            _step_sock.setblocking(False)
+        _step_sock.sendto(msg, target)
+    except OSError:
+        pass   # no stream server running
@@ -0,0 +1,111 @@
+# app/db/retention.py
+# Retention job: DONE (and GROUPED) incidents older than RETENTION_DAYS move,
+# with their steps and reports, out of the hot tables into compressed cold
+# storage - the incident_archive table (default) or gzip JSONL files under
+# ARCHIVE_DIR - so hot-table scans don't grow with history. Archives hold the
+# payloads themselves, not blob references; the rows' blob refs are released.
+# GROUPED duplicates show their parent's report, so they move with the parent.
+#   python -m app.db.retention [--days N] [--dir PATH]
+import os, sys, json, gzip, zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db import blobs
+from app.db.dal import _now_iso, flush_steps, init_db
+from app.db.engine import transaction
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "200"))     # incidents per transaction
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")                      # "" = incident_archive table
+ARCHIVABLE = "status IN ('DONE', 'GROUPED')"
+
+# Oldest first. Duplicates are not picked on their own while their parent is in
+# the hot table; a parent is picked once every duplicate is finished and past the
+# cutoff too, and takes them along (see archive_incidents).
+_CANDIDATES = f"""SELECT * FROM incidents i
+                   WHERE i.{ARCHIVABLE} AND i.created_at < ?
+                     AND NOT EXISTS (SELECT 1 FROM incidents p WHERE p.id = i.parent_id)
+                     AND NOT EXISTS (SELECT 1 FROM incidents c WHERE c.parent_id = i.id
+                                      AND NOT (c.{ARCHIVABLE} AND c.created_at < ?))
+                   ORDER BY i.id LIMIT ?"""
+
+def _rows(con, sql: str, params) -> List[Dict[str, Any]]:
+    return [dict(r) for r in con.execute(sql, params).fetchall()]
+
+def _bundle(con, incidents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Optional[str]]]:
+    """(bundles with blob payloads inlined, the stored data_json/report_json values)."""
+    ids = [i["id"] for i in incidents]
+    marks = ",".join("?" * len(ids))
+    by_id: Dict[int, Dict[str, Any]] = {i["id"]: {"incident": i, "steps": [], "reports": []} for i in incidents}
+    steps = _rows(con, f"SELECT * FROM agent_steps WHERE incident_id IN ({marks}) ORDER BY id", ids)
+    reports = _rows(con, f"SELECT * FROM reports WHERE incident_id IN ({marks}) ORDER BY id", ids)
+    refs = [s["data_json"] for s in steps] + [r["report_json"] for r in reports]
+    for s in blobs.resolve_rows(con, steps, "data_json"):
+        by_id[s["incident_id"]]["steps"].append(s)
+    for r in blobs.resolve_rows(con, reports, "report_json"):
+        by_id[r["incident_id"]]["reports"].append(r)
+    return [by_id[i] for i in ids], refs
+
+def _write_file(archive_dir: str, bundles: List[Dict[str, Any]]) -> str:
+    os.makedirs(archive_dir, exist_ok=True)
+    first, last = bundles[0]["incident"]["id"], bundles[-1]["incident"]["id"]
+    path = os.path.join(archive_dir, f"incidents-{first:010d}-{last:010d}.jsonl.gz")
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        for b in bundles:
+            f.write(json.dumps(b, default=str) + "\n")
+    os.replace(path + ".tmp", path)     # on disk before the rows are deleted
+    return path
+
+def archive_incidents(days: int = RETENTION_DAYS, batch: int = RETENTION_BATCH,
+                      archive_dir: str = ARCHIVE_DIR) -> int:
+    """Archive finished incidents created more than `days` ago, parents together
+    with their GROUPED duplicates; returns how many moved."""
+    flush_steps()
+    cutoff, moved = _now_iso(-days * 86400), 0
+    while True:
+        with transaction() as con:
+            incidents = _rows(con, _CANDIDATES, (cutoff, cutoff, batch))
+            if not incidents:
+                return moved
+            marks = ",".join("?" * len(incidents))
+            incidents += _rows(con, f"SELECT * FROM incidents WHERE parent_id IN ({marks})",
+                               [i["id"] for i in incidents])
+            incidents.sort(key=lambda i: i["id"])
+            bundles, refs = _bundle(con, incidents)
+            if archive_dir:
+                _write_file(archive_dir, bundles)
+            else:
+                now = _now_iso()
+                con.executemany(
+                    """INSERT INTO incident_archive
+                         (incident_id, service, status, created_at, archived_at, n_steps, codec, blob)
+                       VALUES (?,?,?,?,?,?,?,?)""",
+                    [(b["incident"]["id"], b["incident"]["service"], b["incident"]["status"],
+                      b["incident"]["created_at"], now, len(b["steps"]), "zlib",
+                      zlib.compress(json.dumps(b, default=str).encode("utf-8"), 6))
+                     for b in bundles],
+                )
+            ids = [i["id"] for i in incidents]
+            marks = ",".join("?" * len(ids))
+            con.execute(f"DELETE FROM agent_steps WHERE incident_id IN ({marks})", ids)
+            con.execute(f"DELETE FROM reports WHERE incident_id IN ({marks})", ids)
+            con.execute(f"DELETE FROM incidents WHERE id IN ({marks})", ids)
+            blobs.release(con, refs)
+        moved += len(incidents)
+        print(f"[retention] archived incidents {ids[0]}..{ids[-1]} ({moved} so far)")
+
+def load_archived(incident_id: int) -> Optional[Dict[str, Any]]:
+    """{"incident", "steps", "reports"} of an incident archived to the table."""
+    with transaction() as con:
+        r = con.execute("SELECT codec, blob FROM incident_archive WHERE incident_id=?", (incident_id,)).fetchone()
+    if not r:
+        return None
+    return json.loads(zlib.decompress(bytes(r["blob"])).decode("utf-8"))
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    days = int(args[args.index("--days") + 1]) if "--days" in args else RETENTION_DAYS
+    archive_dir = args[args.index("--dir") + 1] if "--dir" in args else ARCHIVE_DIR
+    init_db()
+    n = archive_incidents(days=days, archive_dir=archive_dir)
+    print(f"[retention] {n} incident(s) older than {days} days archived to "
+          f"{archive_dir or 'incident_archive'}")
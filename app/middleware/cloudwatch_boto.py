@@ -1 +1,200 @@
-# TODO: Real CloudWatch polling using boto3
+# app/middleware/cloudwatch_boto.py
+# CloudWatch Logs as a collector source (LOGS_MODE=cloudwatch or USE_REAL_CLOUDWATCH=true).
+# Each log folder maps to a log group (CLOUDWATCH_LOG_GROUPS). For an incident the
+# group's streams with events near the window are listed, then paginated
+# FilterLogEvents calls run concurrently over batches of up to 100 streams,
+# bounded by the incident window and, when it can be exact, a filter pattern
+# built from the analyst rules, so only candidate lines cross the network.
+# CloudWatch terms are case-sensitive and the rules are not, so by default the
+# pattern is only sent when no rule keyword has letters. One client per process
+# (boto3 clients are thread-safe) with a connection pool sized for the fan-out;
+# pass client= to use a stub, or point AWS_ENDPOINT_URL at a stand-in like moto.
+import os, queue, datetime, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import CLOUDWATCH_LOG_GROUP, CLOUDWATCH_LOG_GROUPS, CLOUDWATCH_REGION
+
+CW_CONCURRENCY = int(os.getenv("CW_CONCURRENCY", "8"))           # FilterLogEvents calls in flight per process
+CW_MAX_STREAMS = int(os.getenv("CW_MAX_STREAMS", "500"))         # most recently active streams searched per group
+CW_MAX_BYTES = int(os.getenv("CW_MAX_BYTES", str(4 * 1024 * 1024)))   # per group and incident
+CW_FILTER = os.getenv("CW_FILTER", "rules")      # rules | cased | off, see filter_pattern()
+STREAM_BATCH = 100                               # FilterLogEvents takes at most 100 logStreamNames
+MAX_PATTERN = 1024                               # filterPattern length limit
+LAST_EVENT_SLACK_MS = 3600 * 1000                # lastEventTimestamp is updated lazily (up to ~1h behind)
+DEFAULT_LOOKBACK = datetime.timedelta(hours=1)   # search window for incidents without one
+
+Window = Optional[Tuple[datetime.datetime, datetime.datetime]]
+
+def parse_groups(spec: str) -> Dict[str, str]:
+    """"web=/ecs/web,db=/aws/rds/orders" -> {"web": "/ecs/web", "db": "/aws/rds/orders"}."""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        folder, _, group = part.partition("=")
+        out[folder.strip()] = group.strip()
+    return out
+
+def _cased(word: str) -> bool:
+    return word.lower() != word.upper()
+
+def filter_pattern(anchors: Optional[List[str]], mode: str = "rules") -> str:
+    """OR of the rule keywords as a CloudWatch pattern (?"a" ?"b"); "" = no filter,
+    when some rule has no keyword or the pattern would be too long.
+    CloudWatch terms are case-sensitive and the rules are not, so a filter that
+    never drops a line the rules would match is only possible for keywords
+    without letters ("502", "10.0.0.7"):
+      rules  send the pattern only then (exact; otherwise filter locally)
+      cased  also send keywords with letters, as written, lower- and upper-case;
+             lines in any other casing ("Connection refused") never arrive
+      off    never filter server-side"""
+    if not anchors or mode == "off" or (mode == "rules" and any(_cased(w) for w in anchors)):
+        return ""
+    terms: List[str] = []
+    for word in anchors:
+        for t in ((word, word.lower(), word.upper()) if mode == "cased" else (word,)):
+            if t not in terms:
+                terms.append(t)
+    quoted = ['"%s"' % t.replace("\\", "\\\\").replace('"', '\\"') for t in terms]
+    pattern = quoted[0] if len(quoted) == 1 else " ".join("?" + q for q in quoted)
+    return pattern if len(pattern) <= MAX_PATTERN else ""
+
+def _ms(dt: datetime.datetime) -> int:
+    return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+def _iso(ms: int) -> str:
+    return datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+_client = None
+_pool: Optional[ThreadPoolExecutor] = None
+_engine = None
+_lock = threading.Lock()
+
+def _rules():
+    global _engine
+    with _lock:
+        if _engine is None:
+            from app.agents.rules import RuleEngine      # same RULES_FILE as the analyst, hot-reloaded
+            _engine = RuleEngine()
+        return _engine
+
+def logs_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import boto3
+            from botocore.config import Config
+            _client = boto3.client("logs", region_name=CLOUDWATCH_REGION,
+                                   config=Config(max_pool_connections=CW_CONCURRENCY,
+                                                 retries={"mode": "adaptive", "max_attempts": 8}))
+        return _client
+
+def _calls() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=CW_CONCURRENCY, thread_name_prefix="cloudwatch")
+        return _pool
+
+class CloudWatchLogs:
+    def __init__(self, client=None, groups: Optional[Dict[str, str]] = None, pattern: Optional[str] = None):
+        self._client = client
+        self.groups = groups if groups is not None else (parse_groups(CLOUDWATCH_LOG_GROUPS) or {"web": CLOUDWATCH_LOG_GROUP})
+        self._pattern = pattern     # None: derive from the analyst rules on every fetch
+
+    @property
+    def client(self):
+        return self._client or logs_client()
+
+    def folders(self) -> List[str]:
+        return sorted(self.groups)
+
+    def pattern(self) -> str:
+        if self._pattern is not None:
+            return self._pattern
+        if CW_FILTER == "off":
+            return ""
+        return filter_pattern(_rules().current().anchors, CW_FILTER)
+
+    def streams(self, group: str, start_ms: int, end_ms: int) -> List[str]:
+        """Streams that may hold events in [start_ms, end_ms], most recently active first."""
+        out, token = [], None
+        while len(out) < CW_MAX_STREAMS:
+            kw = {"logGroupName": group, "orderBy": "LastEventTime", "descending": True}
+            if token:
+                kw["nextToken"] = token
+            page = self.client.describe_log_streams(**kw)
+            for s in page.get("logStreams", []):
+                if s.get("lastEventTimestamp", s.get("creationTime", 0)) + LAST_EVENT_SLACK_MS < start_ms:
+                    return out           # ordered by last event: the rest are older still
+                if s.get("firstEventTimestamp", 0) <= end_ms:
+                    out.append(s["logStreamName"])
+            token = page.get("nextToken")
+            if not token:
+                break
+        return out[:CW_MAX_STREAMS]
+
+    def _filter(self, group: str, names: List[str], start_ms: int, end_ms: int, pattern: str,
+                out: "queue.Queue", stop: threading.Event) -> None:
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            kw: Dict[str, Any] = {"logGroupName": group, "logStreamNames": names,
+                                  "startTime": start_ms, "endTime": end_ms}
+            if pattern:
+                kw["filterPattern"] = pattern
+            while not stop.is_set():
+                page = self.client.filter_log_events(**kw)
+                lines = [f"{_iso(e['timestamp'])} {e['message'].rstrip()}" for e in page.get("events", [])]
+                if lines and not put(lines):
+                    return
+                if not page.get("nextToken"):
+                    break
+                kw["nextToken"] = page["nextToken"]
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
+
+    def lines(self, folder: str, window: Window = None) -> Iterator[str]:
+        """Log lines of the folder's group within the window (server-side filtered), in
+        page arrival order; stops after CW_MAX_BYTES. Raises the first failed call."""
+        group = self.groups.get(folder)
+        if not group:
+            return
+        if window is None:
+            now = datetime.datetime.utcnow()
+            window = (now - DEFAULT_LOOKBACK, now)
+        start_ms, end_ms = _ms(window[0]), _ms(window[1])
+        names = self.streams(group, start_ms, end_ms)
+        if not names:
+            return
+        pattern = self.pattern()
+        out: "queue.Queue" = queue.Queue(maxsize=CW_CONCURRENCY * 2)
+        stop = threading.Event()
+        batches = [names[i:i + STREAM_BATCH] for i in range(0, len(names), STREAM_BATCH)]
+        for batch in batches:
+            _calls().submit(self._filter, group, batch, start_ms, end_ms, pattern, out, stop)
+        pending, size = len(batches), 0
+        try:
+            while pending:
+                item = out.get()
+                if item is None:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    for line in item:
+                        yield line
+                        size += len(line) + 1
+                    if size >= CW_MAX_BYTES:
+                        print(f"[cloudwatch] {group}: stopped at {size / 1e6:.1f} MB (CW_MAX_BYTES)")
+                        return
+        finally:
+            stop.set()
@@ -0,0 +1,125 @@
+# app/middleware/correlator.py
+# Alert correlation in front of the agents. Incidents are fingerprinted by
+# service/environment/severity/alert source; a duplicate arriving within the
+# sliding window of its group is marked GROUPED under the group's parent (whose
+# report it shares) instead of being analysed again. The window index is kept
+# in memory and rebuilt from the incidents table on start-up. When a parent's
+# analysis fails its duplicates go back to the queue, where the first one
+# claimed becomes the new parent.
+import os, json, hashlib, datetime, threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.dal import group_incident, set_fingerprint, recent_groups, record_step, reopen_children
+from app.db.notify import notify_new_incident
+
+CORRELATION_WINDOW_SECONDS = int(os.getenv("CORRELATION_WINDOW_SECONDS", "300"))   # 0 disables grouping
+# a flapping alarm stops joining a parent this old and starts a new group (0 = no limit)
+CORRELATION_MAX_PARENT_AGE_SECONDS = int(os.getenv("CORRELATION_MAX_PARENT_AGE_SECONDS", "3600"))
+CORRELATION_MAX_KEYS = int(os.getenv("CORRELATION_MAX_KEYS", "10000"))
+SOURCE_KEYS = ("source", "alert_type", "alert", "alarm_name")    # first one present in payload_json
+
+_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+def _ts(value: Optional[str]) -> datetime.datetime:
+    try:
+        return datetime.datetime.strptime(value or "", _FMT)
+    except ValueError:
+        return datetime.datetime.utcnow()
+
+def incident_fingerprint(inc: Dict[str, Any]) -> str:
+    try:
+        payload = json.loads(inc.get("payload_json") or "{}")
+    except (TypeError, ValueError):
+        payload = {}
+    source = next((str(payload[k]) for k in SOURCE_KEYS if payload.get(k)), "")
+    basis = "\0".join(str(inc.get(k) or "").strip().lower()
+                      for k in ("service", "environment", "severity")) + "\0" + source.strip().lower()
+    return hashlib.sha1(basis.encode("utf-8")).hexdigest()[:16]
+
+class Correlator:
+    """fingerprint -> (parent incident id, last time the group was seen, parent created).
+
+    A group's window slides: every duplicate extends it by window_seconds, up
+    to max_parent_age after the parent was created.
+    Thread-safe; in RUNNER_MODE=process each worker process keeps its own index,
+    so a storm split across processes can start one group per process."""
+
+    def __init__(self, window_seconds: int = CORRELATION_WINDOW_SECONDS,
+                 max_parent_age_seconds: int = CORRELATION_MAX_PARENT_AGE_SECONDS):
+        self.window = datetime.timedelta(seconds=window_seconds)
+        self.max_age = datetime.timedelta(seconds=max_parent_age_seconds) if max_parent_age_seconds else None
+        self.index: Dict[str, Tuple[int, datetime.datetime, datetime.datetime]] = {}
+        self.lock = threading.Lock()
+        self.stats = {"parents": 0, "grouped": 0, "reopened": 0}
+        self._loaded = False
+
+    def load(self) -> int:
+        """Rebuild the index from incidents created within the window."""
+        since = (datetime.datetime.utcnow() - self.window).strftime(_FMT)
+        index = {}
+        for row in recent_groups(since):           # oldest first: newest group per fingerprint wins
+            index[row["fingerprint"]] = (row["parent_id"], _ts(row["last_seen"]), _ts(row["parent_created"]))
+        with self.lock:
+            self.index.update(index)
+            self._loaded = True
+        return len(index)
+
+    def correlate(self, inc: Dict[str, Any]) -> Optional[int]:
+        """Parent id if `inc` was grouped as a duplicate, else None (analyse it)."""
+        if not self.window:
+            return None
+        if not self._loaded:
+            self.load()
+        fp, ts = incident_fingerprint(inc), _ts(inc.get("created_at"))
+        with self.lock:
+            entry = self.index.get(fp)
+            if (entry and entry[0] != inc["id"] and abs(ts - entry[1]) <= self.window
+                    and (self.max_age is None or ts - entry[2] <= self.max_age)):
+                parent = entry[0]
+                self.index[fp] = (parent, max(ts, entry[1]), entry[2])
+                self.stats["grouped"] += 1
+            else:
+                parent = None
+                self.index[fp] = (inc["id"], ts, ts)
+                self.stats["parents"] += 1
+                if len(self.index) > CORRELATION_MAX_KEYS:
+                    self._evict(ts)
+
+        if parent is not None and not group_incident(inc["id"], parent, fp):
+            with self.lock:                        # parent failed since it was indexed: start a new group
+                self.index[fp] = (inc["id"], ts, ts)
+                self.stats["grouped"] -= 1
+                self.stats["parents"] += 1
+            parent = None
+        if parent is None:
+            set_fingerprint(inc["id"], fp)
+            return None
+        record_step(inc["id"], "correlator", "done", f"Duplicate of incident {parent}; sharing its report",
+                    {"parent_id": parent, "fingerprint": fp})
+        record_step(parent, "correlator", "group", f"Grouped duplicate incident {inc['id']}",
+                    {"child_id": inc["id"], "fingerprint": fp})
+        return parent
+
+    def release(self, inc: Dict[str, Any]) -> List[int]:
+        """Forget a parent whose analysis failed and re-queue its duplicates, so
+        one of them is analysed (and becomes the new parent); returns their ids."""
+        fp = incident_fingerprint(inc)
+        with self.lock:
+            if self.index.get(fp, (None,))[0] == inc["id"]:
+                del self.index[fp]
+        children = reopen_children(inc["id"])
+        if children:
+            with self.lock:
+                self.stats["reopened"] += len(children)
+            record_step(inc["id"], "correlator", "group", f"Re-queued {len(children)} grouped duplicate(s)",
+                        {"children": children, "fingerprint": fp})
+            for child in children:
+                record_step(child, "correlator", "start", f"Parent incident {inc['id']} failed; re-queued",
+                            {"parent_id": inc["id"], "fingerprint": fp})
+            notify_new_incident(children[0])
+        return children
+
+    def _evict(self, now: datetime.datetime) -> None:
+        cutoff = now - self.window
+        for fp in [fp for fp, (_, seen, _) in self.index.items() if seen < cutoff]:
+            del self.index[fp]
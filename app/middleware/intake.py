@@ -0,0 +1,175 @@
+# app/middleware/intake.py
+# Event-driven incident intake. Wake-up sources run in background threads and set
+# one shared event; consumers block on Intake.wait() instead of sleeping a fixed
+# POLL_INTERVAL_SECONDS, and read only rows above a persisted high-water mark.
+import os, json, select, socket, threading, pathlib
+from typing import Any, Dict, Iterator, List
+
+from app.db.engine import DB_FILE, DB_URL, is_postgres
+from app.db.notify import INTAKE_NOTIFY_ADDR, PG_CHANNEL, parse_addr
+from app.db.dal import get_incidents_after
+
+INTAKE_SOURCES = os.getenv("INTAKE_SOURCES", "auto")        # auto | comma list of socket,file,pg
+INTAKE_STATE_FILE = os.getenv("INTAKE_STATE_FILE", ".intake_state.json")
+INTAKE_MIN_WAIT = float(os.getenv("INTAKE_MIN_WAIT", "0.5"))  # backoff poll bounds (seconds)
+INTAKE_MAX_WAIT = float(os.getenv("INTAKE_MAX_WAIT", os.getenv("POLL_INTERVAL_SECONDS", "10")))
+FILE_WATCH_INTERVAL = float(os.getenv("INTAKE_FILE_WATCH_INTERVAL", "0.2"))
+
+# ---------- wake-up sources ----------
+
+class WakeSource:
+    name = "base"
+
+    def start(self, wake: threading.Event) -> None:
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(wake,), name=f"intake-{self.name}", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, wake: threading.Event) -> None:
+        raise NotImplementedError
+
+class SocketWakeSource(WakeSource):
+    """Receives the datagrams record_incident sends (app/db/notify.py)."""
+    name = "socket"
+
+    def __init__(self, addr: str = INTAKE_NOTIFY_ADDR):
+        family, target = parse_addr(addr)
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.unlink(target)
+        self.sock.bind(target)   # raises OSError if another consumer owns it
+
+    def _run(self, wake):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.sock], [], [], 1.0)
+            if ready:
+                self.sock.recv(64)
+                wake.set()
+
+class FileWatchSource(WakeSource):
+    """Fires when the SQLite file or its WAL changes (size/mtime via stat)."""
+    name = "file"
+
+    def __init__(self, db_file: str = DB_FILE):
+        self.paths = [db_file, db_file + "-wal"]
+
+    def _sig(self):
+        out = []
+        for p in self.paths:
+            try:
+                st = os.stat(p)
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return out
+
+    def _run(self, wake):
+        last = self._sig()
+        while not self._stop.wait(FILE_WATCH_INTERVAL):
+            cur = self._sig()
+            if cur != last:
+                last = cur
+                wake.set()
+
+class PgListenSource(WakeSource):
+    """Postgres LISTEN on the channel record_incident NOTIFYs."""
+    name = "pg"
+
+    def __init__(self, url: str = DB_URL):
+        import psycopg
+        from app.db.engine import _pg_dsn
+        self.conn = psycopg.connect(_pg_dsn(url), autocommit=True)
+        self.conn.execute(f"LISTEN {PG_CHANNEL}")
+
+    def _run(self, wake):
+        while not self._stop.is_set():
+            for _ in self.conn.notifies(timeout=1.0, stop_after=1):
+                wake.set()
+
+def build_sources(spec: str = INTAKE_SOURCES) -> List[WakeSource]:
+    """Instantiate whichever push sources are available; errors just skip a source."""
+    wanted = ["pg" if is_postgres() else "file", "socket"] if spec == "auto" else \
+        [s.strip() for s in spec.split(",") if s.strip()]
+    factories = {"socket": SocketWakeSource, "file": FileWatchSource, "pg": PgListenSource}
+    sources = []
+    for name in wanted:
+        if name == "socket" and not INTAKE_NOTIFY_ADDR:
+            continue
+        try:
+            sources.append(factories[name]())
+        except Exception as e:
+            print(f"[intake] {name} wake-up unavailable: {e}")
+    return sources
+
+# ---------- intake ----------
+
+class Backoff:
+    """Adaptive poll delay: doubles while idle, snaps back to the minimum on activity."""
+
+    def __init__(self, lo: float = INTAKE_MIN_WAIT, hi: float = INTAKE_MAX_WAIT):
+        self.lo, self.hi, self.delay = lo, max(lo, hi), lo
+
+    def record(self, found: int) -> None:
+        self.delay = self.lo if found else min(self.hi, self.delay * 2)
+
+class Intake:
+    def __init__(self, consumer: str = "runner", sources: List[WakeSource] | None = None,
+                 state_file: str = INTAKE_STATE_FILE):
+        self.consumer = consumer
+        self.state_path = pathlib.Path(state_file)
+        self.last_seen_id = self._load_state().get(consumer, 0)
+        self.sources = build_sources() if sources is None else sources
+        self.backoff = Backoff()
+        self._wake = threading.Event()
+        for src in self.sources:
+            src.start(self._wake)
+
+    @property
+    def push_enabled(self) -> bool:
+        return bool(self.sources)
+
+    def wait(self) -> bool:
+        """Block until a wake-up arrives or the poll delay elapses; True if woken.
+        With push sources the delay is only a safety net, so it stays at the maximum."""
+        timeout = self.backoff.hi if self.push_enabled else self.backoff.delay
+        woke = self._wake.wait(timeout)
+        self._wake.clear()
+        return woke
+
+    def record(self, found: int) -> None:
+        self.backoff.record(found)
+
+    def poll_new(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Incidents created since the high-water mark; advances and persists it."""
+        rows = get_incidents_after(self.last_seen_id, limit)
+        if rows:
+            self.last_seen_id = rows[-1]["id"]
+            self._save_state()
+        self.record(len(rows))
+        return rows
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            rows = self.poll_new()
+            yield from rows
+            if not rows:
+                self.wait()
+
+    def close(self) -> None:
+        for src in self.sources:
+            src.stop()
+
+    def _load_state(self) -> Dict[str, int]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        state = self._load_state()
+        state[self.consumer] = self.last_seen_id
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.state_path)
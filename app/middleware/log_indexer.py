@@ -0,0 +1,220 @@
+# app/middleware/log_indexer.py
+# Incremental index over LOGS_LOCAL_ROOT/{service}/*.log so the collector can
+# seek straight to "lines matching X between T1 and T2 for service S".
+#
+# Files are cut into ~BLOCK_BYTES blocks on line boundaries. Per block we keep
+# its byte range and first/last timestamp (sparse time index) and post the
+# error tokens and rule ids seen in it (inverted index). Indexing resumes at the
+# last offset; a changed inode/head means rotation, a shrunk file truncation,
+# and both re-index the file from 0.
+#   python -m app.middleware.log_indexer        # run as a background tailer
+import os, re, glob, time, sqlite3, hashlib, datetime
+from typing import Iterator, Optional
+
+from app.config import LOGS_LOCAL_ROOT
+from app.agents.rules import RuleEngine
+from app.agents.collector_agent import parse_ts
+
+LOG_INDEX_FILE = os.getenv("LOG_INDEX_FILE", os.path.join(LOGS_LOCAL_ROOT, ".index.db"))
+INDEX_INTERVAL_SECONDS = float(os.getenv("LOG_INDEX_INTERVAL_SECONDS", "2"))
+BLOCK_BYTES = 64 * 1024
+HEAD_BYTES = 256
+
+TOKEN_RE = re.compile(
+    r"\b[A-Za-z_][\w.]*(?:Error|Exception|Killed|Refused|Timeout)\b"   # NullPointerException, OOMKilled
+    r"|\b[A-Z][A-Z0-9_]{3,}\b"                                         # ECONNREFUSED, ERROR, WARN
+    r"|(?<=\s)[45]\d\d\b"                                              # HTTP status codes
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files(
+  id       INTEGER PRIMARY KEY,
+  path     TEXT UNIQUE NOT NULL,
+  service  TEXT NOT NULL,
+  inode    INTEGER NOT NULL,
+  head     TEXT NOT NULL,            -- sha1 of the first HEAD_BYTES, detects rotation
+  offset   INTEGER NOT NULL          -- indexed up to here (always a line boundary)
+);
+CREATE TABLE IF NOT EXISTS blocks(
+  file_id  INTEGER NOT NULL,
+  block_no INTEGER NOT NULL,
+  start    INTEGER NOT NULL,
+  "end"    INTEGER NOT NULL,
+  first_ts TEXT,
+  last_ts  TEXT,
+  PRIMARY KEY (file_id, block_no)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_blocks_ts ON blocks(file_id, last_ts, first_ts);
+CREATE TABLE IF NOT EXISTS postings(
+  token    TEXT NOT NULL,            -- lowercased error token, or "rule:<id>"
+  file_id  INTEGER NOT NULL,
+  block_no INTEGER NOT NULL,
+  PRIMARY KEY (token, file_id, block_no)
+) WITHOUT ROWID;
+"""
+
+def _iso(ts: Optional[datetime.datetime]) -> Optional[str]:
+    return ts.strftime("%Y-%m-%dT%H:%M:%S") if ts else None
+
+def tokens(text: str) -> set:
+    out = set()
+    for t in TOKEN_RE.findall(text):
+        t = t.lower()
+        out.add(t)
+        if "." in t:                   # java.lang.NullPointerException -> nullpointerexception too
+            out.add(t.rsplit(".", 1)[1])
+    return out
+
+class LogIndex:
+    def __init__(self, root: str = LOGS_LOCAL_ROOT, path: str = LOG_INDEX_FILE,
+                 rules: RuleEngine | None = None):
+        self.root = root
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.execute("PRAGMA synchronous = NORMAL")
+        self.con.executescript(SCHEMA)
+        self.rules = rules or RuleEngine()
+
+    # ---------- indexing ----------
+
+    def index_all(self) -> int:
+        """Index new bytes of every log file under root; returns bytes indexed."""
+        total = 0
+        for fp in sorted(glob.glob(os.path.join(self.root, "*", "*.log"))):
+            total += self.index_file(fp)
+        return total
+
+    def index_file(self, fp: str) -> int:
+        service = os.path.basename(os.path.dirname(fp))
+        with open(fp, "rb") as f:
+            st = os.fstat(f.fileno())
+            head = hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+            row = self.con.execute(
+                "SELECT id, inode, head, offset FROM files WHERE path=?", (fp,)).fetchone()
+            if row and (row[1] != st.st_ino or st.st_size < row[3]
+                        or (row[3] >= HEAD_BYTES and row[2] != head)):
+                self._forget(row[0])        # rotated or truncated
+                row = None
+            if row is None:
+                with self.con:
+                    cur = self.con.execute(
+                        "INSERT INTO files(path, service, inode, head, offset) VALUES(?,?,?,?,0)",
+                        (fp, service, st.st_ino, head))
+                file_id, offset = cur.lastrowid, 0
+            else:
+                file_id, offset = row[0], row[3]
+            if offset >= st.st_size:
+                return 0
+
+            block_no = self.con.execute(
+                "SELECT COALESCE(MAX(block_no)+1, 0) FROM blocks WHERE file_id=?", (file_id,)).fetchone()[0]
+            start = offset
+            f.seek(offset)
+            ruleset = self.rules.current()
+            with self.con:
+                while True:
+                    data = f.read(BLOCK_BYTES)
+                    cut = data.rfind(b"\n") + 1
+                    if cut == 0 and len(data) == BLOCK_BYTES:
+                        cut = len(data)        # a single line longer than a block
+                    if cut == 0:
+                        break                  # no complete line yet; pick it up next pass
+                    if cut < len(data):
+                        f.seek(start + cut)
+                    self._add_block(file_id, block_no, start, data[:cut], ruleset)
+                    start += cut
+                    block_no += 1
+                self.con.execute("UPDATE files SET offset=?, inode=?, head=? WHERE id=?",
+                                 (start, st.st_ino, head, file_id))
+            return start - offset
+
+    def _add_block(self, file_id, block_no, start, data: bytes, ruleset) -> None:
+        text = data.decode("utf-8", errors="ignore")
+        lines = text.splitlines()
+        first = next((t for t in map(parse_ts, lines) if t), None)
+        last = next((t for t in map(parse_ts, reversed(lines)) if t), None)
+        self.con.execute("INSERT INTO blocks VALUES(?,?,?,?,?,?)",
+                         (file_id, block_no, start, start + len(data), _iso(first), _iso(last)))
+        toks = tokens(text) | {f"rule:{m['rule']['id']}" for m in ruleset.scan([text])}
+        self.con.executemany("INSERT OR IGNORE INTO postings VALUES(?,?,?)",
+                             [(t, file_id, block_no) for t in toks])
+
+    def _forget(self, file_id: int) -> None:
+        with self.con:
+            for table in ("postings", "blocks"):
+                self.con.execute(f"DELETE FROM {table} WHERE file_id=?", (file_id,))
+            self.con.execute("DELETE FROM files WHERE id=?", (file_id,))
+
+    # ---------- queries ----------
+
+    def search(self, service: str, start: Optional[datetime.datetime] = None,
+               end: Optional[datetime.datetime] = None, token: Optional[str] = None,
+               rule_id: Optional[str] = None, pattern: Optional[str] = None) -> Iterator[str]:
+        """Lines of `service` logs within [start, end] that contain `token`, matched
+        rule `rule_id`, and/or match regex `pattern` -- reading only candidate blocks."""
+        sql = ["SELECT f.path, b.start, b.\"end\" FROM blocks b JOIN files f ON f.id=b.file_id"]
+        where, args = ["f.service=?"], [service]
+        for key in ([token.lower()] if token else []) + ([f"rule:{rule_id}"] if rule_id else []):
+            where.append("EXISTS (SELECT 1 FROM postings p WHERE p.token=? "
+                         "AND p.file_id=b.file_id AND p.block_no=b.block_no)")
+            args.append(key)
+        if start:
+            where.append("(b.last_ts IS NULL OR b.last_ts >= ?)")
+            args.append(_iso(start))
+        if end:
+            where.append("(b.first_ts IS NULL OR b.first_ts <= ?)")
+            args.append(_iso(end))
+        sql.append("WHERE " + " AND ".join(where) + " ORDER BY f.path, b.block_no")
+        blocks = self.con.execute(" ".join(sql), args).fetchall()
+
+        line_re = re.compile(pattern, re.I) if pattern else None
+        needle = token.lower() if token else None
+        rule_re = None
+        if rule_id:
+            rule = next((r for r in self.rules.current().rules if r["id"] == rule_id), None)
+            rule_re = re.compile(rule["pattern"], re.I) if rule else None
+        handles = {}
+        try:
+            for path, b_start, b_end in blocks:
+                f = handles.get(path) or handles.setdefault(path, open(path, "rb"))
+                f.seek(b_start)
+                keep = False
+                for line in f.read(b_end - b_start).decode("utf-8", errors="ignore").splitlines():
+                    ts = parse_ts(line)
+                    if ts is not None:
+                        keep = (start is None or ts >= start) and (end is None or ts <= end)
+                    if not keep:
+                        continue
+                    if needle and needle not in line.lower():
+                        continue
+                    if rule_re and not rule_re.search(line):
+                        continue
+                    if line_re and not line_re.search(line):
+                        continue
+                    yield line
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def covers(self, service: str) -> bool:
+        """True if every current log file of `service` is fully indexed."""
+        for fp in glob.glob(os.path.join(self.root, service, "*.log")):
+            row = self.con.execute("SELECT offset FROM files WHERE path=?", (fp,)).fetchone()
+            if row is None or row[0] < os.path.getsize(fp):
+                return False
+        return True
+
+def main():
+    index = LogIndex()
+    print(f"[log_indexer] indexing {LOGS_LOCAL_ROOT} into {LOG_INDEX_FILE} every {INDEX_INTERVAL_SECONDS:g}s")
+    while True:
+        try:
+            n = index.index_all()
+            if n:
+                print(f"[log_indexer] indexed {n} bytes")
+        except Exception as e:
+            print("[log_indexer] error:", e)
+        time.sleep(INDEX_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    main()
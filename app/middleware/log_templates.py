@@ -0,0 +1,167 @@
+# app/middleware/log_templates.py
+# Streaming log-template miner (Drain: a fixed-depth parse tree keyed by token
+# count and leading tokens, with similarity-matched clusters at the leaves).
+# Lines that differ only in ids, timestamps, addresses or numbers collapse into
+# one template with a count, first/last timestamp and sample parameters, so the
+# analyst (and the LLM prompt) read a ranked summary instead of raw text.
+import os, re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+TEMPLATE_DEPTH = int(os.getenv("LOG_TEMPLATE_DEPTH", "4"))          # tree depth incl. length level and leaf
+TEMPLATE_SIM = float(os.getenv("LOG_TEMPLATE_SIM", "0.4"))          # min token agreement to join a cluster
+TEMPLATE_MAX_CHILDREN = int(os.getenv("LOG_TEMPLATE_MAX_CHILDREN", "100"))
+TEMPLATE_MAX_CLUSTERS = int(os.getenv("LOG_TEMPLATE_MAX_CLUSTERS", "5000"))
+WILDCARD = "<*>"
+
+_MASKS = [
+    re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I),   # uuid
+    re.compile(r"\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?"),                                     # ipv4[:port]
+    re.compile(r"0x[0-9a-f]+|\b[0-9a-f]*\d[0-9a-f]*\b(?=[^\w]|$)", re.I),                 # hex / numbers
+]
+_TS = re.compile(r"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?")
+_ERRORISH = re.compile(r"ERROR|FATAL|CRITICAL|Exception|panic|refused|timed? ?out|Killed", re.I)
+
+_DIGIT = re.compile(r"\d")
+_masked: Dict[str, str] = {}
+
+def mask(token: str) -> str:
+    """Token with variable parts replaced by <*> (only tokens with a digit can have any)."""
+    out = _masked.get(token)
+    if out is None:
+        out = token
+        if _DIGIT.search(token):
+            for pattern in _MASKS:
+                out = pattern.sub(WILDCARD, out)
+        if len(_masked) > 100_000:
+            _masked.clear()
+        _masked[token] = out
+    return out
+
+class Cluster:
+    __slots__ = ("id", "template", "count", "first_ts", "last_ts", "params", "example", "error")
+
+    def __init__(self, cid: int, tokens: List[str], line: str, ts: Optional[str]):
+        self.id, self.template, self.count = cid, tokens, 0
+        self.first_ts = self.last_ts = ts
+        self.params: List[List[str]] = []
+        self.example = line
+        self.error = bool(_ERRORISH.search(line))
+
+    def text(self) -> str:
+        return " ".join(self.template)
+
+class TemplateMiner:
+    """Feed lines (add_line) or pass a chunk stream through tap(); read
+    summary()/render() afterwards. Memory is bounded by max_clusters."""
+
+    def __init__(self, depth: int = TEMPLATE_DEPTH, sim: float = TEMPLATE_SIM,
+                 max_children: int = TEMPLATE_MAX_CHILDREN, max_clusters: int = TEMPLATE_MAX_CLUSTERS,
+                 samples: int = 3):
+        self.depth, self.sim = max(3, depth), sim
+        self.max_children, self.max_clusters, self.samples = max_children, max_clusters, samples
+        self.root: Dict[int, Dict[str, Any]] = {}
+        self.clusters: List[Cluster] = []
+        self.lines = self.bytes_in = 0
+
+    # ---------- tree ----------
+
+    def _leaf(self, tokens: List[str]) -> List[Cluster]:
+        node = self.root.setdefault(len(tokens), {})
+        for tok in tokens[:self.depth - 2]:
+            key = WILDCARD if WILDCARD in tok else tok
+            child = node.get(key)
+            if child is None:
+                if len(node) >= self.max_children:
+                    key = WILDCARD              # full node: overflow shares the wildcard branch
+                child = node.setdefault(key, {})
+            node = child
+        return node.setdefault("", [])
+
+    def _similarity(self, template: List[str], tokens: List[str]):
+        same = params = 0
+        for t, tok in zip(template, tokens):
+            if t == WILDCARD:
+                params += 1
+            elif t == tok:
+                same += 1
+        return same / len(tokens) if tokens else 1.0, params
+
+    # ---------- feeding ----------
+
+    def add_line(self, line: str) -> Optional[Cluster]:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return None
+        self.lines += 1
+        self.bytes_in += len(line) + 1
+        ts = _TS.match(line)                    # leading ISO8601 timestamp, not part of the template
+        raw = line[ts.end():].split() if ts else line.split()
+        tokens = [mask(t) for t in raw] or [WILDCARD]
+        leaf = self._leaf(tokens)
+
+        best, best_key = None, (-1.0, -1)
+        for cluster in leaf:
+            key = self._similarity(cluster.template, tokens)
+            if key > best_key:
+                best, best_key = cluster, key
+        stamp = f"{ts.group(1)}T{ts.group(2)}Z" if ts else None     # ISO strings sort by time
+        if best is None or best_key[0] < self.sim:
+            if len(self.clusters) >= self.max_clusters:
+                return None                     # new shapes past the cap are dropped, known ones still count
+            best = Cluster(len(self.clusters), tokens, line, stamp)
+            leaf.append(best)
+            self.clusters.append(best)
+        else:
+            best.template = [t if t == tok else WILDCARD for t, tok in zip(best.template, tokens)]
+            if not best.error and _ERRORISH.search(line):
+                best.error, best.example = True, line
+
+        best.count += 1
+        if stamp:
+            best.first_ts = min(best.first_ts or stamp, stamp)
+            best.last_ts = max(best.last_ts or stamp, stamp)
+        if len(best.params) < self.samples:
+            values = [r for r, t in zip(raw, best.template) if WILDCARD in t]
+            if values and values not in best.params:
+                best.params.append(values)
+        return best
+
+    def tap(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Pass a chunk stream through unchanged while mining its lines."""
+        for chunk in chunks:
+            for line in chunk.splitlines():
+                self.add_line(line)
+            yield chunk
+
+    # ---------- output ----------
+
+    def ranked(self) -> List[Cluster]:
+        """Error-looking templates first, then by count."""
+        return sorted(self.clusters, key=lambda c: (not c.error, -c.count, c.id))
+
+    def top_errors(self, n: int = 3) -> List[str]:
+        return [c.text() for c in self.ranked()[:n] if c.error]
+
+    def summary(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return [
+            {"template": c.text(), "count": c.count, "first_ts": c.first_ts, "last_ts": c.last_ts,
+             "params": c.params, "error": c.error, "example": c.example}
+            for c in self.ranked()[:limit]
+        ]
+
+    def render(self, limit: int = 50, max_chars: int = 8000) -> str:
+        """Compact text for prompts/evidence: one ranked template per line."""
+        out, size = [], 0
+        for c in self.ranked()[:limit]:
+            span = f" [{c.first_ts} .. {c.last_ts}]" if c.first_ts else ""
+            sample = f"  e.g. {' | '.join(c.params[0])}" if c.params else ""
+            line = f"{c.count}x{span} {c.text()}{sample}"
+            if size + len(line) > max_chars:
+                break
+            out.append(line)
+            size += len(line) + 1
+        return "\n".join(out)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"lines": self.lines, "templates": len(self.clusters), "bytes_in": self.bytes_in,
+                "ratio": round(self.lines / len(self.clusters), 1) if self.clusters else 0.0}
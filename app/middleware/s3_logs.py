@@ -0,0 +1,115 @@
+# app/middleware/s3_logs.py
+# S3 as a collector source (LOGS_MODE=s3): log folders are the "directories"
+# under s3://S3_BUCKET/S3_PREFIX. The newest objects of a folder are tailed
+# concurrently, like the local files: plain objects with one ranged GET of
+# their last max_bytes; gzip objects (*.gz, which can't be entered mid-stream)
+# are decompressed as they download, keeping only the last max_bytes. One
+# client per process with a pool sized for the fan-out; pass client= to use a
+# stub, or point AWS_ENDPOINT_URL at a stand-in like moto.
+import os, zlib, datetime, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import S3_BUCKET, S3_PREFIX, S3_REGION
+
+S3_CONCURRENCY = int(os.getenv("S3_CONCURRENCY", "8"))      # GETs in flight per process
+READ_BLOCK = 256 * 1024
+
+_client = None
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+def s3_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import boto3
+            from botocore.config import Config
+            _client = boto3.client("s3", region_name=S3_REGION,
+                                   config=Config(max_pool_connections=S3_CONCURRENCY,
+                                                 retries={"mode": "adaptive", "max_attempts": 8}))
+        return _client
+
+def _gets() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=S3_CONCURRENCY, thread_name_prefix="s3")
+        return _pool
+
+def _lines(data: bytes, cut: bool) -> List[str]:
+    lines = data.decode("utf-8", errors="ignore").splitlines()
+    return lines[1:] if cut and lines else lines     # first line was cut by the range start
+
+class S3Logs:
+    def __init__(self, client=None, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX):
+        self._client = client
+        self.bucket, self.prefix = bucket, prefix
+
+    @property
+    def client(self):
+        return self._client or s3_client()
+
+    def folders(self) -> List[str]:
+        out, token = [], None
+        while True:
+            kw = {"Bucket": self.bucket, "Prefix": self.prefix, "Delimiter": "/"}
+            if token:
+                kw["ContinuationToken"] = token
+            page = self.client.list_objects_v2(**kw)
+            out += [p["Prefix"][len(self.prefix):].rstrip("/") for p in page.get("CommonPrefixes", [])]
+            token = page.get("NextContinuationToken")
+            if not token:
+                return sorted(out)
+
+    def objects(self, folder: str, limit: int, not_before: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """Newest `limit` objects of the folder, skipping those last written before
+        not_before (every line in them is older)."""
+        found, token = [], None
+        while True:
+            kw = {"Bucket": self.bucket, "Prefix": f"{self.prefix}{folder}/"}
+            if token:
+                kw["ContinuationToken"] = token
+            page = self.client.list_objects_v2(**kw)
+            found += [o for o in page.get("Contents", []) if o["Size"] > 0]
+            token = page.get("NextContinuationToken")
+            if not token:
+                break
+        if not_before is not None:
+            cutoff = not_before.replace(tzinfo=datetime.timezone.utc)
+            found = [o for o in found if o["LastModified"] >= cutoff]
+        found.sort(key=lambda o: o["LastModified"], reverse=True)
+        return found[:limit]
+
+    def tail(self, obj: Dict[str, Any], max_bytes: int) -> List[str]:
+        key, size = obj["Key"], obj["Size"]
+        if key.endswith(".gz"):
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+            d, buf, cut = zlib.decompressobj(16 + zlib.MAX_WBITS), bytearray(), False
+            for block in body.iter_chunks(READ_BLOCK):
+                while block:
+                    buf += d.decompress(block)
+                    block = d.unused_data                       # next member of a concatenated gzip
+                    if d.eof:
+                        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                if len(buf) > 2 * max_bytes:                    # trim in bulk, keep memory bounded
+                    del buf[:len(buf) - max_bytes]
+                    cut = True
+            if len(buf) > max_bytes:
+                del buf[:len(buf) - max_bytes]
+                cut = True
+            return _lines(bytes(buf), cut)
+        start = max(0, size - max_bytes)
+        body = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-")["Body"]
+        return _lines(body.read(), start > 0)
+
+    def tails(self, folder: str, limit: int, max_bytes: int,
+              not_before: Optional[datetime.datetime] = None) -> Iterator[List[str]]:
+        """Tails of the folder's newest objects, newest first, fetched concurrently."""
+        futures = [_gets().submit(self.tail, o, max_bytes) for o in self.objects(folder, limit, not_before)]
+        try:
+            for f in futures:
+                yield f.result()
+        finally:
+            for f in futures:
+                f.cancel()
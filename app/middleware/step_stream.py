@@ -0,0 +1,255 @@
+# app/middleware/step_stream.py
+# Live agent-step stream. record_step publishes every step (app/db/notify.py);
+# StepHub fans them out per incident and keeps a short replay history, and a
+# small Server-Sent-Events endpoint serves them, so the UI gets deltas as they
+# happen instead of re-querying agent_steps. The runner hosts it in-process
+# (STEP_STREAM_HTTP); python -m app.middleware.step_stream runs it standalone.
+#   GET /incidents/<id>/steps[?after=<seq>]   text/event-stream, one "step" event per step
+#   GET /health                               hub counters as JSON
+#   GET /metrics                              span histograms and cache counters, Prometheus text (app/telemetry.py)
+import os, re, json, time, select, socket, threading, urllib.request
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from app.db.notify import STEP_STREAM_ADDR, parse_addr, set_step_sink
+from app.telemetry import prometheus_text
+
+STEP_STREAM_HTTP = os.getenv("STEP_STREAM_HTTP", "127.0.0.1:8767")     # SSE listen address; empty disables
+STEP_STREAM_URL = os.getenv("STEP_STREAM_URL", "http://" + (STEP_STREAM_HTTP or "127.0.0.1:8767"))
+STEP_STREAM_HISTORY = int(os.getenv("STEP_STREAM_HISTORY", "500"))       # replayable steps per incident
+STEP_STREAM_INCIDENTS = int(os.getenv("STEP_STREAM_INCIDENTS", "1000"))  # incidents with history kept (LRU)
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_BACKLOG = 1000       # a subscriber this far behind is cut off and resumes via Last-Event-ID
+
+# ---------- hub ----------
+
+class Subscription:
+    def __init__(self, backlog: List[Dict[str, Any]]):
+        self.events = deque(backlog)
+        self.cond = threading.Condition()
+        self.dropped = False
+
+    def take(self, timeout: float) -> List[Dict[str, Any]]:
+        with self.cond:
+            if not self.events:
+                self.cond.wait(timeout)
+            out, self.events = list(self.events), deque()
+            return out
+
+class StepHub:
+    """In-process pub/sub: publish(event) assigns a per-incident seq, stores it
+    in a bounded history and hands it to that incident's subscribers."""
+
+    def __init__(self, history: int = STEP_STREAM_HISTORY, max_incidents: int = STEP_STREAM_INCIDENTS):
+        self.history, self.max_incidents = history, max_incidents
+        self._incidents: "OrderedDict[int, list]" = OrderedDict()    # id -> [last seq, deque of events]
+        self._subs: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        iid = int(event["incident_id"])
+        with self._lock:
+            entry = self._incidents.get(iid)
+            if entry is None:
+                entry = self._incidents[iid] = [0, deque(maxlen=self.history)]
+                if len(self._incidents) > self.max_incidents:
+                    self._incidents.popitem(last=False)
+            else:
+                self._incidents.move_to_end(iid)
+            entry[0] += 1
+            event = {**event, "seq": entry[0]}
+            entry[1].append(event)
+            self.published += 1
+            subs = list(self._subs.get(iid, ()))
+        for sub in subs:
+            with sub.cond:
+                if len(sub.events) >= SUBSCRIBER_BACKLOG:
+                    sub.dropped = True
+                else:
+                    sub.events.append(event)
+                sub.cond.notify()
+
+    def subscribe(self, incident_id: int, after: int = 0) -> Subscription:
+        """Live events of one incident, starting with the kept history past `after`."""
+        with self._lock:
+            entry = self._incidents.get(incident_id)
+            sub = Subscription([e for e in entry[1] if e["seq"] > after] if entry else [])
+            self._subs.setdefault(incident_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, incident_id: int, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(incident_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[incident_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"published": self.published, "incidents": len(self._incidents),
+                    "subscribers": sum(len(s) for s in self._subs.values())}
+
+hub = StepHub()
+
+# ---------- server ----------
+
+_PATH = re.compile(r"^/incidents/(\d+)/steps$")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path == "/health":
+            return self._json(200, hub.stats())
+        if path == "/metrics":
+            data = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        m = _PATH.match(path)
+        if not m:
+            return self._json(404, {"error": "use /incidents/<id>/steps"})
+        params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+        try:
+            after = int(self.headers.get("Last-Event-ID") or params.get("after", 0))
+        except ValueError:
+            after = 0
+        incident_id = int(m.group(1))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.close_connection = True
+        sub = hub.subscribe(incident_id, after)
+        try:
+            self.wfile.write(b"retry: 1000\n\n")
+            while not sub.dropped:
+                events = sub.take(HEARTBEAT_SECONDS)
+                if events:
+                    self.wfile.write("".join(
+                        f"id: {e['seq']}\nevent: step\ndata: {json.dumps(e)}\n\n" for e in events).encode())
+                else:
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            pass
+        finally:
+            hub.unsubscribe(incident_id, sub)
+
+def _receive(sock: socket.socket) -> None:
+    while True:
+        ready, _, _ = select.select([sock], [], [], 1.0)
+        if not ready:
+            continue
+        try:
+            hub.publish(json.loads(sock.recv(65536)))
+        except (ValueError, KeyError, TypeError) as e:
+            print("[stream] bad step datagram:", e)
+
+def start(http_addr: str = STEP_STREAM_HTTP, udp_addr: str = STEP_STREAM_ADDR) -> Optional[ThreadingHTTPServer]:
+    """Serve the stream from background threads of this process: steps recorded
+    here go straight to the hub, other processes' arrive as datagrams."""
+    if not http_addr:
+        return None
+    sock = None
+    if udp_addr:
+        family, target = parse_addr(udp_addr)
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.unlink(target)
+        sock.bind(target)
+    host, port = http_addr.rsplit(":", 1)
+    try:
+        server = ThreadingHTTPServer((host, int(port)), _Handler)
+    except OSError:
+        if sock:
+            sock.close()
+        raise
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="step-stream-http", daemon=True).start()
+    if sock:
+        threading.Thread(target=_receive, args=(sock,), name="step-stream-udp", daemon=True).start()
+    set_step_sink(hub.publish)
+    return server
+
+# ---------- client ----------
+
+class StepFeed:
+    """Background SSE reader for one incident (the UI's side of the stream).
+    drain() returns the events received since the last call; reconnects resume
+    from the last seq seen. `connected` is False while the server is unreachable."""
+
+    def __init__(self, incident_id: int, base_url: str = STEP_STREAM_URL, after: int = 0):
+        self.incident_id = incident_id
+        self.url = f"{base_url.rstrip('/')}/incidents/{incident_id}/steps"
+        self.last_seq, self.connected = after, False
+        self._events: deque = deque()
+        self._stop = threading.Event()
+        self._resp = None
+        threading.Thread(target=self._run, name=f"step-feed-{incident_id}", daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                req = urllib.request.Request(self.url, headers={"Last-Event-ID": str(self.last_seq)})
+                with urllib.request.urlopen(req, timeout=HEARTBEAT_SECONDS * 2) as resp:
+                    self._resp, self.connected = resp, True
+                    data = None
+                    for raw in resp:
+                        if self._stop.is_set():
+                            return
+                        line = raw.decode("utf-8").rstrip("\r\n")
+                        if line.startswith("data: "):
+                            data = line[6:]
+                        elif not line and data:
+                            event = json.loads(data)
+                            self.last_seq = event["seq"]
+                            self._events.append(event)
+                            data = None
+            except (OSError, ValueError):
+                pass
+            self.connected = False
+            self._stop.wait(1.0)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        out = []
+        while self._events:
+            out.append(self._events.popleft())
+        return out
+
+    def close(self) -> None:
+        self._stop.set()
+        resp = self._resp
+        if resp is not None:
+            try:
+                resp.close()
+            except Exception:
+                pass
+
+if __name__ == "__main__":
+    start()
+    print(f"[stream] SSE on http://{STEP_STREAM_HTTP}/incidents/<id>/steps, "
+          f"steps via {STEP_STREAM_ADDR or 'in-process only'}")
+    while True:
+        time.sleep(60)
+        print("[stream]", hub.stats())
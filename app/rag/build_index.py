@@ -1,8 +1,18 @@
-# Placeholder for building a vector index from app/rag/data/examples.jsonl
-# In hackathon, you may directly load examples in analyst or wire Chroma here.
-import json, os
+# Builds the playbook vector index from app/rag/data/examples.jsonl (plus the
+# runbook PDF when present) using the incremental rag_pipeline build: only new
+# or changed chunks are embedded, removed ones are deleted.
+import os, sys
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from rag_pipeline.pipeline import build_rag_index  # noqa: E402
+
 DATA = 'app/rag/data/examples.jsonl'
-if os.path.exists(DATA):
-    print('Index build stub: loaded examples:', sum(1 for _ in open(DATA,'r',encoding='utf-8')))
-else:
-    print('No examples found:', DATA)
+RUNBOOK = os.path.join('rag_pipeline', 'RAG Document.pdf')
+
+if __name__ == '__main__':
+    docs = [p for p in (DATA, RUNBOOK) if os.path.exists(p)]
+    if docs:
+        build_rag_index(docs, prune=True)
+    else:
+        print('No examples found:', DATA)
@@ -0,0 +1,89 @@
+# app/rag/rca.py
+# Drafts the RCA from rule matches + retrieved playbook chunks. Uses the LLM
+# (LLM_MODEL) when a key is configured, otherwise grounds the RCA directly in
+# the best playbook chunk / rule.
+import os, re, json
+from typing import Any, Dict, List, Optional
+
+from app.config import LLM_MODEL
+from app.telemetry import span
+
+RCA_LLM = os.getenv("RCA_LLM", "auto")      # auto: use the LLM when OPENAI_API_KEY is set | off
+
+_PLAYBOOK = re.compile(r"Error pattern:\s*(?P<pattern>.*?)\.\s*Root cause:\s*(?P<root>.*?)\.\s*"
+                       r"Mitigation:\s*(?P<fix>.*?)\.?\s*$", re.S)
+
+_client = None
+
+def _llm_enabled() -> bool:
+    key = os.getenv("OPENAI_API_KEY", "")
+    return RCA_LLM != "off" and bool(key) and key != "sk-..."
+
+def _llm(prompt: str) -> Dict[str, Any]:
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    with span("rag.llm", model=LLM_MODEL):
+        resp = _client.chat.completions.create(
+            model=LLM_MODEL,
+            temperature=0,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": (
+                    "You are an SRE writing an incident root-cause analysis. Use only the evidence "
+                    "and playbook excerpts given. Reply with JSON: {\"issue\": str, \"root_cause\": str, "
+                    "\"mitigations\": [str], \"confidence\": number between 0 and 1}.")},
+                {"role": "user", "content": prompt},
+            ],
+        )
+    return json.loads(resp.choices[0].message.content)
+
+def _prompt(incident, matches, templates, chunks) -> str:
+    lines = [f"Service: {incident.get('service')}  Severity: {incident.get('severity')}",
+             "Matched log signatures:"]
+    lines += [f"- {m['issue']} ({m['pattern']}, {m['count']}x)" for m in matches] or ["- none"]
+    if templates:
+        lines += ["Log templates (count, time span, template, sample values; errors first):", templates]
+    lines += ["Playbook excerpts:"] + [f"[{i + 1}] {c['text']}" for i, c in enumerate(chunks)]
+    return "\n".join(lines)
+
+def _from_playbook(chunk: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    m = _PLAYBOOK.search(chunk["text"])
+    if not m:
+        return None
+    return {"root_cause": m["root"].strip(),
+            "mitigations": [f.strip() for f in m["fix"].split(";") if f.strip()]}
+
+def draft_rca(incident: Dict[str, Any], matches: List[Dict[str, Any]], rules: List[Dict[str, Any]],
+              templates: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """issue / root_cause / mitigations / confidence / grounded_in for one incident.
+    `rules` are the full rule dicts of `matches` (same order); `templates` is the
+    rendered log-template summary (TemplateMiner.render)."""
+    sources = [c["id"] or c["source"] for c in chunks]
+    if _llm_enabled() and (matches or chunks):
+        try:
+            out = _llm(_prompt(incident, matches, templates, chunks))
+            return {"issue": out.get("issue") or "Unknown",
+                    "root_cause": out.get("root_cause") or "Inconclusive",
+                    "mitigations": list(out.get("mitigations") or []),
+                    "confidence": float(out.get("confidence") or 0.5),
+                    "grounded_in": sources, "drafted_by": LLM_MODEL}
+        except Exception as e:
+            print("[rag] LLM drafting failed, using playbook/rules:", e)
+
+    playbook = next((p for p in map(_from_playbook, chunks) if p), None)
+    if rules:
+        top = rules[0]
+        mitigations = list(top["fix"])
+        if playbook:
+            mitigations += [f for f in playbook["mitigations"] if f not in mitigations]
+        return {"issue": top["issue"], "root_cause": top["root"], "mitigations": mitigations,
+                "confidence": 0.8 if playbook else 0.6, "grounded_in": sources, "drafted_by": "rules"}
+    if playbook:
+        return {"issue": "Matched playbook entry", "root_cause": playbook["root_cause"],
+                "mitigations": playbook["mitigations"], "confidence": 0.4,
+                "grounded_in": sources[:1], "drafted_by": "playbook"}
+    return {"issue": "Unknown", "root_cause": "Inconclusive",
+            "mitigations": ["Escalate to on-call", "Gather more logs", "Increase verbosity"],
+            "confidence": 0.1, "grounded_in": [], "drafted_by": "fallback"}
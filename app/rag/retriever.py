@@ -0,0 +1,205 @@
+# app/rag/retriever.py
+# Playbook retrieval for the analyst. A query is built from the matched log
+# signatures plus the incident's service/severity and run against a local BM25
+# index (exact tokens such as ECONNREFUSED) and the vector store, fused by
+# reciprocal rank; a decisive BM25 hit skips the embedding + vector call.
+# Results (and the drafted RCA, see app/rag/rca.py) are cached in LRU+TTL caches
+# keyed by a normalized error fingerprint and the service, so repeat incidents
+# skip embedding/vector/LLM calls.
+import os, hashlib, threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.telemetry import export_metric, span
+
+RAG_RETRIEVAL = os.getenv("RAG_RETRIEVAL", "auto")          # auto: on when embeddings are available | off
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.2"))     # drop weaker hits (stores that return scores)
+RAG_HYBRID = os.getenv("RAG_HYBRID", "auto")                 # auto: BM25 + vector, RRF-fused | vector | lexical
+RAG_LEXICAL_SKIP = float(os.getenv("RAG_LEXICAL_SKIP", "2.0"))   # skip the vector call when BM25 #1 >= this x #2 ...
+RAG_LEXICAL_MIN = float(os.getenv("RAG_LEXICAL_MIN", "3.0"))     # ... and >= this (~ one rare exact token); 0 = never skip
+RRF_K = 60
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1024"))
+RAG_CACHE_TTL = int(os.getenv("RAG_CACHE_TTL", "3600"))      # seconds; playbook edits show up after this
+ERROR_LINES = 3                                              # error templates in a fingerprint / query
+
+# ---------- fingerprints ----------
+
+def fingerprint(matches: List[Dict[str, Any]], error_lines: List[str]) -> str:
+    """Matched rule ids when any rule fired, else the top error log templates."""
+    if matches:
+        basis = "rules:" + ",".join(sorted(m["rule"] for m in matches))
+    else:
+        basis = "lines:" + "\n".join(sorted(error_lines[:ERROR_LINES]))
+    return hashlib.sha1(basis.encode("utf-8")).hexdigest()[:16]
+
+def build_query(incident: Dict[str, Any], matches: List[Dict[str, Any]], error_lines: List[str]) -> str:
+    parts = [f"service: {incident.get('service', 'unknown')}",
+             f"severity: {incident.get('severity', 'unknown')}"]
+    for m in matches[:3]:
+        parts.append(f"{m['issue']} (pattern: {m['pattern']})")
+    parts.extend(error_lines[:ERROR_LINES])
+    return "\n".join(parts)
+
+# ---------- caches ----------
+
+class QueryCache:
+    """Thread-safe LRU+TTL cache with hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = RAG_CACHE_SIZE, ttl: int = RAG_CACHE_TTL):
+        self.name = name
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self.lock:
+            value = self.cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.cache[key] = value
+
+    def clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cache),
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+RETRIEVAL_CACHE = QueryCache("retrieval")
+RCA_CACHE = QueryCache("rca")
+
+def cache_metrics() -> Dict[str, Dict[str, Any]]:
+    return {c.name: c.stats() for c in (RETRIEVAL_CACHE, RCA_CACHE)}
+
+def _cache_stat(field: str):
+    return lambda: {f'cache="{name}"': s[field] for name, s in cache_metrics().items()}
+
+for _name, _kind, _field, _help in (
+        ("responder_rag_cache_hits_total", "counter", "hits", "Retrieval/RCA cache lookups that hit."),
+        ("responder_rag_cache_misses_total", "counter", "misses", "Retrieval/RCA cache lookups that missed."),
+        ("responder_rag_cache_hit_ratio", "gauge", "hit_rate", "Share of retrieval/RCA cache lookups that hit."),
+        ("responder_rag_cache_entries", "gauge", "size", "Entries held by the retrieval/RCA caches.")):
+    export_metric(_name, _kind, _help, _cache_stat(_field))
+
+# ---------- retrieval ----------
+
+def rrf(*rankings: List[Dict[str, Any]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion: each hit scores sum(1 / (k + rank)) over the lists
+    it appears in (matched by id, or by text for stores without ids)."""
+    fused: Dict[str, Dict[str, Any]] = {}
+    for hits in rankings:
+        for rank, h in enumerate(hits, 1):
+            entry = fused.setdefault(h["id"] or h["text"], {**h, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    out = sorted(fused.values(), key=lambda h: -h["score"])
+    for h in out:
+        h["score"] = round(h["score"], 5)
+    return out
+
+class Retriever:
+    """Fetches top-k playbook chunks: BM25 over the lexical index built next to
+    the vector store (rag_pipeline/lexical_index.py) and, unless BM25 is decisive,
+    an embedded query against the configured VectorStore (VECTOR_BACKEND).
+    Built lazily; with neither an index nor an embedding provider, offline runs
+    fall back to the rules alone."""
+
+    def __init__(self, store=None, service=None, lexical=None, top_k: int = RAG_TOP_K):
+        self.store, self.service, self.lexical, self.top_k = store, service, lexical, top_k
+
+    @staticmethod
+    def vector_available() -> bool:
+        if RAG_RETRIEVAL == "off" or RAG_HYBRID == "lexical":
+            return False
+        provider = os.getenv("EMBEDDINGS_PROVIDER", "openai").lower()
+        key = os.getenv("OPENAI_API_KEY", "")
+        return provider == "hash" or (bool(key) and key != "sk-...")
+
+    def lexical_available(self) -> bool:
+        if RAG_RETRIEVAL == "off" or RAG_HYBRID == "vector":
+            return False
+        if self.lexical is None:
+            from rag_pipeline.lexical_index import LexicalIndex
+            self.lexical = LexicalIndex()
+        return self.lexical.exists()
+
+    def available(self) -> bool:
+        return self.vector_available() or self.lexical_available()
+
+    def _ready(self):
+        if self.service is None:
+            from rag_pipeline.embedder import EmbeddingService
+            self.service = EmbeddingService(model=os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small"),
+                                            retries=1)   # don't stall an incident on a flaky API
+        if self.store is None:
+            from rag_pipeline.vector_store import get_store
+            self.store = get_store()
+
+    @staticmethod
+    def _chunk(h: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": h["id"], "score": round(h["score"], 4), "text": h["metadata"].get("text", ""),
+                "source": h["metadata"].get("source")}
+
+    def lexical_search(self, query: str) -> List[Dict[str, Any]]:
+        if not self.lexical_available():
+            return []
+        with span("rag.lexical_query", top_k=self.top_k):
+            return [self._chunk(h) for h in self.lexical.search(query, self.top_k)]
+
+    def vector_search(self, query: str) -> List[Dict[str, Any]]:
+        with span("rag.setup"):         # lazy client/store construction on first use
+            self._ready()
+        with span("rag.embed"):
+            vec = self.service.embed_texts([query])[0]
+        if hasattr(self.store, "search"):
+            with span("rag.vector_query", top_k=self.top_k):
+                hits = self.store.search([vec], self.top_k)[0]
+            return [self._chunk(h) for h in hits if h["score"] >= RAG_MIN_SCORE]
+        with span("rag.vector_query", top_k=self.top_k):
+            texts = self.store.query(vec, top_k=self.top_k)
+        return [{"id": None, "score": None, "text": t, "source": None} for t in texts]
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """[{id, score, text, source}], best first. Scores are BM25 when the
+        lexical hits are returned alone, RRF scores when fused."""
+        lexical = self.lexical_search(query)
+        runner_up = lexical[1]["score"] if len(lexical) > 1 else 0.0
+        decisive = (RAG_LEXICAL_MIN > 0 and lexical and lexical[0]["score"] >= RAG_LEXICAL_MIN
+                    and lexical[0]["score"] >= RAG_LEXICAL_SKIP * runner_up)
+        if decisive or not self.vector_available():
+            return lexical
+        vector = self.vector_search(query)
+        return rrf(lexical, vector)[:self.top_k] if lexical else vector
+
+_retriever: Optional[Retriever] = None
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        _retriever = Retriever()
+    return _retriever
+
+def retrieve(key: Tuple[str, str], query: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """(playbook chunks, cache_hit) for a (fingerprint, service) key."""
+    cached = RETRIEVAL_CACHE.get(key)
+    if cached is not None:
+        return cached, True
+    chunks: List[Dict[str, Any]] = []
+    if get_retriever().available():
+        try:
+            chunks = get_retriever().search(query)
+        except Exception as e:
+            print("[rag] retrieval failed:", e)
+            return [], False            # not cached: the next incident retries
+    RETRIEVAL_CACHE.put(key, chunks)
+    return chunks, False
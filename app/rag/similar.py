@@ -0,0 +1,155 @@
+# app/rag/similar.py
+# Similar past incidents. An analysed incident is reduced to a feature set
+# (service, matched rule ids, tokens and token pairs of its error log templates)
+# and a MinHash signature of it is stored by dal.save_report. An in-memory LSH
+# index (BANDS bands of ROWS values) over those signatures returns the top-k
+# most similar past incidents in about a millisecond; above SIMILAR_REUSE the
+# analyst takes the prior RCA as its draft instead of retrieval + LLM.
+# The index loads from incident_signatures on first use and picks up other
+# processes' rows every SIMILAR_REFRESH_SECONDS.
+import os, re, json, time, struct, hashlib, threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.telemetry import span
+
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "5"))
+SIMILAR_MIN = float(os.getenv("SIMILAR_MIN", "0.3"))           # hide weaker matches
+SIMILAR_REUSE = float(os.getenv("SIMILAR_REUSE", "0.8"))       # reuse the prior RCA at/above this; >1 disables
+SIMILAR_MAX_INCIDENTS = int(os.getenv("SIMILAR_MAX_INCIDENTS", "200000"))   # newest kept in memory
+SIMILAR_REFRESH_SECONDS = float(os.getenv("SIMILAR_REFRESH_SECONDS", "5"))
+NUM_PERM, BANDS = 64, 16        # 16 bands x 4 rows: pairs above ~0.5 Jaccard become candidates
+ROWS = NUM_PERM // BANDS
+MAX_FEATURES = 200
+LOAD_BATCH = 10000
+_PRIME = (1 << 31) - 1
+_SIG = struct.Struct(f"<{NUM_PERM}I")
+
+def _perms() -> List[Tuple[int, int]]:
+    # fixed (a, b) pairs, so signatures are comparable across processes and restarts
+    out, seed = [], b"similar"
+    for _ in range(NUM_PERM):
+        seed = hashlib.blake2b(seed, digest_size=16).digest()
+        a, b = int.from_bytes(seed[:8], "little"), int.from_bytes(seed[8:], "little")
+        out.append((a % (_PRIME - 1) + 1, b % _PRIME))
+    return out
+
+_PERMS = _perms()
+_WORD = re.compile(r"[A-Za-z][A-Za-z_.:/-]{2,}")
+
+def features(service: Optional[str], rule_ids: Iterable[str], templates: Iterable[str]) -> List[str]:
+    """Feature set of an incident; [] when there is nothing but the service to go on."""
+    out = dict.fromkeys(f"rule:{r}" for r in sorted(rule_ids))
+    pairs = {}
+    for text in templates:
+        words = [w.lower() for w in _WORD.findall(text.replace("<*>", " "))]
+        out.update(dict.fromkeys(f"w:{w}" for w in words))
+        pairs.update(dict.fromkeys(f"p:{a} {b}" for a, b in zip(words, words[1:])))
+    if not out:
+        return []
+    # rules, then words, then word pairs (in template rank order) survive the cap
+    return [f"svc:{(service or 'unknown').lower()}"] + (list(out) + list(pairs))[:MAX_FEATURES - 1]
+
+def minhash(feats: Iterable[str]) -> bytes:
+    xs = [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=4).digest(), "little") for f in feats]
+    return _SIG.pack(*(min((a * x + b) % _PRIME for x in xs) for a, b in _PERMS))
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the two feature sets."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+class SimilarityIndex:
+    """MinHash LSH over stored signatures: incident id -> (service, signature)."""
+
+    def __init__(self, max_incidents: int = SIMILAR_MAX_INCIDENTS):
+        self.max_incidents = max_incidents
+        self.sigs: "OrderedDict[int, Tuple[str, Tuple[int, ...]]]" = OrderedDict()
+        self.buckets: List[Dict[Tuple[int, ...], set]] = [{} for _ in range(BANDS)]
+        self.lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.last_row, self.refreshed = 0, 0.0
+
+    def _bands(self, sig: Tuple[int, ...]):
+        return ((b, sig[b * ROWS:(b + 1) * ROWS]) for b in range(BANDS))
+
+    def add(self, incident_id: int, service: str, signature: bytes) -> None:
+        sig = _SIG.unpack(bytes(signature))
+        with self.lock:
+            self._remove(incident_id)
+            self.sigs[incident_id] = (service, sig)
+            for b, key in self._bands(sig):
+                self.buckets[b].setdefault(key, set()).add(incident_id)
+            while len(self.sigs) > self.max_incidents:
+                self._remove(next(iter(self.sigs)))
+
+    def _remove(self, incident_id: int) -> None:
+        entry = self.sigs.pop(incident_id, None)
+        if entry is None:
+            return
+        for b, key in self._bands(entry[1]):
+            ids = self.buckets[b].get(key)
+            if ids is not None:
+                ids.discard(incident_id)
+                if not ids:
+                    del self.buckets[b][key]
+
+    def refresh(self, force: bool = False) -> int:
+        """Load signatures stored since the last refresh (by any process)."""
+        now = time.monotonic()
+        if not force and now - self.refreshed < SIMILAR_REFRESH_SECONDS:
+            return 0
+        if not self._refreshing.acquire(blocking=False):
+            return 0                                   # another thread is on it
+        try:
+            self.refreshed = now
+            from app.db.dal import load_signatures      # imports this module
+            loaded = 0
+            while True:
+                rows = load_signatures(self.last_row, LOAD_BATCH)
+                for r in rows:
+                    self.add(r["incident_id"], r["service"], r["signature"])
+                    self.last_row = max(self.last_row, r["id"])
+                loaded += len(rows)
+                if len(rows) < LOAD_BATCH:
+                    return loaded
+        finally:
+            self._refreshing.release()
+
+    def query(self, feats: List[str], k: int = SIMILAR_TOP_K, exclude: Optional[int] = None,
+              min_similarity: float = SIMILAR_MIN) -> List[Dict[str, Any]]:
+        """Top-k stored incidents by estimated Jaccard similarity, best first."""
+        if not feats:
+            return []
+        with span("similar.query"):
+            self.refresh()
+            sig = _SIG.unpack(minhash(feats))
+            with self.lock:
+                candidates = set()
+                for b, key in self._bands(sig):
+                    candidates |= self.buckets[b].get(key, set())
+                candidates.discard(exclude)
+                scored = [(similarity(sig, self.sigs[i][1]), i) for i in candidates]
+                scored.sort(key=lambda t: (-t[0], -t[1]))          # ties: the most recent incident
+                return [{"incident_id": i, "service": self.sigs[i][0], "similarity": round(s, 3)}
+                        for s, i in scored[:k] if s >= min_similarity]
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"incidents": len(self.sigs), "buckets": sum(len(b) for b in self.buckets)}
+
+INDEX = SimilarityIndex()
+
+def prior_report(incident_id: int) -> Optional[Dict[str, Any]]:
+    """Report JSON of a past incident, from the hot tables or the retention archive."""
+    from app.db.dal import get_latest_report
+    from app.db.retention import load_archived
+    rep = get_latest_report(incident_id)
+    if rep is not None:
+        return rep["report"]
+    archived = load_archived(incident_id)
+    if archived and archived["reports"]:
+        try:
+            return json.loads(archived["reports"][-1]["report_json"] or "{}")
+        except (TypeError, ValueError):
+            return None
+    return None
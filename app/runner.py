@@ -1,60 +1,160 @@
 # app/runner.py
-import os, time, traceback
-from app.db.dal import (
-    init_db, get_open_incidents, mark_in_progress, mark_done, mark_failed,
-    record_step, save_report
-)
+import os, time, traceback, socket, threading, asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from app.db.dal import LeaseLost, init_db, claim_incident, renew_lease, mark_failed, record_step
+from app.middleware.intake import Intake
+from app.middleware.correlator import Correlator
+from app.middleware import step_stream
+from app.agents.collector_agent import collector_run
+from app.agents.analyst_agent import analyze_logs
+from app.agents.supervisor import supervisor_orchestrate
+from app.rag.retriever import cache_metrics
+from app import telemetry
 
-POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "10"))
+RUNNER_WORKERS = int(os.getenv("RUNNER_WORKERS", "4"))
+RUNNER_MODE = os.getenv("RUNNER_MODE", "thread")          # thread | asyncio | process
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "300"))    # crashed workers' incidents come back after this
 
-def process_incident(inc: dict):
+CORRELATOR = Correlator()      # shared by the workers of this process
+
+def process_incident(inc: dict, lease: "LeaseKeeper | None" = None) -> bool:
+    """Run the agents; False if the incident failed. Raises LeaseLost when another
+    worker took it over (checked between agents, and by the finishing writes)."""
     iid = inc["id"]
+    check = lease.check if lease is not None else (lambda: None)
     try:
-        mark_in_progress(iid)
-        record_step(iid, "collector", "start", "Starting collection", status="STARTED")
-
-        # TODO: your real collection here
-        # e.g., choose folders, fetch logs...
-        record_step(iid, "collector", "retrieve", "Selected folders & fetched logs", status="OK")
-
-        # TODO: your real analysis here (RAG/LLM)
-        rca = {
-            "issue": "Demo issue",
-            "root_cause": "Demo root cause",
-            "mitigations": [{"action": "Demo mitigation"}],
-            "confidence": 0.9,
-        }
-        record_step(iid, "analyst", "summarize", "Drafted RCA", {"issue": rca["issue"]}, status="OK")
-
-        report_md = f"""# Incident {iid} — RCA
-
-**Issue:** {rca['issue']}
-**Root cause:** {rca['root_cause']}
-**Confidence:** {rca['confidence']}
-
-## Suggested mitigations
-- {rca['mitigations'][0]['action']}
-"""
-        save_report(iid, rca, report_md)
-
-        record_step(iid, "supervisor", "done", "Incident processed", status="OK")
-        mark_done(iid)
+        with telemetry.trace(iid):
+            with telemetry.span("collector"):
+                collected = collector_run(inc)
+            check()
+            with telemetry.span("analyst"):
+                analysis = analyze_logs(inc, collected)
+            check()
+            with telemetry.span("supervisor"):
+                supervisor_orchestrate(inc, analysis)
+        return True
+    except LeaseLost:
+        raise
     except Exception as e:
         record_step(iid, "supervisor", "error", f"{e}", {"trace": traceback.format_exc()}, status="ERROR")
-        mark_failed(iid)
+        mark_failed(iid, inc.get("claimed_by"))
+        return False
+
+def handle(inc: dict, wid: str) -> None:
+    """Correlate, then run the agents unless the incident was grouped as a duplicate."""
+    with telemetry.span("correlate"):
+        parent = CORRELATOR.correlate(inc)
+    if parent is not None:
+        print(f"[runner] {wid} grouped incident {inc['id']} under {parent}")
+        return
+    print(f"[runner] {wid} processing incident {inc['id']}")
+    try:
+        with LeaseKeeper(inc["id"], wid) as lease:
+            ok = process_incident(inc, lease)
+    except LeaseLost as e:
+        print(f"[runner] {wid} abandoning incident {inc['id']}: {e}")
+        return
+    if not ok:
+        children = CORRELATOR.release(inc)
+        if children:
+            print(f"[runner] {wid} incident {inc['id']} failed; re-queued its duplicates {children}")
+
+# ---------- worker pool ----------
+
+class LeaseKeeper:
+    """Renews a claimed incident's lease in the background while it is processed;
+    check() raises LeaseLost once a renewal finds another worker holds it."""
+
+    def __init__(self, incident_id, worker_id: str, lease_seconds: int = LEASE_SECONDS):
+        self.args = (incident_id, worker_id, lease_seconds)
+        self.interval = max(1.0, lease_seconds / 3)
+        self._stop = threading.Event()
+        self._lost = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not renew_lease(*self.args):
+                    print(f"[runner] lost lease on incident {self.args[0]}")
+                    self._lost.set()
+                    return
+            except Exception as e:
+                print("[runner] lease renewal error:", e)
+
+    def check(self) -> None:
+        if self._lost.is_set():
+            raise LeaseLost(f"lease on incident {self.args[0]} passed to another worker")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+
+def worker_id(slot: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{slot}"
+
+def drain(slot: int) -> int:
+    """Claim and process incidents until none are left; returns how many were handled."""
+    wid, handled = worker_id(slot), 0
+    while True:
+        inc = claim_incident(wid, LEASE_SECONDS)
+        if inc is None:
+            return handled
+        handle(inc, wid)
+        handled += 1
+
+async def drain_async(slot: int) -> int:
+    # agents are blocking code, so each claim/process hop runs in the default executor
+    wid, handled = worker_id(slot), 0
+    while True:
+        inc = await asyncio.to_thread(claim_incident, wid, LEASE_SECONDS)
+        if inc is None:
+            return handled
+        await asyncio.to_thread(handle, inc, wid)
+        handled += 1
+
+def make_pool(mode: str = RUNNER_MODE, workers: int = RUNNER_WORKERS):
+    """Return a callable that drains the queue once with `workers` concurrent workers."""
+    if mode == "asyncio":
+        async def _gather():
+            return await asyncio.gather(*(drain_async(i) for i in range(workers)))
+        return lambda: sum(asyncio.run(_gather()))
+    if mode in ("thread", "process"):
+        pool_cls = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+        pool = pool_cls(max_workers=workers)
+        return lambda: sum(pool.map(drain, range(workers)))
+    raise ValueError(f"unknown RUNNER_MODE: {mode!r} (thread | asyncio | process)")
 
 def main():
     init_db()  # ensure tables exist
-    print(f"[runner] polling every {POLL_INTERVAL_SECONDS}s")
+    print(f"[runner] correlation window {CORRELATOR.window.total_seconds():g}s, "
+          f"{CORRELATOR.load()} open group(s) restored")
+    try:
+        if step_stream.start():
+            print(f"[runner] live steps on {step_stream.STEP_STREAM_URL}/incidents/<id>/steps")
+    except OSError as e:
+        print("[runner] step stream not started (another process serving it?):", e)
+    run_once = make_pool()
+    intake = Intake("runner")
+    wake = ", ".join(s.name for s in intake.sources) or f"backoff polling up to {intake.backoff.hi:g}s"
+    print(f"[runner] {RUNNER_WORKERS} {RUNNER_MODE} workers, wake-up: {wake}")
     while True:
+        handled = 0
         try:
-            open_list = get_open_incidents()
-            for inc in open_list:
-                print(f"[runner] processing incident {inc['id']}")
-                process_incident(inc)
+            handled = run_once()
         except Exception as e:
             print("[runner] loop error:", e)
-        time.sleep(POLL_INTERVAL_SECONDS)
+            time.sleep(1)
+        if handled:
+            rates = ", ".join(f"{k} {v['hit_rate']:.0%}" for k, v in cache_metrics().items())
+            print(f"[runner] handled {handled} ({CORRELATOR.stats['grouped']} grouped so far); "
+                  f"RAG cache hit rate: {rates}")
+        telemetry.write_prometheus()
+        intake.record(handled)
+        intake.wait()
 
 if __name__ == "__main__":
     main()
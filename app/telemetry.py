@@ -0,0 +1,281 @@
+# app/telemetry.py
+# Span timing for the incident pipeline. `with span("name"):` (or @traced) times
+# a block with monotonic nanoseconds; inside `with trace(incident_id):` spans
+# nest into a per-incident trace whose timings record_step attaches to the next
+# step. Every span also feeds process-wide histograms, exported as Prometheus
+# text (GET /metrics on the step-stream server, TELEMETRY_PROM_FILE) together
+# with the gauges/counters other modules register (export_metric), and, per
+# incident, as OpenTelemetry OTLP/JSON lines (TELEMETRY_OTEL_FILE).
+# PROFILE_INCIDENTS=<id>[,<id>] samples the stacks of those incidents' worker
+# thread and writes collapsed stacks (flamegraph input) under PROFILE_DIR.
+import os, sys, json, time, random, threading, contextvars, functools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+TELEMETRY = os.getenv("TELEMETRY", "on") != "off"
+TELEMETRY_OTEL_FILE = os.getenv("TELEMETRY_OTEL_FILE", "")       # OTLP/JSON, one trace per line; "" = off
+TELEMETRY_PROM_FILE = os.getenv("TELEMETRY_PROM_FILE", "")       # textfile-collector output; "" = off
+PROFILE_INCIDENTS = {s.strip() for s in os.getenv("PROFILE_INCIDENTS", "").split(",") if s.strip()}
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SERVICE_NAME = "devops-incident-responder"
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)    # seconds
+
+# ---------- metrics ----------
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "n", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum, self.n, self.errors = 0.0, 0, 0
+
+_metrics: Dict[str, _Histogram] = {}
+_metrics_lock = threading.Lock()
+
+def _observe(name: str, seconds: float, error: bool) -> None:
+    with _metrics_lock:
+        h = _metrics.get(name)
+        if h is None:
+            h = _metrics[name] = _Histogram()
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        h.counts[i] += 1
+        h.sum += seconds
+        h.n += 1
+        h.errors += error
+
+_exported: List[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = []
+
+def export_metric(name: str, kind: str, help_text: str, read: Callable[[], Dict[str, float]]) -> None:
+    """Add a metric read at scrape time: read() returns {label set, e.g. 'cache="rca"'
+    ("" for none): value}; kind is the Prometheus type (gauge | counter)."""
+    _exported.append((name, kind, help_text, read))
+
+def prometheus_text() -> str:
+    """All span histograms in the Prometheus text exposition format."""
+    out = ["# HELP responder_span_duration_seconds Duration of instrumented pipeline spans.",
+           "# TYPE responder_span_duration_seconds histogram"]
+    errors = ["# HELP responder_span_errors_total Spans that ended with an exception.",
+              "# TYPE responder_span_errors_total counter"]
+    with _metrics_lock:
+        items = sorted((k, v.counts[:], v.sum, v.n, v.errors) for k, v in _metrics.items())
+    for name, counts, total, n, errs in items:
+        label = f'span="{name}"'
+        running = 0
+        for bound, c in zip(BUCKETS, counts):
+            running += c
+            out.append(f'responder_span_duration_seconds_bucket{{{label},le="{bound:g}"}} {running}')
+        out.append(f'responder_span_duration_seconds_bucket{{{label},le="+Inf"}} {n}')
+        out.append(f"responder_span_duration_seconds_sum{{{label}}} {total:.9f}")
+        out.append(f"responder_span_duration_seconds_count{{{label}}} {n}")
+        errors.append(f"responder_span_errors_total{{{label}}} {errs}")
+    extra = []
+    for name, kind, help_text, read in list(_exported):
+        extra += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        extra += [f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+                  for labels, value in sorted(read().items())]
+    return "\n".join(out + errors + extra) + "\n"
+
+def write_prometheus(path: str = TELEMETRY_PROM_FILE) -> None:
+    if not path:
+        return
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(path + ".tmp", path)
+
+# ---------- spans / traces ----------
+
+class Trace:
+    def __init__(self, incident_id: Any):
+        self.incident_id = incident_id
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.mono0, self.wall0 = time.perf_counter_ns(), time.time_ns()
+        self.spans: List["Span"] = []
+        self.pending: Dict[str, List[float]] = {}      # name -> [ms, count] since the last step
+        self.lock = threading.Lock()
+
+    def unix_ns(self, mono_ns: int) -> int:
+        return self.wall0 + (mono_ns - self.mono0)
+
+    def take_timings(self) -> Dict[str, Any]:
+        """{"t_ms": ms since the trace began, "spans": {name: {"ms", "n"}}} since the last call."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return {"t_ms": round((time.perf_counter_ns() - self.mono0) / 1e6, 3),
+                "spans": {k: {"ms": round(v[0], 3), "n": v[1]} for k, v in pending.items()}}
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_parent: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+class Span:
+    """Context manager timing one block; attrs end up on the OTel span."""
+    __slots__ = ("name", "attrs", "start", "end", "span_id", "parent_id", "error", "_tokens")
+
+    def __init__(self, name: str, **attrs):
+        self.name, self.attrs = name, attrs
+        self.start = self.end = 0
+        self.error = None
+
+    def __enter__(self):
+        if TELEMETRY:
+            parent = _parent.get()
+            self.parent_id = parent.span_id if parent else None
+            self.span_id = "%016x" % random.getrandbits(64)
+            self._tokens = _parent.set(self)
+            self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not TELEMETRY:
+            return False
+        self.end = time.perf_counter_ns()
+        _parent.reset(self._tokens)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _observe(self.name, (self.end - self.start) / 1e9, exc_type is not None)
+        tr = _trace.get()
+        if tr is not None:
+            ms = (self.end - self.start) / 1e6
+            with tr.lock:
+                tr.spans.append(self)
+                acc = tr.pending.setdefault(self.name, [0.0, 0])
+                acc[0] += ms
+                acc[1] += 1
+        return False
+
+    @property
+    def ms(self) -> float:
+        return (self.end - self.start) / 1e6
+
+span = Span
+
+def traced(name: str):
+    """Decorator form of span(name)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with Span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def traced_iter(name: str, it: Iterator) -> Iterator:
+    """Time a generator's work (each next()) as one span per item under `name`;
+    for lazily consumed streams such as log reads."""
+    while True:
+        with Span(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+def current() -> Optional[Trace]:
+    return _trace.get()
+
+def step_timings(incident_id: Any) -> Optional[Dict[str, Any]]:
+    """Timings to attach to a step of incident_id (None outside that incident's trace)."""
+    tr = _trace.get()
+    return tr.take_timings() if tr is not None and tr.incident_id == incident_id else None
+
+@contextmanager
+def trace(incident_id: Any, name: str = "incident") -> Iterator[Trace]:
+    """Root span for one incident; exports it when done, profiles it when listed
+    in PROFILE_INCIDENTS."""
+    tr = Trace(incident_id)
+    token = _trace.set(tr)
+    profiler = Sampler(incident_id) if str(incident_id) in PROFILE_INCIDENTS else None
+    try:
+        with Span(name, incident_id=incident_id):
+            if profiler:
+                with profiler:
+                    yield tr
+            else:
+                yield tr
+    finally:
+        _trace.reset(token)
+        if TELEMETRY and TELEMETRY_OTEL_FILE:
+            try:
+                export_otel(tr)
+            except OSError as e:
+                print("[telemetry] could not write trace:", e)
+
+# ---------- OpenTelemetry export ----------
+
+def _attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        v = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+def otel_json(tr: Trace) -> Dict[str, Any]:
+    """One trace as an OTLP/JSON ExportTraceServiceRequest."""
+    with tr.lock:
+        spans = list(tr.spans)
+    out = []
+    for s in spans:
+        d = {"traceId": tr.trace_id, "spanId": s.span_id, "name": s.name, "kind": 1,
+             "startTimeUnixNano": str(tr.unix_ns(s.start)), "endTimeUnixNano": str(tr.unix_ns(s.end)),
+             "attributes": [_attr("incident.id", tr.incident_id)] + [_attr(k, v) for k, v in s.attrs.items()],
+             "status": {"code": 2, "message": s.error} if s.error else {"code": 1}}
+        if s.parent_id:
+            d["parentSpanId"] = s.parent_id
+        out.append(d)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attr("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "app.telemetry"}, "spans": out}],
+    }]}
+
+_export_lock = threading.Lock()
+
+def export_otel(tr: Trace, path: str = TELEMETRY_OTEL_FILE) -> None:
+    line = json.dumps(otel_json(tr))
+    with _export_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+# ---------- sampling profiler ----------
+
+class Sampler:
+    """Samples the calling thread's stack every PROFILE_INTERVAL_MS from a helper
+    thread (sys._current_frames) and writes collapsed stacks on exit:
+    PROFILE_DIR/incident-<id>.folded, one "frame;frame;frame count" per line."""
+
+    def __init__(self, incident_id: Any, interval_ms: float = PROFILE_INTERVAL_MS, out_dir: str = PROFILE_DIR):
+        self.incident_id, self.interval = incident_id, interval_ms / 1000
+        self.path = os.path.join(out_dir, f"incident-{incident_id}.folded")
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+
+    def _run(self, ident: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(ident)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                key = ";".join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, args=(threading.get_ident(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for key, n in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+                f.write(f"{key} {n}\n")
+        print(f"[telemetry] {sum(self.stacks.values())} samples of incident {self.incident_id} -> {self.path}")
+        return False
@@ -1,25 +1,183 @@
-import os
+import os, re, math
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
+from rag_pipeline.embedder import get_tokenizer, get_service
 
 load_dotenv()
 
-def chunk_text(text: str, chunk_size: int = 500):
+CHUNKER_MODE = os.getenv("CHUNKER_MODE", "structural")   # structural | semantic | langchain
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))     # tokens carried into the next chunk
+
+_HEADING = re.compile(r"^\s*(#{1,6}\s+\S|[A-Z][A-Z0-9 /&:-]{3,}$|(?:\d+\.){2,}\s+[A-Z])")
+_STEP = re.compile(r"^\s*(\d+[.)]\s|Step\s+\d+\b|[-*\u2022]\s)")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LOGLINE = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}|\[\w+\]|(ERROR|WARN|INFO|DEBUG)\b)")
+_SENTENCE = re.compile(r"(?<=[^\d\s][.!?])\s+(?=[A-Z0-9\"'(\[])")
+
+_tokenizer = None
+
+def _enc():
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = get_tokenizer(os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small"))
+    return _tokenizer
+
+def blocks(pages):
+    """Structural units over a stream of page texts: headings and playbook steps
+    start a new block (a heading stays with what follows it, a step with its
+    continuation lines), code fences and runs of log lines stay whole, blank
+    lines end paragraphs."""
+    buf, kind, in_fence = [], None, False
+
+    def flush():
+        nonlocal buf, kind
+        text = "\n".join(buf).strip()
+        buf, kind = [], None
+        return text
+
+    for page in pages:
+        for line in page.splitlines():
+            if _FENCE.match(line):
+                if in_fence:
+                    buf.append(line)
+                    in_fence = False
+                    yield flush()
+                    continue
+                if buf and kind != "heading":
+                    yield flush()
+                buf.append(line)
+                in_fence, kind = True, "code"
+                continue
+            if in_fence:
+                buf.append(line)
+                continue
+            if not line.strip():
+                if buf and kind != "heading":
+                    yield flush()
+                continue
+            line_kind = ("log" if _LOGLINE.match(line) else "heading" if _HEADING.match(line)
+                         else "step" if _STEP.match(line) else "text")
+            if kind == "step" and line_kind == "text":
+                buf.append(line)            # wrapped step text
+                continue
+            if buf and kind != "heading" and (line_kind in ("heading", "step") or line_kind != kind):
+                yield flush()
+            buf.append(line)
+            kind = line_kind
+    if buf:
+        yield flush()
+
+def _split_long(text, chunk_size):
+    """(piece, n_tokens) for a block that exceeds chunk_size: sentences packed up
+    to chunk_size, a sentence that is still too long cut on token boundaries."""
+    enc = _enc()
+    cur, used = [], 0
+    for sent in _SENTENCE.split(text):
+        tokens = enc.encode(sent)
+        if cur and used + len(tokens) + 1 > chunk_size:
+            yield " ".join(cur), used
+            cur, used = [], 0
+        if len(tokens) > chunk_size:
+            for start in range(0, len(tokens), chunk_size):
+                part = tokens[start:start + chunk_size]
+                yield enc.decode(part), len(part)
+            continue
+        cur.append(sent)
+        used += len(tokens) + (1 if used else 0)
+    if cur:
+        yield " ".join(cur), used
+
+def iter_chunks(pages, chunk_size: int = 500, overlap: int = CHUNK_OVERLAP):
+    """Streaming structural chunker: packs whole blocks into chunks of at most
+    chunk_size tokens, each starting with the last `overlap` tokens of the one
+    before when they fit."""
+    enc = _enc()
+    cur, used, tail = [], 0, None
+
+    for block in blocks(pages):
+        if not block:
+            continue
+        n = len(enc.encode(block))
+        pieces = [(block, n)] if n <= chunk_size else list(_split_long(block, chunk_size))
+        for piece, m in pieces:
+            if cur and used + 1 + m > chunk_size:       # +1: the separator
+                text = "\n\n".join(cur)
+                yield text
+                toks = enc.encode(text)[-overlap:] if overlap else []
+                tail = (enc.decode(toks), len(toks)) if toks else None
+                cur, used = [], 0
+            if not cur and tail and tail[1] + 1 + m <= chunk_size:
+                cur, used = [tail[0]], tail[1]
+            used += m + (1 if cur else 0)
+            cur.append(piece)
+    if cur:
+        yield "\n\n".join(cur)
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a)) or 1.0
+    nb = math.sqrt(sum(y * y for y in b)) or 1.0
+    return dot / (na * nb)
+
+def semantic_chunks(text: str, chunk_size: int = 500, threshold_std: float = 1.0):
+    """SemanticChunker-style breakpoints (distance > mean + k*std between adjacent
+    sentences), but through the cached, batched EmbeddingService, and still
+    capped at chunk_size tokens."""
+    enc = _enc()
+    sentences = [s for s in _SENTENCE.split(text) if s.strip()]
+    if len(sentences) < 2:
+        return [text] if text.strip() else []
+    vecs = get_service().embed_texts([enc.decode(enc.encode(s)[:7500]) for s in sentences])
+    dists = [1 - _cosine(a, b) for a, b in zip(vecs, vecs[1:])]
+    mean = sum(dists) / len(dists)
+    std = math.sqrt(sum((d - mean) ** 2 for d in dists) / len(dists))
+    cut = mean + threshold_std * std
+
+    chunks, cur, used = [], [], 0
+    for i, sent in enumerate(sentences):
+        n = len(enc.encode(sent))
+        if cur and (used + n > chunk_size or dists[i - 1] > cut):
+            chunks.append(" ".join(cur))
+            cur, used = [], 0
+        cur.append(sent)
+        used += n
+    if cur:
+        chunks.append(" ".join(cur))
+    return chunks
+
+_langchain_splitter = None
+
+def _langchain_chunks(text: str):
+    global _langchain_splitter
+    if _langchain_splitter is None:
+        from langchain_openai import OpenAIEmbeddings
+        from langchain_experimental.text_splitter import SemanticChunker
+        _langchain_splitter = SemanticChunker(
+            OpenAIEmbeddings(model="text-embedding-3-small"),
+            breakpoint_threshold_type="standard_deviation",  # options: "percentile", "standard_deviation"
+            breakpoint_threshold_amount=1.0,                # lower = more splits
+        )
+    return _langchain_splitter.split_text(text)
+
+def chunk_text(text: str, chunk_size: int = 500, mode: str = None, overlap: int = CHUNK_OVERLAP):
     """
-    Split text into semantic chunks using embeddings.
+    Split text into chunks.
     :param text: Input text
-    :param chunk_size: Approximate target size in tokens
+    :param chunk_size: Maximum size in tokenizer tokens (structural and semantic modes)
+    :param mode: structural (local, no embeddings) | semantic (cached sentence
+                 embeddings) | langchain (original SemanticChunker); default CHUNKER_MODE
     """
-    # Use OpenAI embeddings (requires OPENAI_API_KEY in .env)
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    mode = mode or CHUNKER_MODE
+    if mode == "structural":
+        return list(iter_chunks([text], chunk_size, overlap))
+    if mode == "semantic":
+        return semantic_chunks(text, chunk_size)
+    if mode == "langchain":
+        return _langchain_chunks(text)
+    raise ValueError(f"Unknown chunker mode: {mode}")
 
-    # Initialize SemanticChunker
-    splitter = SemanticChunker(
-        embeddings,
-        breakpoint_threshold_type="standard_deviation",  # options: "percentile", "standard_deviation"
-        breakpoint_threshold_amount=1.0,                # lower = more splits
-    )
-
-    chunks = splitter.split_text(text)
-    return chunks
+def chunk_pages(pages, chunk_size: int = 500, mode: str = None, overlap: int = CHUNK_OVERLAP):
+    """chunk_text over an iterable of page texts; structural mode streams."""
+    mode = mode or CHUNKER_MODE
+    if mode == "structural":
+        return iter_chunks(pages, chunk_size, overlap)
+    return chunk_text("\n".join(pages), chunk_size, mode, overlap)
@@ -1,7 +1,21 @@
 import re
 
+_SPACES = re.compile(r"[ \t\f\v\r\xa0]+")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_LINE_EDGES = re.compile(r" ?\n ?")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
 def clean_text(text: str) -> str:
     # Collapse multiple newlines and spaces
     text = re.sub(r"\s+", " ", text)
     # Strip leading/trailing spaces
     return text.strip()
+
+def clean_page(text: str) -> str:
+    """Per-page cleanup that keeps line structure for the chunker: drop NULs,
+    re-join words hyphenated across lines, collapse spaces and blank-line runs."""
+    text = text.replace("\x00", "")
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    text = _SPACES.sub(" ", text)
+    text = _LINE_EDGES.sub("\n", text)
+    return _BLANK_RUNS.sub("\n\n", text).strip()
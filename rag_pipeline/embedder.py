@@ -1,32 +1,212 @@
-import os
-from openai import OpenAI
+import os, re, time, random, hashlib, sqlite3, threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 import tiktoken
 from dotenv import load_dotenv
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def embed_chunks(chunks, model="text-embedding-3-small", max_tokens=7500):
-    enc = tiktoken.encoding_for_model(model)
-    embeddings = []
-    safe_chunks = []
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "250000"))   # API cap is 300k tokens/request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))          # API cap is 2048 inputs/request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "5"))
+EMBED_CACHE = os.getenv("EMBED_CACHE", ".embeddings_cache.db")          # "" disables the cache
+
+# ---------- tokenizers ----------
+
+class WordTokenizer:
+    """Offline stand-in for tiktoken: words and punctuation as tokens."""
+    _re = re.compile(r"\w+|[^\w\s]+|\s+")
+
+    def encode(self, text):
+        return self._re.findall(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+def get_tokenizer(model="text-embedding-3-small"):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:            # BPE files not cached and no network
+        print(f"⚠️ tiktoken unavailable for {model} ({type(e).__name__}); counting words instead")
+        return WordTokenizer()
+
+# ---------- providers ----------
+
+class OpenAIEmbeddingProvider:
+    def __init__(self, model="text-embedding-3-small"):
+        self.model = model
+        self._client = None
+
+    def embed(self, texts):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        resp = self._client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+class HashEmbeddingProvider:
+    """Deterministic local embeddings (feature hashing of words), for tests and
+    benchmarks: same text -> same vector, shared words -> higher cosine."""
+
+    def __init__(self, dim=1536, model="hash"):
+        self.dim = dim
+        self.model = f"{model}-{dim}"
+
+    def embed(self, texts):
+        out = []
+        for text in texts:
+            vec = [0.0] * self.dim
+            for word in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+                vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+            norm = sum(v * v for v in vec) ** 0.5 or 1.0
+            out.append([v / norm for v in vec])
+        return out
+
+def get_provider(name=None, model="text-embedding-3-small"):
+    name = (name or os.getenv("EMBEDDINGS_PROVIDER", "openai")).lower()
+    if name == "hash":
+        return HashEmbeddingProvider()
+    return OpenAIEmbeddingProvider(model)
+
+# ---------- cache ----------
+
+class EmbeddingCache:
+    """On-disk embeddings keyed by sha256(model, text); float32 blobs in SQLite."""
+
+    def __init__(self, path=EMBED_CACHE):
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS embeddings(key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self.lock = threading.Lock()
 
-    for chunk in chunks:
-        tokens = enc.encode(chunk)
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
 
-        if len(tokens) > max_tokens:
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self.con.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part)
+                for k, blob in rows:
+                    found[k] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items):
+        with self.lock, self.con:
+            self.con.executemany("INSERT OR REPLACE INTO embeddings VALUES(?, ?)",
+                                 [(k, array("f", v).tobytes()) for k, v in items])
+
+# ---------- service ----------
+
+def _retryable(e):
+    """Timeouts, rate limits (429) and server errors (5xx); any other failure
+    (bad request, auth, input too long) fails the same way on every attempt."""
+    status = getattr(e, "status_code", None)          # openai.APIStatusError
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(e, TimeoutError) or "Timeout" in type(e).__name__    # openai.APITimeoutError, httpx
+
+class EmbeddingService:
+    """Embeds many chunks per request (bounded by token and input budgets), runs
+    requests concurrently with retry/backoff, and never re-embeds cached text."""
+
+    def __init__(self, provider=None, model="text-embedding-3-small", max_tokens=7500,
+                 batch_tokens=EMBED_BATCH_TOKENS, batch_size=EMBED_BATCH_SIZE,
+                 concurrency=EMBED_CONCURRENCY, retries=EMBED_RETRIES, cache_path=EMBED_CACHE,
+                 tokenizer=None):
+        self.provider = provider or get_provider(model=model)
+        self.model = getattr(self.provider, "model", model)
+        self.enc = tokenizer or get_tokenizer(model)
+        self.max_tokens = max_tokens
+        self.batch_tokens, self.batch_size = batch_tokens, batch_size
+        self.concurrency, self.retries = concurrency, retries
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.stats = {"requests": 0, "embedded": 0, "cache_hits": 0}
+        self._stats_lock = threading.Lock()
+
+    def split(self, chunks):
+        """(text, n_tokens) pieces, oversized chunks cut at max_tokens."""
+        pieces = []
+        for chunk in chunks:
+            tokens = self.enc.encode(chunk)
+            if len(tokens) <= self.max_tokens:
+                pieces.append((chunk, len(tokens)))
+                continue
             print(f"⚠️ Chunk too big ({len(tokens)} tokens) → splitting...")
-            start = 0
-            while start < len(tokens):
-                sub_tokens = tokens[start:start + max_tokens]
-                sub_text = enc.decode(sub_tokens)
-                resp = client.embeddings.create(model=model, input=sub_text)
-                embeddings.append(resp.data[0].embedding)
-                safe_chunks.append(sub_text)
-                start += max_tokens
-        else:
-            resp = client.embeddings.create(model=model, input=chunk)
-            embeddings.append(resp.data[0].embedding)
-            safe_chunks.append(chunk)
-
-    return embeddings, safe_chunks
+            for start in range(0, len(tokens), self.max_tokens):
+                sub = tokens[start:start + self.max_tokens]
+                pieces.append((self.enc.decode(sub), len(sub)))
+        return pieces
+
+    def _batches(self, pieces):
+        batch, used = [], 0
+        for text, n in pieces:
+            if batch and (used + n > self.batch_tokens or len(batch) >= self.batch_size):
+                yield batch
+                batch, used = [], 0
+            batch.append(text)
+            used += n
+        if batch:
+            yield batch
+
+    def _embed_batch(self, texts):
+        for attempt in range(self.retries + 1):
+            try:
+                vecs = self.provider.embed(texts)
+                with self._stats_lock:
+                    self.stats["requests"] += 1
+                return vecs
+            except Exception as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+                print(f"⚠️ Embedding request failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_texts(self, texts):
+        """Embeddings for texts (each already within max_tokens), cache first."""
+        keys = [EmbeddingCache.key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(set(keys))) if self.cache else {}
+        with self._stats_lock:
+            self.stats["cache_hits"] += sum(1 for k in keys if k in found)
+
+        missing, seen = [], set()
+        for text, key in zip(texts, keys):
+            if key not in found and key not in seen:
+                seen.add(key)
+                missing.append((text, len(self.enc.encode(text))))
+        if missing:
+            batches = list(self._batches(missing))
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+            fresh = []
+            for batch, vecs in zip(batches, results):
+                for text, vec in zip(batch, vecs):
+                    fresh.append((EmbeddingCache.key(self.model, text), vec))
+            found.update(fresh)
+            with self._stats_lock:
+                self.stats["embedded"] += len(fresh)
+            if self.cache:
+                self.cache.put_many(fresh)
+        return [found[k] for k in keys]
+
+    def embed_chunks(self, chunks):
+        """Same contract as embed_chunks(): (embeddings, safe_chunks), aligned."""
+        safe_chunks = [text for text, _ in self.split(chunks)]
+        return self.embed_texts(safe_chunks), safe_chunks
+
+_services = {}
+
+def get_service(model="text-embedding-3-small", max_tokens=7500):
+    svc = _services.get((model, max_tokens))
+    if svc is None:
+        svc = _services[(model, max_tokens)] = EmbeddingService(model=model, max_tokens=max_tokens)
+    return svc
+
+def embed_chunks(chunks, model="text-embedding-3-small", max_tokens=7500):
+    return get_service(model, max_tokens).embed_chunks(chunks)
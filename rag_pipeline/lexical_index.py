@@ -0,0 +1,149 @@
+import os, re, json, math
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Lower-cased alphanumeric runs: ECONNREFUSED, oomkilled, nullpointerexception, 500."""
+    return _TOKEN.findall(text.lower())
+
+class LexicalIndex:
+    """BM25 over the same chunks as the vector store, for exact log tokens
+    (ECONNREFUSED, OOMKilled, ...) that embeddings match poorly.
+
+    Built by pipeline.build_rag_index. Files under `path`: postings.u32 (doc
+    rows, grouped by term), tfs.u16 (term frequency per posting), doclen.u32,
+    meta.json (ids, chunk text + metadata, and term -> [offset, df]). The
+    postings are memory-mapped on first search; a query touches only the
+    postings of its own terms.
+    """
+
+    def __init__(self, path=None, k1=1.2, b=0.75):
+        self.path = path or os.getenv("LEXICAL_INDEX_PATH", "lexical_index")
+        self.k1, self.b = k1, b
+        self._loaded = False
+        self._dirty = False
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self._file("meta.json"))
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        if self._loaded:
+            return
+        self.ids, self.meta, self.vocab = [], [], {}
+        self.postings = np.zeros(0, np.uint32)
+        self.tfs = np.zeros(0, np.uint16)
+        self.doclen = np.zeros(0, np.uint32)
+        if self.exists():
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.ids, self.meta, self.vocab = saved["ids"], saved["meta"], saved["vocab"]
+            if saved["vocab"]:
+                self.postings = np.memmap(self._file("postings.u32"), dtype=np.uint32, mode="r")
+                self.tfs = np.memmap(self._file("tfs.u16"), dtype=np.uint16, mode="r")
+            if self.ids:
+                self.doclen = np.memmap(self._file("doclen.u32"), dtype=np.uint32, mode="r")
+        self.row_of = {id_: i for i, id_ in enumerate(self.ids)}
+        self._norm = None
+        self._loaded = True
+
+    def save(self):
+        """Rebuild the postings from the current chunks and write them out."""
+        self._load()
+        if not self._dirty and self.exists():
+            return
+        terms = {}
+        doclen = np.zeros(len(self.ids), np.uint32)
+        for row, md in enumerate(self.meta):
+            toks = tokenize(md.get("text", ""))
+            doclen[row] = len(toks)
+            counts = {}
+            for t in toks:
+                counts[t] = counts.get(t, 0) + 1
+            for t, n in counts.items():
+                terms.setdefault(t, []).append((row, min(n, 65535)))
+        vocab, postings, tfs = {}, [], []
+        for t in sorted(terms):
+            vocab[t] = [len(postings), len(terms[t])]
+            for row, n in terms[t]:
+                postings.append(row)
+                tfs.append(n)
+        os.makedirs(self.path, exist_ok=True)
+        for name, arr in (("postings.u32", np.asarray(postings, np.uint32)),
+                          ("tfs.u16", np.asarray(tfs, np.uint16)), ("doclen.u32", doclen)):
+            arr.tofile(self._file(name + ".tmp"))
+            os.replace(self._file(name + ".tmp"), self._file(name))
+        with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "meta": self.meta, "vocab": vocab}, f)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+        print(f"✅ Lexical index {self.path}: {len(self.ids)} chunks, {len(vocab)} terms")
+        self._loaded = self._dirty = False
+        self._load()
+
+    # ---------- writes ----------
+
+    def has(self, ids):
+        self._load()
+        return all(i in self.row_of for i in ids)
+
+    def add(self, ids, chunks, metadata=None):
+        self._load()
+        metadata = metadata or [{} for _ in chunks]
+        for id_, chunk, md in zip(ids, chunks, metadata):
+            md = {**md, "text": chunk}
+            row = self.row_of.get(id_)
+            if row is None:
+                self.row_of[id_] = len(self.ids)
+                self.ids.append(id_)
+                self.meta.append(md)
+            else:
+                self.meta[row] = md
+            self._dirty = True
+
+    def remove(self, ids):
+        self._load()
+        drop = {self.row_of[i] for i in ids if i in self.row_of}
+        if not drop:
+            return
+        keep = [r for r in range(len(self.ids)) if r not in drop]
+        self.ids = [self.ids[r] for r in keep]
+        self.meta = [self.meta[r] for r in keep]
+        self.row_of = {id_: i for i, id_ in enumerate(self.ids)}
+        self._dirty = True
+
+    # ---------- reads ----------
+
+    def search(self, query, top_k=5):
+        """[{id, score, metadata}] by BM25, best first; only chunks sharing a term."""
+        self._load()
+        n = len(self.ids)
+        if not n or self._dirty:
+            return []
+        if self._norm is None:     # per-chunk length normalisation, fixed until the next build
+            dl = np.asarray(self.doclen, np.float32)
+            self._norm = self.k1 * (1 - self.b + self.b * dl / max(float(dl.mean()), 1.0))
+        scores = np.zeros(n, np.float32)
+        for t in set(tokenize(query)):
+            entry = self.vocab.get(t)
+            if entry is None:
+                continue
+            start, df = entry
+            rows = self.postings[start:start + df]
+            tf = self.tfs[start:start + df].astype(np.float32)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + self._norm[rows])   # rows are unique per term
+        hit = np.flatnonzero(scores)
+        if not len(hit):
+            return []
+        k = min(top_k, len(hit))
+        best = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [{"id": self.ids[r], "score": float(scores[r]), "metadata": self.meta[r]} for r in best]
@@ -1,10 +1,169 @@
-import PyPDF2
+import os, re, json, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from dotenv import load_dotenv
+from rag_pipeline.clean_text import clean_page
+
+load_dotenv()
+
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(os.cpu_count() or 1)))
+LOADER_PARALLEL_PAGES = int(os.getenv("LOADER_PARALLEL_PAGES", "64"))   # smaller PDFs stay in-process
+LOADER_PAGE_BATCH = int(os.getenv("LOADER_PAGE_BATCH", "16"))           # pages per worker task
+SECTION_MAX_CHARS = 1 << 16        # heading-less text is cut at the next blank line past this
+
+# ---------- PDF ----------
+
+def _pdf_reader(f):
+    import PyPDF2
+    return PyPDF2.PdfReader(f)
+
+def _extract_range(pdf_path, start, end):
+    """Worker: extract pages [start, end) of a PDF (each process opens its own reader)."""
+    with open(pdf_path, "rb") as f:
+        reader = _pdf_reader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_pdf_pages(pdf_path: str, workers: int = None):
+    """Yield the raw text of each page in order. Large PDFs are extracted by a
+    process pool in page batches, with at most 2 batches per worker in flight,
+    so memory stays bounded by the window rather than the document."""
+    workers = LOADER_WORKERS if workers is None else workers
+    with open(pdf_path, "rb") as f:
+        reader = _pdf_reader(f)
+        n = len(reader.pages)
+        if workers <= 1 or n < LOADER_PARALLEL_PAGES:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+    ranges = [(s, min(s + LOADER_PAGE_BATCH, n)) for s in range(0, n, LOADER_PAGE_BATCH)]
+    # spawn, not fork: the pipeline calls this from its build threads, and a forked
+    # child inherits whatever locks the other threads held at that moment
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_range, pdf_path, start, end))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
 def load_pdf(pdf_path: str) -> str:
     """Read a PDF and return extracted text."""
-    text = ""
-    with open(pdf_path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-    return text
+    return "".join(page + "\n" for page in iter_pdf_pages(pdf_path))
+
+# ---------- Markdown / text ----------
+
+def iter_markdown_sections(path: str):
+    """Yield one section per heading (fenced code never splits a section)."""
+    section, size, in_fence = [], 0, False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            elif not in_fence and section and (
+                    line.startswith("#") or (size > SECTION_MAX_CHARS and not line.strip())):
+                yield "".join(section)
+                section, size = [], 0
+            section.append(line)
+            size += len(line)
+    if section:
+        yield "".join(section)
+
+# ---------- HTML ----------
+
+class _HTMLSections(HTMLParser):
+    """Text of an HTML page, cut into sections at h1-h6. Headings come out as
+    Markdown headings, list items as "- " steps, <pre> as fenced blocks."""
+    BLOCK = {"p", "div", "br", "tr", "table", "ul", "ol", "section", "article", "blockquote"}
+    SKIP = {"script", "style", "head", "nav", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections, self.buf, self.skip, self.pre = deque(), [], 0, 0
+
+    def _cut(self):
+        text = "".join(self.buf)
+        if text.strip():
+            self.sections.append(text)
+        self.buf = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip += 1
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._cut()
+            self.buf.append("#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.buf.append("\n- ")
+        elif tag == "pre":
+            self.pre += 1
+            self.buf.append("\n```\n")
+        elif tag in self.BLOCK:
+            self.buf.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skip = max(0, self.skip - 1)
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self.buf.append("\n\n")
+        elif tag == "pre":
+            self.pre = max(0, self.pre - 1)
+            self.buf.append("\n```\n")
+        elif tag in self.BLOCK:
+            self.buf.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.buf.append(data if self.pre else re.sub(r"\s+", " ", data))
+
+def iter_html_sections(path: str, block_size: int = 1 << 16):
+    parser = _HTMLSections()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            parser.feed(block)
+            while parser.sections:
+                yield parser.sections.popleft()
+    parser.close()
+    parser._cut()
+    yield from parser.sections
+
+# ---------- JSONL playbooks ----------
+
+def format_playbook(ex) -> str:
+    """One app/rag/data/examples.jsonl entry as retrievable text."""
+    return (
+        f"Error pattern: {ex.get('pattern', '')}. "
+        f"Root cause: {ex.get('root_cause', '')}. "
+        f"Mitigation: {'; '.join(ex.get('mitigation', []))}."
+    )
+
+def iter_jsonl_playbooks(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield format_playbook(json.loads(line))
+
+# ---------- one interface ----------
+
+READERS = {
+    ".pdf": iter_pdf_pages,
+    ".md": iter_markdown_sections,
+    ".markdown": iter_markdown_sections,
+    ".txt": iter_markdown_sections,
+    ".html": iter_html_sections,
+    ".htm": iter_html_sections,
+    ".jsonl": iter_jsonl_playbooks,
+}
+
+def iter_pages(path: str, clean: bool = True):
+    """Lazily yield the pages (PDF) or sections (Markdown/HTML) or playbook
+    entries (JSONL) of a document, each cleaned on its own."""
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Unsupported document type: {path}")
+    for page in reader(path):
+        page = clean_page(page) if clean else page
+        if page:
+            yield page
@@ -0,0 +1,248 @@
+import os, json, threading
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+from rag_pipeline.vector_store import VectorStore
+
+load_dotenv()
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: L2-normalised float32 rows in a memory-mapped
+    matrix, cosine top-k by one matmul + argpartition.
+
+    mode="exact" scans every row; mode="ivf" clusters rows with k-means into
+    nlist partitions when writes are flushed and scans only the nprobe closest
+    ones. Files under `path`: vectors.f32 (n x dim), meta.json (ids + metadata),
+    ivf.npz (centroids + row assignments, ivf mode only). Nothing is read
+    until the first query.
+
+    Writes are applied at once, or once at the end of a `with store.batch():`
+    block (what pipeline.build_rag_index does): new rows are appended to
+    vectors.f32, only deletes and updates rewrite it, and IVF is retrained once
+    per flush. Searches see the last flushed state and are safe from several
+    threads.
+    """
+
+    def __init__(self, path=None, dim=1536, mode=None, nlist=None, nprobe=None):
+        self.path = path or os.getenv("LOCAL_VECTOR_PATH", "vector_store")
+        self.dim = dim
+        self.mode = mode or os.getenv("LOCAL_VECTOR_MODE", "exact")      # exact | ivf
+        self.nlist = nlist                                               # default: ~sqrt(n)
+        self.nprobe = nprobe or int(os.getenv("LOCAL_VECTOR_NPROBE", "8"))
+        self._loaded = False
+        self._lock = threading.RLock()   # guards loading, flushing and the lazy IVF lists
+        self._depth = 0                  # open batch() blocks
+
+    # ---------- persistence ----------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self.ids, self.meta, self.matrix = [], [], np.zeros((0, self.dim), np.float32)
+            self.centroids = self.assign = self.lists = None
+            if os.path.exists(self._file("meta.json")):
+                with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                self.ids, self.meta, self.dim = saved["ids"], saved["meta"], saved["dim"]
+                self.matrix = self._map(len(self.ids))
+                if os.path.exists(self._file("ivf.npz")):
+                    ivf = np.load(self._file("ivf.npz"))
+                    self.centroids, self.assign = ivf["centroids"], ivf["assign"]
+            self.row_of = {id_: i for i, id_ in enumerate(self.ids)}
+            self._masks = {}      # filter -> row mask, valid until the next flush
+            self._pending = {}    # id -> (vector, metadata) not yet flushed
+            self._drop = set()    # ids to delete at the next flush
+            self._loaded = True
+
+    def _map(self, n):
+        if not n:
+            return np.zeros((0, self.dim), np.float32)
+        return np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def _nlist(self, n=None):
+        return self.nlist or max(1, int(np.sqrt(len(self.ids) if n is None else n)))
+
+    @contextmanager
+    def batch(self):
+        """Defer writes until the block ends, then flush them once."""
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if not self._depth:
+                    self.flush()
+
+    def flush(self):
+        """Write pending upserts/deletes: append-only unless rows change or go."""
+        with self._lock:
+            self._load()
+            if not self._pending and not self._drop:
+                return
+            n = len(self.ids)
+            added = [i for i in self._pending if i not in self.row_of]
+            changed = [i for i in self._pending if i in self.row_of]
+            os.makedirs(self.path, exist_ok=True)
+            if self._drop or changed:
+                keep = [r for r, id_ in enumerate(self.ids) if id_ not in self._drop]
+                matrix = np.array(self.matrix, dtype=np.float32)[keep]
+                ids = [self.ids[r] for r in keep]
+                meta = [self.meta[r] for r in keep]
+                row_of = {id_: i for i, id_ in enumerate(ids)}
+                for id_ in changed:
+                    if id_ in row_of:
+                        matrix[row_of[id_]], meta[row_of[id_]] = self._pending[id_]
+                if added:
+                    matrix = np.vstack([matrix, np.stack([self._pending[i][0] for i in added])])
+                tmp = self._file("vectors.f32.tmp")
+                matrix.astype(np.float32).tofile(tmp)
+                os.replace(tmp, self._file("vectors.f32"))
+            else:
+                ids, meta = list(self.ids), list(self.meta)
+                with open(self._file("vectors.f32"), "ab") as f:
+                    f.truncate(n * self.dim * 4)     # drop rows of an append cut short before meta.json
+                    f.write(np.stack([self._pending[i][0] for i in added]).astype(np.float32).tobytes())
+            ids += added
+            meta += [self._pending[i][1] for i in added]
+            with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "ids": ids, "meta": meta}, f)
+            os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+            centroids = assign = None
+            matrix = self._map(len(ids))
+            if self.mode == "ivf" and ids:
+                centroids, assign = kmeans(np.asarray(matrix), self._nlist(len(ids)))
+                np.savez(self._file("ivf.npz"), centroids=centroids, assign=assign)
+            elif os.path.exists(self._file("ivf.npz")):
+                os.remove(self._file("ivf.npz"))
+            # publish the new state in one go; searches hold on to the previous one
+            self.ids, self.meta, self.matrix = ids, meta, matrix
+            self.row_of = {id_: i for i, id_ in enumerate(ids)}
+            self.centroids, self.assign, self.lists = centroids, assign, None
+            self._masks, self._pending, self._drop = {}, {}, set()
+
+    # ---------- writes ----------
+
+    def upsert(self, embeddings, chunks, ids=None, metadata=None):
+        vecs = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        ids = ids or [f"chunk-{i}" for i in range(len(chunks))]
+        metadata = metadata or [{} for _ in chunks]
+        with self._lock:
+            self._load()
+            for vec, chunk, id_, md in zip(vecs, chunks, ids, metadata):
+                self._pending[id_] = (vec, {**md, "text": chunk})
+                self._drop.discard(id_)
+            total = len(self.ids) + sum(i not in self.row_of for i in self._pending)
+            if not self._depth:
+                self.flush()
+        print(f"✅ Upserted {len(vecs)} chunks into local store {self.path} ({total} total)")
+
+    def delete(self, ids):
+        with self._lock:
+            self._load()
+            for id_ in ids:
+                self._pending.pop(id_, None)
+                if id_ in self.row_of:
+                    self._drop.add(id_)
+            if not self._depth:
+                self.flush()
+
+    # ---------- reads ----------
+
+    def search(self, query_embeddings, top_k=5, filter=None):
+        """Batch search: one list of {id, score, metadata} per query row."""
+        with self._lock:
+            self._load()
+            ids, meta, matrix, centroids, masks = self.ids, self.meta, self.matrix, self.centroids, self._masks
+            if self.mode == "ivf" and centroids is not None and self.lists is None:
+                self.lists = [np.flatnonzero(self.assign == c) for c in range(len(centroids))]
+            lists = self.lists
+        q = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim))
+        if not ids:
+            return [[] for _ in q]
+        allowed = None
+        if filter:
+            key = json.dumps(filter, sort_keys=True)
+            if key not in masks:
+                masks[key] = _filter_rows(meta, filter)
+            allowed = masks[key]
+
+        if self.mode == "ivf" and centroids is not None:
+            probes = _top_k(q @ centroids.T, min(self.nprobe, len(centroids)))
+            out = []
+            for qi, cells in enumerate(probes):
+                rows = np.sort(np.concatenate([lists[c] for c in cells]))
+                if allowed is not None:
+                    rows = rows[allowed[rows]]
+                out.append(_hits(ids, meta, q[qi:qi + 1] @ np.asarray(matrix[rows]).T, rows, top_k)[0])
+            return out
+
+        rows = np.arange(len(ids)) if allowed is None else np.flatnonzero(allowed)
+        sub = matrix if allowed is None else matrix[rows]
+        return _hits(ids, meta, q @ np.asarray(sub).T, rows, top_k)
+
+    def query(self, query_embedding, top_k=5, filter=None):
+        return [h["metadata"]["text"] for h in self.search([query_embedding], top_k, filter)[0]]
+
+    def query_batch(self, query_embeddings, top_k=5, filter=None):
+        return [[h["metadata"]["text"] for h in hits]
+                for hits in self.search(query_embeddings, top_k, filter)]
+
+def _hits(ids, meta, scores, rows, top_k):
+    out = []
+    for srow, idx in zip(scores, _top_k(scores, min(top_k, scores.shape[1]))):
+        out.append([{"id": ids[rows[i]], "score": float(srow[i]), "metadata": meta[rows[i]]} for i in idx])
+    return out
+
+def _normalize(m):
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+def _top_k(scores, k):
+    """Indices of the k best scores per row, best first."""
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=int)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+def _filter_rows(meta, filter):
+    """Boolean row mask for a Pinecone-style filter ({"k": v}, {"k": {"$eq"|"$in"|"$ne": ...}})."""
+    if not filter:
+        return None
+
+    def ok(md):
+        for key, cond in filter.items():
+            val = md.get(key)
+            if isinstance(cond, dict):
+                if "$eq" in cond and val != cond["$eq"]:
+                    return False
+                if "$ne" in cond and val == cond["$ne"]:
+                    return False
+                if "$in" in cond and val not in cond["$in"]:
+                    return False
+            elif val != cond:
+                return False
+        return True
+
+    return np.fromiter((ok(md) for md in meta), dtype=bool, count=len(meta))
+
+def kmeans(x, k, iters=10, seed=0):
+    """Spherical k-means on normalised rows; returns (centroids, assignment per row)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(x @ centroids.T, axis=1)
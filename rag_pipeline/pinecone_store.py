@@ -1,10 +1,11 @@
 import os
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
+from rag_pipeline.vector_store import VectorStore
 
 load_dotenv()
 
-class PineconeStore:
+class PineconeStore(VectorStore):
     def __init__(self, index_name=None):
         api_key = os.getenv("PINECONE_API_KEY")
         env = os.getenv("PINECONE_ENV", "us-east-1")
@@ -24,14 +25,23 @@ class PineconeStore:
 
         self.index = self.pc.Index(self.index_name)
 
-    def upsert(self, embeddings, chunks):
+    def upsert(self, embeddings, chunks, ids=None, metadata=None, batch_size=100):
+        ids = ids or [f"chunk-{i}" for i in range(len(chunks))]
+        metadata = metadata or [{} for _ in chunks]
         vectors = [
-            (f"chunk-{i}", emb, {"text": chunk})
-            for i, (emb, chunk) in enumerate(zip(embeddings, chunks))
+            (id_, emb, {**md, "text": chunk})
+            for id_, emb, chunk, md in zip(ids, embeddings, chunks, metadata)
         ]
-        self.index.upsert(vectors=vectors)
+        for start in range(0, len(vectors), batch_size):
+            self.index.upsert(vectors=vectors[start:start + batch_size])
         print(f"✅ Upserted {len(vectors)} chunks into Pinecone index {self.index_name}")
 
-    def query(self, query_embedding, top_k=5):
-        results = self.index.query(vector=query_embedding, top_k=top_k, include_metadata=True)
+    def delete(self, ids, batch_size=1000):
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[start:start + batch_size])
+        print(f"🗑️ Deleted {len(ids)} chunks from Pinecone index {self.index_name}")
+
+    def query(self, query_embedding, top_k=5, filter=None):
+        results = self.index.query(vector=query_embedding, top_k=top_k, include_metadata=True, filter=filter)
         return [match["metadata"]["text"] for match in results["matches"]]
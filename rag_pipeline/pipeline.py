@@ -1,17 +1,134 @@
-from loader import load_pdf
-from chunker import chunk_text
-from embedder import embed_chunks
-from pinecone_store import PineconeStore
-from clean_text import clean_text
-
-def build_rag_index(pdf_path: str):
-    text = load_pdf(pdf_path)
-    text = clean_text(text) 
-    chunks = chunk_text(text, chunk_size=500)
-    embeddings, chunks = embed_chunks(chunks)   # aligned lists
-
-    store = PineconeStore()
-    store.upsert(embeddings, chunks)
-
-if __name__ == "__main__":
-    build_rag_index("RAG Document.pdf")
+import os, json, hashlib, itertools
+from concurrent.futures import ThreadPoolExecutor
+from rag_pipeline.loader import iter_pages
+from rag_pipeline.chunker import chunk_pages
+from rag_pipeline.embedder import get_service
+from rag_pipeline.vector_store import get_store
+from rag_pipeline.lexical_index import LexicalIndex
+from rag_pipeline.clean_text import clean_text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))      # repo root: documents and the manifest resolve against it
+RAG_MANIFEST = os.path.join(ROOT, os.getenv("RAG_MANIFEST", "rag_manifest.json"))   # an absolute RAG_MANIFEST is kept as is
+UPSERT_BATCH = int(os.getenv("RAG_UPSERT_BATCH", "100"))
+BUILD_WORKERS = int(os.getenv("RAG_BUILD_WORKERS", "4"))
+
+def doc_key(path: str) -> str:
+    """Repo-relative, '/'-separated name of a document (absolute outside the repo):
+    chunk ids and manifest entries don't depend on the directory the build runs from."""
+    full = os.path.abspath(path)
+    rel = os.path.relpath(full, ROOT)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return full
+    return rel.replace(os.sep, "/")
+
+def chunk_id(source: str, text: str) -> str:
+    """Content-addressed chunk id: stable however the document around it changes."""
+    return hashlib.sha1(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_examples(path: str):
+    """app/rag/data/examples.jsonl: one error -> cause -> fix playbook entry per line."""
+    return list(iter_pages(path))
+
+def chunk_document(path: str):
+    if path.endswith(".jsonl"):
+        return load_examples(path)
+    # pages stream through the chunker with their line structure; each chunk is flattened after
+    chunks = (clean_text(c) for c in chunk_pages(iter_pages(path), chunk_size=500))
+    return [c for c in chunks if c]
+
+def load_manifest(path: str = RAG_MANIFEST):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(manifest, path: str = RAG_MANIFEST):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _pieces(path: str, service):
+    """(ids, texts) of a document's chunks, oversized chunks pre-split."""
+    pieces = [text for text, _ in service.split(chunk_document(path))]
+    key = doc_key(path)
+    return [chunk_id(key, t) for t in pieces], pieces
+
+def _prepare(path: str, entry):
+    """Chunk + embed the new chunks of one document (None if the file is unchanged)."""
+    digest = file_digest(path)
+    if entry and entry.get("sha1") == digest:
+        return None
+    service = get_service()
+    ids, pieces = _pieces(path, service)
+    known = set(entry["chunks"]) if entry else set()
+    new = {i: t for i, t in zip(ids, pieces) if i not in known}           # dedupes repeats too
+    return {
+        "sha1": digest,
+        "ids": list(dict.fromkeys(ids)),
+        "texts": list(dict(zip(ids, pieces)).values()),       # aligned with "ids"
+        "new_ids": list(new),
+        "chunks": list(new.values()),
+        "embeddings": service.embed_texts(list(new.values())) if new else [],
+        "removed": sorted(known - set(ids)),
+    }
+
+def build_rag_index(paths, store=None, prune: bool = False):
+    """Incrementally index documents: only new/changed chunks are embedded and
+    upserted, chunks that disappeared are deleted (prune=True also drops documents
+    missing from `paths`). Documents are read, chunked and embedded in parallel
+    and written as each one is ready, so only a few documents' embeddings are
+    held at a time (the local store still buffers its rows until the batch
+    flush). The BM25 index (lexical_index.py) gets the same chunks."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = {doc_key(p): p for p in paths}              # manifest key -> path as given
+    store = store or get_store()
+    lexical = LexicalIndex()
+    manifest = load_manifest()
+    stale = [k for k in manifest if k not in files] if prune else []
+    gone = {"sha1": None, "ids": [], "texts": [], "new_ids": [], "embeddings": [], "chunks": []}
+
+    done = []
+    # documents are written as their plans come in, and only their ids are kept after that
+    with ThreadPoolExecutor(max_workers=BUILD_WORKERS) as pool, \
+            store.batch():     # the local store writes (and retrains IVF) once, at the end
+        plans = zip(files, pool.map(lambda k: _prepare(files[k], manifest.get(k)), files))
+        for path, plan in itertools.chain(plans, ((k, {**gone, "removed": manifest[k]["chunks"]}) for k in stale)):
+            if plan is None:
+                if not lexical.has(manifest[path]["chunks"]):     # lexical index built after this document
+                    ids, pieces = _pieces(files[path], get_service())
+                    lexical.add(ids, pieces, [{"source": os.path.basename(path)}] * len(ids))
+                print(f"⏭️  {path}: unchanged")
+                continue
+            for start in range(0, len(plan["new_ids"]), UPSERT_BATCH):
+                end = start + UPSERT_BATCH
+                store.upsert(plan["embeddings"][start:end], plan["chunks"][start:end],
+                             ids=plan["new_ids"][start:end],
+                             metadata=[{"source": os.path.basename(path)}] * len(plan["new_ids"][start:end]))
+            lexical.add(plan["ids"], plan["texts"], [{"source": os.path.basename(path)}] * len(plan["ids"]))
+            if plan["removed"]:
+                store.delete(plan["removed"])
+                lexical.remove(plan["removed"])
+            done.append((path, plan["sha1"], plan["ids"], len(plan["new_ids"]), len(plan["removed"])))
+    # the manifest only records documents once their vectors are written
+    for path, sha1, ids, added, removed in done:
+        if sha1 is None:
+            manifest.pop(path, None)
+        else:
+            manifest[path] = {"sha1": sha1, "chunks": ids}
+        print(f"✅ {path}: +{added} chunks, -{removed} removed")
+    if done:
+        save_manifest(manifest)
+    lexical.save()
+    return manifest
+
+if __name__ == "__main__":      # python -m rag_pipeline.pipeline
+    build_rag_index([os.path.join(os.path.dirname(os.path.abspath(__file__)), "RAG Document.pdf")])
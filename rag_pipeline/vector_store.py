@@ -0,0 +1,42 @@
+import os, contextlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class VectorStore:
+    """Interface shared by the retrieval backends (PineconeStore, LocalVectorStore).
+
+    upsert(embeddings, chunks, ids=None, metadata=None) stores one vector per chunk;
+    ids default to positional "chunk-{i}" and the chunk text is kept as metadata["text"].
+    delete(ids) removes vectors by id.
+    query(query_embedding, top_k=5, filter=None) returns the top_k chunk texts.
+    """
+
+    def upsert(self, embeddings, chunks, ids=None, metadata=None):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, query_embedding, top_k=5, filter=None):
+        raise NotImplementedError
+
+    def query_batch(self, query_embeddings, top_k=5, filter=None):
+        return [self.query(q, top_k=top_k, filter=filter) for q in query_embeddings]
+
+    def batch(self):
+        """Group a run of upserts/deletes; stores that rewrite files apply them once
+        when the block ends (no-op for the others)."""
+        return contextlib.nullcontext(self)
+
+def get_store(backend=None, **kwargs):
+    """Build the store named by VECTOR_BACKEND: pinecone | local (numpy).
+    chroma and faiss select the in-process local store as well."""
+    backend = (backend or os.getenv("VECTOR_BACKEND", "local")).strip().lower()
+    if backend == "pinecone":
+        from rag_pipeline.pinecone_store import PineconeStore
+        return PineconeStore(**kwargs)
+    if backend in ("local", "numpy", "chroma", "faiss"):
+        from rag_pipeline.local_store import LocalVectorStore
+        return LocalVectorStore(**kwargs)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
@@ -0,0 +1,86 @@
+# scripts/bench_chunker.py
+# Throughput and retrieval hit@k of the chunker modes on a synthetic runbook
+# (structural / semantic / langchain SemanticChunker). Embeddings are the local
+# hash provider so the run is offline and repeatable.
+#   python scripts/bench_chunker.py [n_sections]
+import os, sys, time, random, tempfile, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("EMBED_CACHE", "")
+
+from rag_pipeline import chunker  # noqa: E402
+from rag_pipeline.embedder import EmbeddingService, HashEmbeddingProvider, WordTokenizer  # noqa: E402
+from rag_pipeline.local_store import LocalVectorStore  # noqa: E402
+
+SECTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+CHUNK_SIZE, TOP_K = 300, 3
+SERVICES = ["payments", "orders", "auth", "search", "billing", "inventory", "gateway", "notifier"]
+FILLER = ("Check the dashboards for the affected service before changing anything. "
+          "Confirm the alert is still firing and note the start time in the incident channel. "
+          "If customers are impacted, page the on-call lead and post a status update.")
+
+def runbook(n, seed=7):
+    """n playbook sections, each with one unique error code and its fix."""
+    rng = random.Random(seed)
+    parts, answers = [], []
+    for i in range(n):
+        svc = rng.choice(SERVICES)
+        code = f"E{1000 + i}"
+        fix = f"rotate the {svc} credential set number {i} and restart worker pool {i % 17}"
+        parts.append(f"## {svc.upper()} {code} playbook\n\n{FILLER}\n\n"
+                     f"1. Look for {code} in the {svc} logs.\n"
+                     f"2. To fix {code}, {fix}.\n"
+                     f"3. Verify {code} no longer appears.\n\n"
+                     f"```\n2024-01-01T00:00:00Z ERROR {svc} {code} request failed\n```\n")
+        answers.append((f"how do I fix {code} in {svc}", f"worker pool {i % 17}", code))
+    return "\n".join(parts), answers
+
+class HashEmbeddings:
+    """langchain Embeddings interface over the hash provider."""
+
+    def __init__(self, provider):
+        self.provider, self.calls = provider, 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return self.provider.embed(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def run(name, split, text, answers, provider, embedded):
+    t0 = time.perf_counter()
+    chunks = split(text)
+    secs = time.perf_counter() - t0
+    store = LocalVectorStore(path=tempfile.mkdtemp(prefix="bench_chunk_"), dim=provider.dim)
+    store.upsert(provider.embed(chunks), chunks)
+    hits = store.query_batch(provider.embed([q for q, _, _ in answers]), top_k=TOP_K)
+    found = sum(any(fix in c and code in c for c in got) for (_, fix, code), got in zip(answers, hits))
+    sizes = [len(chunker._enc().encode(c)) for c in chunks]
+    print(f"{name:<11} {len(text) / secs / 1e6:8.2f} MB/s {len(chunks):6d} chunks "
+          f"max {max(sizes):5d} tok  {embedded():7d} embeds  hit@{TOP_K} {found / len(answers):.2f}")
+
+if __name__ == "__main__":
+    text, answers = runbook(SECTIONS)
+    provider = HashEmbeddingProvider(dim=256)
+    chunker._tokenizer = WordTokenizer()
+    print(f"{SECTIONS} sections, {len(text) / 1e6:.2f} MB, chunk_size={CHUNK_SIZE}")
+
+    run("structural", lambda t: chunker.chunk_text(t, CHUNK_SIZE, mode="structural"),
+        text, answers, provider, lambda: 0)
+
+    service = EmbeddingService(provider=provider, cache_path="", tokenizer=WordTokenizer())
+    chunker.get_service = lambda: service
+    run("semantic", lambda t: chunker.chunk_text(t, CHUNK_SIZE, mode="semantic"),
+        text, answers, provider, lambda: service.stats["embedded"])
+
+    try:
+        from langchain_experimental.text_splitter import SemanticChunker
+    except ImportError:
+        print("langchain   skipped (langchain_experimental not installed)")
+    else:
+        emb = HashEmbeddings(provider)
+        splitter = SemanticChunker(emb, breakpoint_threshold_type="standard_deviation",
+                                   breakpoint_threshold_amount=1.0)
+        run("langchain", splitter.split_text, text, answers, provider, lambda: emb.calls)
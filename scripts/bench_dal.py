@@ -0,0 +1,49 @@
+# scripts/bench_dal.py
+# Microbenchmark: record_step throughput with the old connect-per-call DAL vs the
+# pooled WAL connection layer + buffered step journal (STEP_FLUSH_MS=0 to
+# measure the connection layer alone).   python scripts/bench_dal.py [n_steps]
+import os, sys, json, time, sqlite3, tempfile, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+TMP = tempfile.mkdtemp(prefix="bench_dal_")
+os.environ["DB_FILE"] = os.path.join(TMP, "after.db")
+os.environ.pop("DB_URL", None)
+
+from app.db import dal  # noqa: E402  (package import runs init_db on DB_FILE)
+from app.db.migrate import MIGRATIONS_DIR  # noqa: E402
+
+def legacy_record_step(db_file, incident_id, agent, phase, message, data=None, status=None):
+    # what dal.record_step did before: fresh connection + commit per call
+    con = sqlite3.connect(db_file)
+    con.execute("PRAGMA foreign_keys = ON")
+    with con:
+        con.execute(
+            """INSERT INTO agent_steps(incident_id, agent, phase, message, data_json, ts, status)
+               VALUES(?,?,?,?,?,?,?)""",
+            (incident_id, agent, phase, message, json.dumps(data or {}), dal._now_iso(), status),
+        )
+    con.close()
+
+def run(label, fn, done=None):
+    t0 = time.perf_counter()
+    for i in range(N):
+        fn(1, "collector", "retrieve", f"step {i}", {"i": i}, "OK")
+    if done:
+        done()
+    dt = time.perf_counter() - t0
+    print(f"{label:<8} {N} steps in {dt:.3f}s  ->  {N / dt:,.0f} steps/sec")
+    return N / dt
+
+if __name__ == "__main__":
+    before_db = os.path.join(TMP, "before.db")
+    con = sqlite3.connect(before_db)
+    con.executescript((MIGRATIONS_DIR / "0001_initial.sql").read_text(encoding="utf-8"))
+    con.close()
+
+    before = run("before", lambda *a: legacy_record_step(before_db, *a))
+    after = run("after", dal.record_step, dal.flush_steps)
+    assert len(dal.list_steps(1)) == N
+    print(f"speedup  {after / before:.1f}x   (db files in {TMP})")
@@ -0,0 +1,237 @@
+# scripts/bench_e2e.py
+# End-to-end benchmark: a synthetic log tree and alert storm (scripts/loadgen.py)
+# driven through the real runner (python -m app.runner) against a throwaway DB,
+# with offline stand-ins for the external services (hash embeddings, local
+# vector store, RCA_LLM=off). Step timings come from the step-stream datagrams
+# record_step sends (app/db/notify.py), timestamped here on arrival, so stage
+# latencies have millisecond resolution. Writes a JSON report to keep per
+# commit; --compare prints the change against an earlier one.
+#   python scripts/bench_e2e.py [--count 200] [--rate 20] [--dup 0.5] [--log-mb 50]
+#                               [--workers 4] [--mode thread] [--out bench_e2e.json] [--compare old.json]
+import os, sys, json, time, socket, platform, argparse, tempfile, threading, subprocess, pathlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+TERMINAL = {("supervisor", "done"), ("correlator", "done"), ("supervisor", "error")}
+STAGES = [   # name, from (agent, phase), to (agent, phase)
+    ("collect", ("collector", "start"), ("analyst", "start")),
+    ("analyze", ("analyst", "start"), ("supervisor", "summarize")),
+    ("report", ("supervisor", "summarize"), ("supervisor", "done")),
+]
+
+def free_port(kind=socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_env(tmp: str, args) -> Dict[str, str]:
+    """Environment for this process and the runner: everything local and throwaway."""
+    return {
+        "DB_FILE": os.path.join(tmp, "bench.db"), "DB_URL": "",
+        "LOGS_MODE": "local", "LOGS_LOCAL_ROOT": os.path.join(tmp, "logs"), "LOG_INDEX": "off",
+        "EMBEDDINGS_PROVIDER": "hash", "EMBED_CACHE": "", "OPENAI_API_KEY": "", "RCA_LLM": "off",
+        "VECTOR_BACKEND": "local", "LOCAL_VECTOR_PATH": os.path.join(tmp, "vectors"),
+        "RAG_MANIFEST": os.path.join(tmp, "rag_manifest.json"),
+        "INTAKE_NOTIFY_ADDR": f"127.0.0.1:{free_port(socket.SOCK_DGRAM)}",
+        "INTAKE_STATE_FILE": os.path.join(tmp, "intake_state.json"), "INTAKE_MAX_WAIT": "1",
+        "STEP_STREAM_ADDR": f"127.0.0.1:{free_port(socket.SOCK_DGRAM)}", "STEP_STREAM_HTTP": "",
+        "RUNNER_WORKERS": str(args.workers), "RUNNER_MODE": args.mode,
+        "PYTHONPATH": str(ROOT),
+    }
+
+# ---------- step events ----------
+
+class StepRecorder:
+    """Receives record_step datagrams (in place of the stream hub) and stamps them on arrival."""
+
+    def __init__(self, addr: str):
+        host, port = addr.rsplit(":", 1)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        self.sock.bind((host, int(port)))
+        self.events: Dict[int, List[Tuple[float, str, str]]] = defaultdict(list)
+        self.terminal: Dict[int, float] = {}
+        self.received = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            data = self.sock.recv(65536)
+            t = time.time()
+            try:
+                e = json.loads(data)
+            except ValueError:
+                continue
+            iid = int(e["incident_id"])
+            self.events[iid].append((t, e["agent"], e["phase"]))
+            if (e["agent"], e["phase"]) in TERMINAL:
+                self.terminal.setdefault(iid, t)
+            self.received += 1
+
+# ---------- stats ----------
+
+def pct(values: List[float]) -> Dict[str, Any]:
+    """p50/p95/p99/mean/max in ms (nearest rank)."""
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    rank = lambda p: v[min(len(v) - 1, max(0, int(round(p / 100 * len(v))) - 1))]
+    return {"n": len(v), "p50": round(rank(50) * 1000, 1), "p95": round(rank(95) * 1000, 1),
+            "p99": round(rank(99) * 1000, 1), "mean": round(sum(v) / len(v) * 1000, 1),
+            "max": round(v[-1] * 1000, 1)}
+
+def summarize(fired: List[Tuple[int, float]], rec: StepRecorder, db: Dict[str, Any]) -> Dict[str, Any]:
+    ttr, ttg, queue = [], [], []
+    stages: Dict[str, List[float]] = defaultdict(list)
+    missing = 0
+    for iid, t_in in fired:
+        first: Dict[Tuple[str, str], float] = {}
+        for t, agent, phase in rec.events.get(iid, []):
+            if phase != "group":                     # parent-side note about a duplicate, not its own work
+                first.setdefault((agent, phase), t)
+        if not first:
+            missing += 1
+            continue
+        queue.append(min(first.values()) - t_in)
+        if ("supervisor", "done") in first:
+            ttr.append(first[("supervisor", "done")] - t_in)
+        elif ("correlator", "done") in first:
+            ttg.append(first[("correlator", "done")] - t_in)
+        for name, a, b in STAGES:
+            if a in first and b in first:
+                stages[name].append(first[b] - first[a])
+    done_at = [rec.terminal[i] for i, _ in fired if i in rec.terminal]
+    wall = (max(done_at) - fired[0][1]) if done_at else 0.0
+    return {
+        "incidents": len(fired),
+        "finished": len(done_at),
+        "status": db["status"],
+        "missing_step_events": missing,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_sec": round(len(done_at) / wall, 2) if wall else 0.0,
+        "time_to_report_ms": pct(ttr),
+        "time_to_grouped_ms": pct(ttg),
+        "stage_latency_ms": {"queue": pct(queue), **{name: pct(stages[name]) for name, _, _ in STAGES}},
+        "db_writes": db["writes"],
+        "step_events": rec.received,
+    }
+
+def db_stats(db_file: str) -> Dict[str, Any]:
+    import sqlite3
+    con = sqlite3.connect(db_file)
+    try:
+        status = dict(con.execute("SELECT status, COUNT(*) FROM incidents GROUP BY status").fetchall())
+        rows = {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("incidents", "agent_steps", "reports")}
+    finally:
+        con.close()
+    size = sum(os.path.getsize(p) for p in (db_file, db_file + "-wal") if os.path.exists(p))
+    n = rows["incidents"] or 1
+    return {"status": status,
+            "writes": {"rows": rows, "steps_per_incident": round(rows["agent_steps"] / n, 2),
+                       "reports_per_incident": round(rows["reports"] / n, 3), "db_bytes": size}}
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    def get(d, path):
+        for k in path:
+            d = (d or {}).get(k)
+        return d
+    print(f"\n{'metric':<34} {'before':>10} {'after':>10} {'change':>8}")
+    paths = [("throughput_per_sec",)] + [("time_to_report_ms", p) for p in ("p50", "p95", "p99")] + \
+        [("stage_latency_ms", s, "p95") for s in ["queue"] + [n for n, _, _ in STAGES]] + \
+        [("db_writes", "steps_per_incident")]
+    for path in paths:
+        a, b = get(old["results"], path), get(new["results"], path)
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            change = f"{(b - a) / a:+.0%}" if a else "n/a"
+            print(f"{'.'.join(path):<34} {a:>10} {b:>10} {change:>8}")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ---------- run ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="end-to-end triage benchmark")
+    ap.add_argument("--count", type=int, default=200, help="alerts in the storm")
+    ap.add_argument("--rate", type=float, default=20, help="alerts per second (0 = unthrottled)")
+    ap.add_argument("--dup", type=float, default=0.5, help="share of duplicate alerts")
+    ap.add_argument("--services", default="", help="weighted service mix, e.g. payments:5,orders:2")
+    ap.add_argument("--log-mb", type=float, default=50, help="size of the synthetic log tree")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--mode", default="thread", help="RUNNER_MODE: thread | asyncio | process")
+    ap.add_argument("--timeout", type=float, default=600, help="give up waiting after this many seconds")
+    ap.add_argument("--out", default="bench_e2e.json")
+    ap.add_argument("--compare", default="", help="earlier report to diff against")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_e2e_")
+    env = bench_env(tmp, args)
+    os.environ.update(env)                     # before importing app: the DAL reads DB_FILE at import
+
+    import loadgen                              # noqa: E402
+    from app.db.dal import init_db              # noqa: E402
+    init_db()
+
+    logs = loadgen.write_logs(env["LOGS_LOCAL_ROOT"], args.log_mb)
+    print(f"logs   {logs['bytes'] / 1e6:,.0f} MB in {logs['files']} files ({logs['mb_per_sec']} MB/s)")
+    subprocess.run([sys.executable, "app/rag/build_index.py"], cwd=ROOT, env={**os.environ, **env},
+                   check=True, stdout=subprocess.DEVNULL)
+
+    rec = StepRecorder(env["STEP_STREAM_ADDR"])
+    runner_log = open(os.path.join(tmp, "runner.log"), "w")
+    runner = subprocess.Popen([sys.executable, "-u", "-m", "app.runner"], cwd=ROOT,
+                              env={**os.environ, **env}, stdout=runner_log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.time() + 60
+        while "workers, wake-up" not in pathlib.Path(runner_log.name).read_text():
+            if runner.poll() is not None or time.time() > deadline:
+                raise SystemExit(f"runner did not start, see {runner_log.name}")
+            time.sleep(0.1)
+
+        storm = loadgen.alert_storm(args.count, args.dup, loadgen.parse_mix(args.services) or None)
+        fired = loadgen.fire(storm, args.rate)
+        print(f"storm  {len(fired)} alerts at {args.rate or 'max'}/s, dup {args.dup:.0%}")
+        deadline = time.time() + args.timeout
+        while len(rec.terminal.keys() & {i for i, _ in fired}) < len(fired) and time.time() < deadline:
+            time.sleep(0.2)
+    finally:
+        runner.terminate()
+        runner.wait(timeout=30)
+        runner_log.close()
+
+    results = summarize(fired, rec, db_stats(env["DB_FILE"]))
+    report = {
+        "bench": "e2e", "version": 1, "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "logs": logs,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    r = results
+    print(f"done   {r['finished']}/{r['incidents']} in {r['wall_seconds']}s -> {r['throughput_per_sec']} incidents/s "
+          f"({r['status']})")
+    for name, s in [("time-to-report", r["time_to_report_ms"]), ("time-to-grouped", r["time_to_grouped_ms"])] + \
+            list(r["stage_latency_ms"].items()):
+        if s.get("n"):
+            print(f"  {name:<16} n={s['n']:<5} p50 {s['p50']:>8} ms  p95 {s['p95']:>8} ms  p99 {s['p99']:>8} ms")
+    print(f"  db rows {r['db_writes']['rows']}, {r['db_writes']['steps_per_incident']} steps/incident")
+    print(f"report {args.out}  (runner log and data in {tmp})")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
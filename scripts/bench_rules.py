@@ -0,0 +1,83 @@
+# scripts/bench_rules.py
+# Benchmark: per-rule re.finditer (old analyst) vs the compiled RuleSet, over a
+# synthetic log corpus and growing rule counts. Past NAIVE_FULL rules the naive
+# time is extrapolated from a 100-rule sample (marked ~).
+#   python scripts/bench_rules.py [corpus_mb]
+import sys, re, time, random, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.agents.rules import RuleSet, load_rules  # noqa: E402
+
+MB = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+NAIVE_FULL = 300
+random.seed(7)
+
+def synthetic_corpus(mb):
+    lines = [
+        "2025-09-27T11:02:{s:02d}Z INFO request id={id} path=/checkout took {ms}ms",
+        "2025-09-27T11:02:{s:02d}Z WARN retrying upstream call id={id}",
+        "2025-09-27T11:02:{s:02d}Z DEBUG cache hit key=user:{id}",
+    ]
+    rare = [
+        "2025-09-27T11:02:{s:02d}Z ERROR db-conn: connection refused to postgres:5432",
+        "2025-09-27T11:02:{s:02d}Z kubelet: OOMKilled container payment-service",
+        "2025-09-27T11:02:{s:02d}Z java.lang.NullPointerException at com.app.Payments",
+        "2025-09-27T11:02:{s:02d}Z ERROR read timeout after 5s calling inventory",
+    ]
+    out, size, target = [], 0, int(mb * 1024 * 1024)
+    while size < target:
+        tpl = random.choice(rare) if random.random() < 0.001 else random.choice(lines)
+        line = tpl.format(s=random.randint(0, 59), id=random.randint(1, 10**6), ms=random.randint(1, 900))
+        out.append(line)
+        size += len(line) + 1
+    return "\n".join(out)
+
+# keywords inside other rules' matches: every rule must still be reported
+OVERLAPPING = [
+    {"id": "exc", "pattern": "Exception"},
+    {"id": "npe", "pattern": "NullPointerException"},
+    {"id": "timeout", "pattern": "timeout"},
+    {"id": "timeout-after", "pattern": "timeout after"},
+    {"id": "timeout-secs", "pattern": r"timeout after \d+s"},
+    {"id": "read-timeout", "pattern": "read timeout|timeout"},
+]
+
+def synthetic_rules(n, base):
+    rules = list(base) + [{**r, "issue": "x", "root": "x", "fix": []} for r in OVERLAPPING]
+    for i in range(n - len(base)):
+        a, b = f"errcode_{i:05d}", f"Fault{i}Exception"
+        pat = f"{a}|{b}" if i % 10 else rf"E{i:05d}-\d+"   # ~10% real regexes
+        rules.append({"id": f"r{i}", "pattern": pat, "issue": "x", "root": "x", "fix": []})
+    return rules
+
+def naive(rules, corpus):
+    found = {}
+    for rule in rules:
+        for m in re.finditer(rule["pattern"], corpus, flags=re.I):
+            found[rule["id"]] = found.get(rule["id"], 0) + 1
+    return found
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+if __name__ == "__main__":
+    corpus = synthetic_corpus(MB)
+    base = load_rules()
+    print(f"corpus {len(corpus) / 1e6:.1f} MB, {corpus.count(chr(10)) + 1:,} lines")
+    print(f"{'rules':>6} {'naive s':>9} {'engine s':>9} {'compile s':>10} {'speedup':>8}")
+    for n in (3, 30, 300, 1000, 3000):
+        rules = synthetic_rules(n, base)
+        rs, t_compile = timed(lambda: RuleSet(rules))
+        new, t_new = timed(lambda: rs.scan([corpus]))
+        if n <= NAIVE_FULL:
+            old, t_old = timed(lambda: naive(rules, corpus))
+            assert {m["rule"]["id"]: m["count"] for m in new} == old
+            mark = " "
+        else:
+            _, t_sample = timed(lambda: naive(rules[:100], corpus))
+            t_old, mark = t_sample * n / 100, "~"
+        print(f"{n:>6} {mark}{t_old:>8.3f} {t_new:>9.3f} {t_compile:>10.3f} {t_old / t_new:>7.1f}x")
@@ -0,0 +1,60 @@
+# scripts/bench_vector_store.py
+# Recall/latency of LocalVectorStore IVF mode against exact search on clustered
+# synthetic embeddings.   python scripts/bench_vector_store.py [n_vectors] [dim]
+import sys, time, tempfile, pathlib
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from rag_pipeline.local_store import LocalVectorStore  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+DIM = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+QUERIES, TOP_K = 200, 10
+
+def synthetic(n, dim, clusters=200, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    x = centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim))
+    return x.astype(np.float32)
+
+def timed_search(store, q, **kw):
+    store.search(q[:1], TOP_K, **kw)             # warm the lazy load
+    t0 = time.perf_counter()
+    one = [store.search(q[i:i + 1], TOP_K, **kw)[0] for i in range(len(q))]
+    t_single = (time.perf_counter() - t0) / len(q)
+    t0 = time.perf_counter()
+    store.search(q, TOP_K, **kw)
+    t_batch = (time.perf_counter() - t0) / len(q)
+    return one, t_single, t_batch
+
+if __name__ == "__main__":
+    data = synthetic(N, DIM)
+    queries = synthetic(QUERIES, DIM, seed=2)
+    chunks = [f"chunk {i}" for i in range(N)]
+    meta = [{"doc": f"doc-{i % 4}"} for i in range(N)]
+    tmp = tempfile.mkdtemp(prefix="bench_vec_")
+    print(f"{N:,} vectors x {DIM} dims, {QUERIES} queries, top-{TOP_K}")
+
+    exact = LocalVectorStore(path=f"{tmp}/exact", dim=DIM, mode="exact")
+    t0 = time.perf_counter()
+    exact.upsert(data, chunks, ids=[str(i) for i in range(N)], metadata=meta)
+    print(f"exact build {time.perf_counter() - t0:.2f}s")
+    truth, t1, tb = timed_search(exact, queries)
+    print(f"{'mode':<14} {'recall@10':>9} {'ms/query':>9} {'ms/query(batch)':>16}")
+    print(f"{'exact':<14} {1.0:>9.3f} {t1 * 1e3:>9.3f} {tb * 1e3:>16.3f}")
+
+    ivf = LocalVectorStore(path=f"{tmp}/ivf", dim=DIM, mode="ivf")
+    t0 = time.perf_counter()
+    ivf.upsert(data, chunks, ids=[str(i) for i in range(N)], metadata=meta)
+    print(f"ivf build   {time.perf_counter() - t0:.2f}s ({ivf._nlist()} lists)")
+    for nprobe in (1, 4, 8, 16, 32):
+        ivf.nprobe = nprobe
+        got, t1, tb = timed_search(ivf, queries)
+        recall = np.mean([len({h["id"] for h in g} & {h["id"] for h in t}) / TOP_K
+                          for g, t in zip(got, truth)])
+        print(f"{'ivf nprobe=' + str(nprobe):<14} {recall:>9.3f} {t1 * 1e3:>9.3f} {tb * 1e3:>16.3f}")
+
+    _, t1, _ = timed_search(exact, queries, filter={"doc": {"$in": ["doc-1"]}})
+    print(f"exact + metadata filter: {t1 * 1e3:.3f} ms/query")
@@ -0,0 +1,159 @@
+# scripts/loadgen.py
+# Synthetic load for the triage pipeline:
+#   logs    an app/logs-shaped tree (web/db/infra, *.log with ISO8601 timestamps
+#           ending "now"), any size up to many GB, with rule-matching error bursts
+#   alerts  an alert storm inserted into the incidents table at a fixed rate, with
+#           a share of duplicates (same service/severity/source) and a service mix
+#   python scripts/loadgen.py logs --root app/logs --mb 2048 [--files 4] [--hours 6]
+#   python scripts/loadgen.py alerts --rate 20 --count 500 [--dup 0.6] [--services payments:5,orders:2]
+import os, sys, time, random, argparse, datetime, pathlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+FOLDERS = ("web", "db", "infra")
+SERVICES = {"payment-service": 5, "checkout": 3, "orders": 2, "auth": 2, "search": 1, "inventory": 1}
+SEVERITIES = {"CRITICAL": 1, "HIGH": 3, "MEDIUM": 4}
+SOURCES = ("cpu-high", "db-conn", "oom", "http-5xx", "latency-p99")
+
+NOISE = {
+    "web": ["INFO GET /api/{path} 200 {ms}ms req={id}", "INFO POST /checkout 201 {ms}ms req={id}",
+            "DEBUG cache hit key=user:{id}", "WARN slow request /api/{path} took {ms}ms req={id}"],
+    "db": ["INFO query ok rows={ms} took {ms}ms conn={id}", "DEBUG pool checkout conn={id} idle={ms}",
+           "WARN retrying statement after {ms}ms conn={id}"],
+    "infra": ["INFO kubelet: pod {path}-{id} ready", "INFO node cpu={ms}% mem={ms}%",
+              "WARN kubelet: liveness probe slow for {path}-{id} ({ms}ms)"],
+}
+ERRORS = {
+    "web": ["ERROR GET /checkout HTTP 500 req={id}", "ERROR java.lang.NullPointerException at com.app.Payments:{ms}"],
+    "db": ["ERROR db-conn: connection refused to postgres:5432 conn={id}", "ERROR ECONNREFUSED 10.0.3.{ms}:5432"],
+    "infra": ["ERROR kubelet: OOMKilled container {path}-{id}", "FATAL java.lang.OutOfMemoryError: Java heap space"],
+}
+PATHS = ("orders", "users", "cart", "payments", "search", "inventory")
+
+def _weighted(spec: Dict[str, int], rng: random.Random) -> str:
+    return rng.choices(list(spec), weights=list(spec.values()))[0]
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """"payments:5,orders:2" -> {"payments": 5, "orders": 2} (weight defaults to 1)."""
+    out = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition(":")
+        out[name] = int(weight or 1)
+    return out
+
+# ---------- logs ----------
+
+def _bodies(templates: List[str], rng: random.Random, n: int = 4096) -> List[str]:
+    # pre-rendered message bodies, cycled: formatting every line caps output at ~15 MB/s
+    return [templates[i % len(templates)].format(path=PATHS[i % len(PATHS)], id=rng.getrandbits(24),
+                                                 ms=rng.randint(1, 997)) + "\n" for i in range(n)]
+
+def _log_lines(folder: str, n: int, start: datetime.datetime, span: float, error_rate: float,
+               rng: random.Random) -> Iterator[str]:
+    noise, errors = _bodies(NOISE[folder], rng), _bodies(ERRORS[folder], rng, 256)
+    step, stamp_sec, stamp = span / max(1, n), -1, ""
+    burst = 0
+    for i in range(n):
+        sec = int(i * step)
+        if sec != stamp_sec:                         # strftime once per second of log time
+            stamp_sec = sec
+            stamp = (start + datetime.timedelta(seconds=sec)).strftime("%Y-%m-%dT%H:%M:%SZ ")
+        if burst or rng.random() < error_rate:
+            burst = burst - 1 if burst else rng.randint(3, 40)    # errors come in bursts
+            yield stamp + errors[i & 255]
+        else:
+            yield stamp + noise[(i * 7919) & 4095]
+
+def write_logs(root: str, total_mb: float, files_per_folder: int = 4, hours: float = 6.0,
+               error_rate: float = 0.0005, seed: int = 7, end: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """Fill root/{web,db,infra}/<start>.log with ~total_mb of lines whose timestamps
+    run up to `end` (default now), newest file last by mtime like a live tree."""
+    rng = random.Random(seed)
+    end = end or datetime.datetime.utcnow()
+    per_file = int(total_mb * 1024 * 1024 / (len(FOLDERS) * files_per_folder))
+    span = hours * 3600 / files_per_folder
+    written, files = 0, 0
+    t0 = time.perf_counter()
+    for folder in FOLDERS:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+        for k in range(files_per_folder):
+            start = end - datetime.timedelta(seconds=span * (files_per_folder - k))
+            path = os.path.join(root, folder, start.strftime("%Y-%m-%dT%H-%MZ") + ".log")
+            n = max(1, per_file // 68)               # ~68 bytes a line
+            with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+                buf: List[str] = []
+                for line in _log_lines(folder, n, start, span, error_rate, rng):
+                    buf.append(line)
+                    if len(buf) >= 4096:
+                        f.write("".join(buf))
+                        buf.clear()
+                f.write("".join(buf))
+                written += f.tell()
+            mtime = (start + datetime.timedelta(seconds=span)).replace(tzinfo=datetime.timezone.utc).timestamp()
+            os.utime(path, (mtime, mtime))
+            files += 1
+    secs = time.perf_counter() - t0
+    return {"files": files, "bytes": written, "seconds": round(secs, 2),
+            "mb_per_sec": round(written / 1e6 / secs, 1) if secs else 0.0}
+
+# ---------- alert storm ----------
+
+def alert_storm(count: int, dup_ratio: float = 0.5, services: Optional[Dict[str, int]] = None,
+                seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """record_incident kwargs for `count` alerts; about dup_ratio of them repeat an
+    earlier alert's service/severity/source and so correlate into its group."""
+    rng = random.Random(seed)
+    services = services or SERVICES
+    seen: List[Tuple[str, str, str]] = []
+    for i in range(count):
+        if seen and rng.random() < dup_ratio:
+            service, severity, source = rng.choice(seen[-20:])    # storms repeat recent alerts
+        else:
+            service, severity, source = _weighted(services, rng), _weighted(SEVERITIES, rng), rng.choice(SOURCES)
+            seen.append((service, severity, source))
+        yield {"status": "OPEN", "service": service, "environment": "prod", "severity": severity,
+               "payload": {"source": source, "alert": f"loadgen-{i}", "service": service,
+                           "details": "synthetic alert-storm incident"}}
+
+def fire(alerts: Iterator[Dict[str, Any]], rate: float, on_insert=None) -> List[Tuple[int, float]]:
+    """Insert alerts at `rate` per second (0 = as fast as possible); returns
+    [(incident id, wall-clock insert time)]."""
+    from app.db.dal import record_incident
+    out: List[Tuple[int, float]] = []
+    t0 = time.perf_counter()
+    for i, kwargs in enumerate(alerts):
+        if rate > 0:
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t = time.time()
+        out.append((record_incident(**kwargs), t))
+        if on_insert:
+            on_insert(*out[-1])
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="synthetic logs and alert storms")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lg = sub.add_parser("logs")
+    lg.add_argument("--root", default=os.getenv("LOGS_LOCAL_ROOT", "app/logs"))
+    lg.add_argument("--mb", type=float, default=100)
+    lg.add_argument("--files", type=int, default=4, help="files per folder")
+    lg.add_argument("--hours", type=float, default=6, help="time span covered, ending now")
+    lg.add_argument("--error-rate", type=float, default=0.0005)
+    al = sub.add_parser("alerts")
+    al.add_argument("--rate", type=float, default=10, help="alerts per second (0 = unthrottled)")
+    al.add_argument("--count", type=int, default=100)
+    al.add_argument("--dup", type=float, default=0.5, help="share of duplicate alerts")
+    al.add_argument("--services", default="", help="weighted mix, e.g. payments:5,orders:2")
+    args = ap.parse_args()
+
+    if args.cmd == "logs":
+        stats = write_logs(args.root, args.mb, args.files, args.hours, args.error_rate)
+        print(f"wrote {stats['bytes'] / 1e6:,.0f} MB in {stats['files']} files under {args.root} "
+              f"({stats['mb_per_sec']} MB/s)")
+    else:
+        fired = fire(alert_storm(args.count, args.dup, parse_mix(args.services) or None), args.rate)
+        print(f"inserted {len(fired)} incidents (ids {fired[0][0]}..{fired[-1][0]})")
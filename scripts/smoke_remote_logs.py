@@ -0,0 +1,92 @@
+# scripts/smoke_remote_logs.py
+# Smoke run of the remote log sources (app/middleware/cloudwatch_boto.py,
+# s3_logs.py) against moto's in-process AWS stand-in: stream listing, window
+# bounds, the server-side filter (which must never drop a line the analyst
+# rules match) and S3 tails of plain and multi-member gzip objects.
+# Needs moto (pip install "moto[logs,s3]"); no AWS account or network.
+#   python scripts/smoke_remote_logs.py
+import os, sys, gzip, pathlib, datetime
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+for k, v in {"AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing",
+             "AWS_DEFAULT_REGION": "us-east-1"}.items():
+    os.environ[k] = v                     # moto only; never talk to a real account
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from app.agents.rules import RuleSet, load_rules  # noqa: E402
+from app.middleware.cloudwatch_boto import CloudWatchLogs, filter_pattern  # noqa: E402
+from app.middleware.s3_logs import S3Logs  # noqa: E402
+
+NOW = datetime.datetime.utcnow().replace(microsecond=0)
+
+def _ms(dt):
+    return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+def cloudwatch():
+    client = boto3.client("logs", region_name="us-east-1")
+    group = "/ecs/web"
+    client.create_log_group(logGroupName=group)
+    lines = {
+        "web-1": ["GET /health 200", "db: Connection refused (10.0.0.7:5432)", "upstream returned 502"],
+        "web-2": ["connect ECONNREFUSED 10.0.0.7:5432", "GET /checkout 200"],
+    }
+    for stream, messages in lines.items():
+        client.create_log_stream(logGroupName=group, logStreamName=stream)
+        client.put_log_events(logGroupName=group, logStreamName=stream, logEvents=[
+            {"timestamp": _ms(NOW - datetime.timedelta(minutes=5)) + n, "message": m}
+            for n, m in enumerate(messages)])
+    client.create_log_stream(logGroupName=group, logStreamName="web-old")
+    client.put_log_events(logGroupName=group, logStreamName="web-old", logEvents=[
+        {"timestamp": _ms(NOW - datetime.timedelta(days=2)), "message": "db: Connection refused (old)"}])
+    window = (NOW - datetime.timedelta(minutes=30), NOW)
+
+    # default rules: keywords have letters, so no server-side filter and nothing the rules match is lost
+    rules = RuleSet(load_rules())
+    assert filter_pattern(rules.anchors) == ""
+    cw = CloudWatchLogs(client=client, groups={"web": group})
+    got = list(cw.lines("web", window))
+    assert len(got) == 5 and not any("(old)" in line for line in got), got
+    matched = {m["rule"]["id"] for m in rules.scan(["\n".join(got)])}
+    assert "db-conn-refused" in matched, matched
+    hits = sum(line.lower().count("connection refused") + line.count("ECONNREFUSED") for line in got)
+    assert hits == 2, got                      # "Connection refused" reached the analyst
+
+    # what the "cased" variants would cost: a term only matches its own casing
+    only_lower = CloudWatchLogs(client=client, groups={"web": group}, pattern='"connection refused"')
+    assert not any("Connection refused" in line for line in only_lower.lines("web", window))
+
+    # keywords without letters are exact, so they are filtered server-side
+    assert filter_pattern(["502"]) == '"502"'
+    status = CloudWatchLogs(client=client, groups={"web": group}, pattern=filter_pattern(["502"]))
+    got = list(status.lines("web", window))
+    assert len(got) == 1 and got[0].endswith("upstream returned 502"), got
+    print(f"[smoke] cloudwatch OK: {len(cw.streams(group, _ms(window[0]), _ms(window[1])))} streams in window")
+
+def s3():
+    client = boto3.client("s3", region_name="us-east-1")
+    client.create_bucket(Bucket="logbucket")
+    plain = "".join(f"2025-09-27T11:02:{s:02d}Z line {s}\n" for s in range(60)).encode()
+    client.put_object(Bucket="logbucket", Key="logs/web/app.log", Body=plain)
+    members = gzip.compress(b"first member\n") + gzip.compress(b"ERROR connection refused\nlast line\n")
+    client.put_object(Bucket="logbucket", Key="logs/web/app.log.1.gz", Body=members)
+    client.put_object(Bucket="logbucket", Key="logs/db/db.log", Body=b"ok\n")
+
+    src = S3Logs(client=client, bucket="logbucket", prefix="logs/")
+    assert src.folders() == ["db", "web"], src.folders()
+    objs = src.objects("web", limit=5)
+    assert {o["Key"] for o in objs} == {"logs/web/app.log", "logs/web/app.log.1.gz"}
+    tail = src.tail(next(o for o in objs if o["Key"].endswith(".log")), max_bytes=100)
+    assert tail[-1] == "2025-09-27T11:02:59Z line 59" and len(tail) < 60, tail    # ranged GET, cut line dropped
+    gz = src.tail(next(o for o in objs if o["Key"].endswith(".gz")), max_bytes=1 << 20)
+    assert gz == ["first member", "ERROR connection refused", "last line"], gz
+    assert sum(len(t) for t in src.tails("web", limit=5, max_bytes=1 << 20)) == 63
+    print("[smoke] s3 OK: ranged tails and multi-member gzip")
+
+if __name__ == "__main__":
+    with mock_aws():
+        cloudwatch()
+        s3()
@@ -45,72 +45,220 @@
 #         else:
 #             st.info('No report found.')
 # ui/streamlit_app.py
-import json
+# Dashboard. Every read goes through app.db.dal's keyset/incremental queries and
+# is cached with st.cache_data keyed on dal.change_token(), so a rerun with
+# nothing new costs a couple of index seeks however many incidents exist.
+import os, json, datetime
+from collections import Counter
 import pandas as pd
 import streamlit as st
 
-# Import directly from your single DAL
 from app.db.dal import (
-    list_incidents,
+    page_incidents,
+    incident_facets,
+    change_token,
     get_incident,
-    list_steps,
+    steps_after,
     get_latest_report,
 )
+from app.middleware.step_stream import StepFeed
+
+UI_PAGE_SIZE = int(os.getenv("UI_PAGE_SIZE", "50"))
+UI_LIVE_INTERVAL = float(os.getenv("UI_LIVE_INTERVAL", "0.5"))   # seconds between live-timeline redraws
+LIVE = {"OPEN", "IN_PROGRESS"}
+STEP_COLUMNS = ["id", "agent", "phase", "status", "message", "ts"]
 
 st.set_page_config(page_title="Incident Responder", layout="wide")
 st.title("Incidents")
 
-# --- Left: incidents list ---
-incidents = list_incidents(limit=200)
+# ---------- cached reads (the token argument is the cache key) ----------
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_page(token: str, before_id, filters: tuple) -> pd.DataFrame:
+    status, service, severity, since, until = filters
+    return pd.DataFrame(
+        page_incidents(before_id, UI_PAGE_SIZE, status=list(status), service=list(service),
+                       severity=list(severity), since=since, until=until),
+        columns=["id", "status", "service", "environment", "severity", "created_at", "parent_id"],
+    )
+
+@st.cache_data(show_spinner=False, ttl=60)
+def load_facets(incident_token: str) -> dict:
+    return incident_facets()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_incident(incident_id: int, token: str):
+    return get_incident(incident_id)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_report(incident_id: int, token: str):
+    return get_latest_report(incident_id)
+
+# ---------- agent-step timeline (DB tail + live stream) ----------
+
+def _last_step(incident_token: str) -> int:
+    step = incident_token.split(":")[1]             # status:max step id:report id
+    return int(step) if step != "None" else 0
+
+def _key(step: dict) -> tuple:
+    return step["ts"], step["agent"], step["phase"], step["message"]
+
+def timeline(incident_id: int) -> dict:
+    """Per-session timeline of one incident: {"last", "df", "raw", "db", "live"}.
+    Rows come from the DB tail and from the live stream, which carries no DB
+    ids, so each side cancels rows the other already added (db / live are
+    Counters of unmatched row keys). raw holds each row's undecoded data_json."""
+    key = f"steps:{incident_id}"
+    if key not in st.session_state:
+        st.session_state[key] = {"last": 0, "df": pd.DataFrame(columns=STEP_COLUMNS), "raw": [],
+                                 "db": Counter(), "live": Counter()}
+    return st.session_state[key]
+
+def _merge(state: dict, steps: list, source: str) -> bool:
+    other = state["live" if source == "db" else "db"]
+    fresh = []
+    for s in steps:
+        k = _key(s)
+        if other[k]:
+            other[k] -= 1           # already on screen from the other source
+        else:
+            state[source][k] += 1
+            fresh.append(s)
+    if fresh:
+        state["raw"].extend(s.get("data_json") for s in fresh)    # decoded on demand
+        state["df"] = pd.concat([state["df"], pd.DataFrame(fresh, columns=STEP_COLUMNS)], ignore_index=True)
+    return bool(fresh)
+
+def tail_steps(incident_id: int, last_step: int) -> dict:
+    """Extend the timeline with only the DB steps newer than the last one seen
+    (last_step comes from the change token, so an idle rerun reads nothing)."""
+    state = timeline(incident_id)
+    if last_step > state["last"]:
+        new = steps_after(incident_id, state["last"])
+        if new:
+            _merge(state, new, "db")
+            state["last"] = new[-1]["id"]
+    return state
+
+def step_feed(incident_id: int) -> StepFeed:
+    """One stream subscription per session, for the incident on screen."""
+    feed = st.session_state.get("feed")
+    if feed is None or feed.incident_id != incident_id:
+        if feed is not None:
+            feed.close()
+        feed = st.session_state["feed"] = StepFeed(incident_id)
+    return feed
+
+def show_steps(state: dict) -> None:
+    if state["df"].empty:
+        st.info("No steps yet for this incident.")
+        return
+    st.dataframe(state["df"], use_container_width=True, hide_index=True, height=320)
+    labels = [f"{i + 1}. {r.agent}/{r.phase}" for i, r in enumerate(state["df"].itertuples())]
+    pick = st.selectbox("Step payload", ["—"] + labels[::-1])
+    if pick != "—":
+        raw = state["raw"][int(pick.split(".")[0]) - 1]
+        if raw is None:
+            st.caption("Payload too large for the live stream; it loads from the DB on the next refresh.")
+        else:
+            try:
+                st.json(json.loads(raw or "{}"))
+            except ValueError:
+                st.code(raw)
+
+# ---------- filters + keyset pagination ----------
+
+token = change_token()
+facets = load_facets(token.split(":")[0])       # only new incidents can add a facet value
+
+with st.sidebar:
+    st.subheader("Filters")
+    f_status = st.multiselect("Status", facets["status"])
+    f_service = st.multiselect("Service", facets["service"])
+    f_severity = st.multiselect("Severity", facets["severity"])
+    use_range = st.checkbox("Created between")
+    since = until = None
+    if use_range:
+        today = datetime.datetime.utcnow().date()
+        picked = st.date_input("Range (UTC)", (today - datetime.timedelta(days=7), today))
+        if len(picked) == 2:                         # mid-selection the widget returns one date
+            since = f"{picked[0]}T00:00:00Z"
+            until = f"{picked[1] + datetime.timedelta(days=1)}T00:00:00Z"
+    if st.button("Refresh"):
+        st.rerun()
+
+filters = (tuple(f_status), tuple(f_service), tuple(f_severity), since, until)
+if st.session_state.get("filters") != filters:      # new filter: back to the first page
+    st.session_state["filters"], st.session_state["pages"] = filters, [None]
+pages = st.session_state["pages"]                    # before_id of each page visited so far
+
+df = load_page(token, pages[-1], filters)
 
 left, right = st.columns([1, 2], gap="large")
 
 with left:
     st.subheader("All Incidents")
-    if not incidents:
-        st.info("No incidents yet. Seed one and refresh.")
-        st.stop()
-
-    df = pd.DataFrame(incidents)
     st.dataframe(df, use_container_width=True, hide_index=True)
+    prev_col, page_col, next_col = st.columns([1, 1, 1])
+    if prev_col.button("← Newer", disabled=len(pages) == 1):
+        pages.pop()
+        st.rerun()
+    page_col.caption(f"Page {len(pages)}")
+    if next_col.button("Older →", disabled=len(df) < UI_PAGE_SIZE):
+        pages.append(int(df["id"].iloc[-1]))
+        st.rerun()
+
+    if df.empty:
+        st.info("No incidents match. Seed one, change the filters and refresh.")
+        st.stop()
 
     # Build a friendly selector (id — service [status])
-    options = [f"{row['id']} — {row['service']} [{row['status']}]" for row in incidents]
+    options = [f"{row.id} — {row.service} [{row.status}]" for row in df.itertuples()]
     choice = st.selectbox("Select an incident", options, index=0)
     selected_id = int(choice.split(" — ")[0])
 
 # --- Right: details for selected incident ---
 with right:
-    inc = get_incident(selected_id)
+    inc_token = change_token(selected_id)
+    inc = load_incident(selected_id, inc_token)
     st.subheader(f"Incident #{selected_id}")
     st.caption(
         f"Service: {inc['service']} • Env: {inc['environment']} • "
-        f"Severity: {inc['severity']} • Created: {inc['created_at']}"
+        f"Severity: {inc['severity']} • Status: {inc['status']} • Created: {inc['created_at']}"
+        + (f" • Grouped under #{inc['parent_id']}" if inc.get("parent_id") else "")
     )
 
     # Steps timeline
     st.markdown("### Agent Steps")
-    steps = list_steps(selected_id)
-    if steps:
-        steps_df = pd.DataFrame([
-            {
-                "id": s["id"],
-                "agent": s["agent"],
-                "phase": s["phase"],
-                "status": s.get("status"),
-                "message": s["message"],
-                "ts": s["ts"],
-                "data": s.get("data", {}),
-            }
-            for s in steps
-        ])
-        st.dataframe(steps_df, use_container_width=True, hide_index=True, height=320)
+    report_id = inc_token.split(":")[2]
+    steps = tail_steps(selected_id, _last_step(inc_token))
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if inc["status"] in LIVE and fragment is not None:
+        feed = step_feed(selected_id)
+
+        @fragment(run_every=UI_LIVE_INTERVAL)
+        def live_steps():
+            # redraws only this block; new steps arrive over the stream, not from the DB
+            events = feed.drain()
+            _merge(steps, events, "live")
+            if not feed.connected:
+                st.caption("Live stream unavailable (is the runner up?); showing steps from the DB.")
+                tail_steps(selected_id, _last_step(change_token(selected_id)))
+            show_steps(steps)
+            if any(e["phase"] in ("done", "error") for e in events):
+                steps["finishing"] = True
+            if steps.get("finishing") and change_token(selected_id).split(":")[0] not in LIVE:
+                st.rerun()          # status and report changed: redraw the whole page
+
+        live_steps()
     else:
-        st.info("No steps yet for this incident.")
+        if st.session_state.get("feed") is not None:
+            st.session_state.pop("feed").close()
+        show_steps(steps)
 
     # Report
     st.markdown("### Report")
-    rep = get_latest_report(selected_id)
+    rep = load_report(selected_id, report_id)
     if rep:
         st.markdown(rep["report_md"])
         # Downloads
@@ -128,4 +276,3 @@ with right:
         )
     else:
         st.info("No report generated yet.")
-